@@ -1,51 +1,226 @@
 from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
+from pymongo import IndexModel
+import asyncio
+import logging
 import os
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from .models.patient import Patient
 from .models.symptom_analysis import SymptomAnalysis
 from .models.doctor import Doctor
+from .models.usage_rollup import UsageRollup
+from .models.symptom_trend import SymptomTrendCell
+from .models.rate_limit import RateLimitCounter
+from .models.nearby_result import NearbyResultSet
+from .models.lease import Lease
+
+MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/health-beacon")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", "300000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+# zlib ships with Python; snappy/zstd need python-snappy/zstandard installed
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zlib")
+MONGO_RETRY_INITIAL_DELAY = float(os.getenv("MONGO_RETRY_INITIAL_DELAY", "1"))
+MONGO_RETRY_MAX_DELAY = float(os.getenv("MONGO_RETRY_MAX_DELAY", "60"))
+MONGO_HEALTH_INTERVAL = float(os.getenv("MONGO_HEALTH_INTERVAL", "15"))
+SEED_SAMPLE_DATA = os.getenv("SEED_SAMPLE_DATA", "false").lower() == "true"
+
+DOCUMENT_MODELS = [Patient, SymptomAnalysis, Doctor, UsageRollup, SymptomTrendCell, RateLimitCounter, NearbyResultSet, Lease]
 
 class DatabaseManager:
     client: Optional[AsyncIOMotorClient] = None
     database = None
+    # True once Beanie is initialised and the minimum pool of connections is open
+    ready: bool = False
+    last_error: Optional[str] = None
+    task: Optional[asyncio.Task] = None
+    # Set once this process (or the supervisor it was forked from) has reconciled indexes
+    indexes_reconciled: bool = False
 
 db_manager = DatabaseManager()
 
+def database_name(mongodb_url: str) -> str:
+    # Get database name from URL or default
+    name = mongodb_url.rsplit("/", 1)[-1].split("?", 1)[0] if "/" in mongodb_url.split("://", 1)[-1] else ""
+    return name or "health-beacon"
+
+def create_mongo_client(mongodb_url: str = MONGODB_URI) -> AsyncIOMotorClient:
+    """Build the shared client. No I/O happens until the first operation."""
+    return AsyncIOMotorClient(
+        mongodb_url,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=MONGO_MAX_IDLE_MS,
+        serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+        socketTimeoutMS=MONGO_SOCKET_TIMEOUT_MS,
+        compressors=MONGO_COMPRESSORS or None,
+        retryWrites=True,
+    )
+
+# Indexes earlier releases created that no model declares any more, by collection
+RETIRED_INDEXES: Dict[str, List[str]] = {
+    # Replaced by SESSION_HISTORY_INDEX, which adds _id as a tie-breaker
+    "symptom_analyses": ["sessionId_1_createdAt_-1"],
+}
+
+# Options that make two indexes on the same key incompatible for createIndexes
+INDEX_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+def _declared_indexes(model) -> List[Dict[str, Any]]:
+    documents = []
+    for index in getattr(model.Settings, "indexes", []):
+        if isinstance(index, str):
+            index = IndexModel([(index, 1)])
+        elif isinstance(index, list):
+            index = IndexModel(index)
+        documents.append(index.document)
+    return documents
+
+async def reconcile_indexes(database, models=None):
+    """Bring indexes left by earlier releases in line with the models before Beanie creates them.
+
+    createIndexes fails with IndexOptionsConflict (and Beanie with it) when a
+    key already has an index with another name or other options, e.g. the
+    plain ``sessionData.lastActiveAt_1`` index that is now a TTL index. A
+    changed TTL alone is applied in place with collMod; any other mismatch
+    drops the old index so init_beanie builds the declared one. Indexes in
+    ``RETIRED_INDEXES`` are dropped outright.
+    """
+    for model in models or DOCUMENT_MODELS:
+        collection = database[model.Settings.name]
+        existing = await collection.index_information()
+        if not existing:
+            continue
+        for name in RETIRED_INDEXES.get(collection.name, ()):
+            if name in existing:
+                await collection.drop_index(name)
+                logging.warning(f"Dropped retired index {collection.name}.{name}")
+        for declared in _declared_indexes(model):
+            key = list(declared["key"].items())
+            for name, info in existing.items():
+                if name == "_id_" or [tuple(k) for k in info["key"]] != key:
+                    continue
+                differs = [o for o in INDEX_OPTIONS if info.get(o) != declared.get(o)]
+                if name == declared["name"] and not differs:
+                    continue
+                if name == declared["name"] and differs == ["expireAfterSeconds"] and "expireAfterSeconds" in info:
+                    await database.command(
+                        "collMod", collection.name,
+                        index={"name": name, "expireAfterSeconds": declared["expireAfterSeconds"]},
+                    )
+                    logging.info(f"Changed TTL of {collection.name}.{name} to {declared['expireAfterSeconds']}s")
+                    continue
+                await collection.drop_index(name)
+                logging.warning(f"Dropped index {collection.name}.{name}; it is rebuilt as {declared['name']}")
+
+async def reconcile_at_startup(mongodb_url: str = MONGODB_URI) -> bool:
+    """Reconcile indexes once before workers are forked, on a client that is closed again.
+
+    Workers inherit ``indexes_reconciled`` and skip reconciliation on connect;
+    if MongoDB is unreachable here, each worker reconciles on its first connect.
+    """
+    client = create_mongo_client(mongodb_url)
+    try:
+        await reconcile_indexes(client[database_name(mongodb_url)])
+        db_manager.indexes_reconciled = True
+    except Exception as e:
+        logging.warning(f"Index reconciliation at startup failed, workers will reconcile on connect: {e}")
+    finally:
+        client.close()
+    return db_manager.indexes_reconciled
+
+async def _warm_pool():
+    # Concurrent pings check out several sockets at once so the first requests don't pay for connects
+    await asyncio.gather(*(
+        db_manager.client.admin.command('ping') for _ in range(max(MONGO_MIN_POOL_SIZE, 1))
+    ))
+
 async def connect_to_mongo():
     """Create database connection"""
     try:
-        mongodb_url = os.getenv("MONGODB_URI", "mongodb://localhost:27017/health-beacon")
-        print(f"Connecting to MongoDB: {mongodb_url}")
-        
-        db_manager.client = AsyncIOMotorClient(mongodb_url)
-        
+        print(f"Connecting to MongoDB: {MONGODB_URI}")
+
+        if db_manager.client is None:
+            db_manager.client = create_mongo_client()
+
         # Test the connection
         await db_manager.client.admin.command('ping')
         print("MongoDB connection successful")
-        
-        # Get database name from URL or default
-        db_name = mongodb_url.split('/')[-1] if '/' in mongodb_url else "health-beacon"
-        db_manager.database = db_manager.client[db_name]
-        
+
+        db_manager.database = db_manager.client[database_name(MONGODB_URI)]
+
+        # Indexes only change with a deploy, so reconnects after an outage skip this
+        if not db_manager.indexes_reconciled:
+            await reconcile_indexes(db_manager.database)
+            db_manager.indexes_reconciled = True
         # Initialize Beanie with document models
         await init_beanie(
             database=db_manager.database,
-            document_models=[Patient, SymptomAnalysis, Doctor]
+            document_models=DOCUMENT_MODELS
         )
         print("Beanie initialized with document models")
-        
+
+        await _warm_pool()
+        db_manager.ready = True
+        db_manager.last_error = None
         return db_manager.database
-        
+
     except Exception as e:
+        db_manager.ready = False
+        db_manager.last_error = str(e)
         print(f"MongoDB connection failed: {e}")
         print("Falling back to in-memory storage...")
         return None
 
+async def _connection_loop():
+    """Connect with exponential backoff, then keep checking and reconnect after outages."""
+    delay = MONGO_RETRY_INITIAL_DELAY
+    seeded = False
+    while True:
+        if not db_manager.ready:
+            if await connect_to_mongo() is None:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MONGO_RETRY_MAX_DELAY)
+                continue
+            delay = MONGO_RETRY_INITIAL_DELAY
+            if SEED_SAMPLE_DATA and not seeded:
+                seeded = True
+                await seed_sample_data()
+
+        await asyncio.sleep(MONGO_HEALTH_INTERVAL)
+        try:
+            await db_manager.client.admin.command('ping')
+        except Exception as e:
+            print(f"MongoDB health check failed, reconnecting: {e}")
+            db_manager.ready = False
+            db_manager.last_error = str(e)
+
+def start_mongo():
+    """Create the shared client and connect in the background so startup is never blocked."""
+    if db_manager.task is None or db_manager.task.done():
+        db_manager.client = create_mongo_client()
+        db_manager.task = asyncio.create_task(_connection_loop())
+
+async def stop_mongo():
+    if db_manager.task:
+        db_manager.task.cancel()
+        try:
+            await db_manager.task
+        except asyncio.CancelledError:
+            pass
+        db_manager.task = None
+    db_manager.ready = False
+    await close_mongo_connection()
+
 async def close_mongo_connection():
     """Close database connection"""
     if db_manager.client:
         db_manager.client.close()
+        db_manager.client = None
         print("MongoDB connection closed")
 
 def get_database():
@@ -70,7 +245,7 @@ async def check_db_health():
             "version": server_info.get("version", "unknown"),
             "host": str(db_manager.client.address[0]) if db_manager.client.address else "unknown",
             "port": str(db_manager.client.address[1]) if db_manager.client.address else "unknown",
-            "database": db_manager.database.name if db_manager.database else "unknown"
+            "database": db_manager.database.name if db_manager.database is not None else "unknown"
         }
     except Exception as e:
         return {
@@ -196,8 +371,7 @@ async def seed_sample_data():
             )
         ]
         
-        for doctor in sample_doctors:
-            await doctor.save()
+        await Doctor.insert_many(sample_doctors)
             
         print(f"Seeded {len(sample_doctors)} sample doctors")
         
@@ -0,0 +1,90 @@
+"""Startup timing: how long the app took to import, per module, and to become ready.
+
+``install()`` must run before the rest of the app is imported. It puts a
+finder at the front of ``sys.meta_path`` that wraps each module's loader to
+time ``exec_module``; everything else is delegated to the original loader.
+Set ``IMPORT_PROFILE=false`` to leave the import system untouched.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import os
+import sys
+import time
+from importlib.abc import MetaPathFinder
+
+IMPORT_PROFILE = os.getenv("IMPORT_PROFILE", "true").lower() == "true"
+
+STARTED = time.perf_counter()
+# module name -> (cumulative seconds, seconds excluding nested imports)
+_modules: Dict[str, Tuple[float, float]] = {}
+_nested: List[float] = []
+_phases: Dict[str, float] = {}
+_warm_up: Dict[str, float] = {}
+
+class _TimedLoader:
+    def __init__(self, loader):
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        _nested.append(0.0)
+        try:
+            self._loader.exec_module(module)
+        finally:
+            total = time.perf_counter() - start
+            nested = _nested.pop()
+            _modules[module.__name__] = (total, total - nested)
+            if _nested:
+                _nested[-1] += total
+
+class _TimingFinder(MetaPathFinder):
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                spec.loader = _TimedLoader(spec.loader)
+            return spec
+        return None
+
+_finder: Optional[_TimingFinder] = None
+
+def install():
+    global _finder
+    if IMPORT_PROFILE and _finder is None:
+        _finder = _TimingFinder()
+        sys.meta_path.insert(0, _finder)
+
+def uninstall():
+    global _finder
+    if _finder is not None:
+        sys.meta_path.remove(_finder)
+        _finder = None
+
+def mark(phase: str):
+    """Record the seconds since process start at which a startup phase finished."""
+    _phases[phase] = time.perf_counter() - STARTED
+
+def record_warm_up(name: str, seconds: float):
+    _warm_up[name] = seconds
+
+def report(top: int = 25) -> Dict[str, Any]:
+    slowest = sorted(_modules.items(), key=lambda item: item[1][1], reverse=True)[:top]
+    return {
+        "profiled": IMPORT_PROFILE,
+        "phases": {k: round(v, 4) for k, v in _phases.items()},
+        "warmUp": {k: round(v, 4) for k, v in _warm_up.items()},
+        "modulesImported": len(_modules),
+        "slowestModules": [
+            {"module": name, "selfMs": round(own * 1000, 2), "cumulativeMs": round(total * 1000, 2)}
+            for name, (total, own) in slowest
+        ],
+    }
@@ -1,3 +1,7 @@
+# Installed first so the startup report covers every import below
+from . import import_profile
+import_profile.install()
+
 from dotenv import load_dotenv
 import os
 
@@ -10,37 +14,92 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from .routers import nearby
-from .routers import health, symptoms, patients
-from .database import connect_to_mongo, close_mongo_connection, seed_sample_data
+from .routers import admin, doctors, health, symptoms, patients, trends
+from .database import start_mongo, stop_mongo
+from .services.analysis_history import analysis_archiver
+from .services.availability import next_slot_refresher
+from .services.dependency_health import dependency_health
+from .services.diagnostics import ProfilingMiddleware, loop_lag_monitor
+from .services.doctor_cache import doctor_cache
+from .services.http_cache import CompressionMiddleware
+from .services.metrics import MetricsMiddleware
+from .services.rate_limit import RateLimitMiddleware, rate_limiter
+from .services.search_counters import search_counts
+from .services.symptom_trends import symptom_trends
+from .services.usage_analytics import usage_rollups
+from .services.warmup import warm_up
+import logging
 app = FastAPI(title="Health Beacon API", version="1.0.0")
+import_profile.mark("app_imported")
 
 # CORS
 cors_env = os.getenv("CORS_ORIGINS", "*")
 allowed_origins = [o.strip() for o in cors_env.split(",") if o.strip()] or ["*"]
+# Inside CORS, so preflights are not counted and 429s still carry CORS headers
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "RateLimit-Policy", "Retry-After"],
 )
+# Samples the loop for requests sent with X-Profile: 1 and a valid X-Admin-Token
+app.add_middleware(ProfilingMiddleware)
+# ETags, 304s and gzip/brotli for complete responses; streamed nearby results pass through
+app.add_middleware(CompressionMiddleware)
+# Outermost, so latency includes compression and status codes include CORS rejections
+app.add_middleware(MetricsMiddleware)
 
 # Events
 @app.on_event("startup")
 async def startup_event():
     """Initialize application"""
+    # Connects in the background; /api/health-check/ready reports when the pool is warm
+    start_mongo()
+    loop_lag_monitor.start()
+    dependency_health.start()
+    search_counts.start()
+    usage_rollups.start()
+    symptom_trends.start()
+    next_slot_refresher.start()
+    doctor_cache.start()
+    analysis_archiver.start()
+    rate_limiter.start()
+    # SDKs that are only needed by some requests load in the background
+    warm_up.start()
+    import_profile.mark("startup_complete")
+    report = import_profile.report(top=5)
+    slowest = ", ".join(f"{m['module']} {m['selfMs']:.0f}ms" for m in report["slowestModules"])
+    logging.info(f"App imported in {report['phases']['app_imported']:.2f}s; slowest modules: {slowest}")
     print("Health Beacon API started successfully")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean shutdown"""
+    # Flush pending search counts while the database connection is still open
+    await search_counts.stop()
+    await usage_rollups.stop()
+    await symptom_trends.stop()
+    await next_slot_refresher.stop()
+    await doctor_cache.stop()
+    await analysis_archiver.stop()
+    await loop_lag_monitor.stop()
+    await dependency_health.stop()
+    await rate_limiter.stop()
+    await warm_up.stop()
+    await stop_mongo()
     print("Health Beacon API shutdown")
 
 # Routers
 app.include_router(health.router, prefix="/api", tags=["health"]) 
 app.include_router(nearby.router, prefix="/api/doctors", tags=["doctors"]) 
+app.include_router(doctors.router, prefix="/api/doctors", tags=["doctors"]) 
 app.include_router(symptoms.router, prefix="/api/symptoms", tags=["symptoms"]) 
 app.include_router(patients.router, prefix="/api/patients", tags=["patients"]) 
+app.include_router(trends.router, prefix="/api/trends", tags=["trends"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 
 @app.get("/")
 async def root():
@@ -50,8 +109,10 @@ async def root():
         "endpoints": {
             "health": "/api/health",
             "health_check": "/api/health-check",
+            "metrics": "/api/metrics",
             "symptoms": "/api/symptoms",
             "doctors": "/api/doctors", 
-            "patients": "/api/patients"
+            "patients": "/api/patients",
+            "trends": "/api/trends"
         }
     }
@@ -1,8 +1,19 @@
-from beanie import Document
-from pydantic import BaseModel, Field
+from beanie import Document, Insert, PydanticObjectId, Replace, Save, SaveChanges, before_event
+from pydantic import BaseModel, ConfigDict, Field
+from pymongo import IndexModel
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
 import math
+import os
+
+# Schedules are written in the doctors' local time
+AVAILABILITY_TZ = ZoneInfo(os.getenv("AVAILABILITY_TIMEZONE", "Asia/Kolkata"))
+DAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOTS_PER_WEEK = 7 * SLOTS_PER_DAY
+BITMAP_BYTES = SLOTS_PER_WEEK // 8
 
 class Coordinates(BaseModel):
     latitude: float
@@ -50,9 +61,73 @@ class Schedule(BaseModel):
     slots: List[TimeSlot] = []
 
 class Availability(BaseModel):
+    # Mongo stores the bitmap as BinData; JSON output (API responses, cache sizing) gets URL-safe base64
+    model_config = ConfigDict(ser_json_bytes="base64", val_json_bytes="base64")
+
     schedule: List[Schedule] = []
     emergencyAvailable: bool = False
     nextAvailableSlot: Optional[datetime] = None
+    # One bit per quarter hour of the week, Monday 00:00 first, compiled from schedule on write.
+    # Bit n is bit n % 8 of byte n // 8, matching MongoDB's $bitsAllSet numbering for BinData.
+    weeklyBitmap: Optional[bytes] = None
+
+def _slot_index(hhmm: str, round_up: bool = False) -> int:
+    hours, minutes = (int(part) for part in hhmm.strip().split(":")[:2])
+    total = hours * 60 + minutes
+    slot = -(-total // SLOT_MINUTES) if round_up else total // SLOT_MINUTES
+    return max(0, min(SLOTS_PER_DAY, slot))
+
+def compile_schedule(schedule: List[Schedule]) -> int:
+    """Weekly schedule as an integer bitmask of SLOTS_PER_WEEK bits."""
+    mask = 0
+    for sched in schedule:
+        day = sched.day.strip().lower()
+        if day not in DAYS:
+            continue
+        base = DAYS.index(day) * SLOTS_PER_DAY
+        for slot in sched.slots:
+            try:
+                start = _slot_index(slot.startTime)
+                end = _slot_index(slot.endTime, round_up=True)
+            except ValueError:
+                continue
+            if end <= start:
+                # Overnight slot, e.g. 22:00-06:00, runs into the next day
+                end += SLOTS_PER_DAY
+            for i in range(base + start, base + end):
+                mask |= 1 << (i % SLOTS_PER_WEEK)
+    return mask
+
+def week_slot(moment: datetime) -> int:
+    """Bit index of the quarter hour containing ``moment``."""
+    local = moment.astimezone(AVAILABILITY_TZ) if moment.tzinfo else moment.replace(tzinfo=AVAILABILITY_TZ)
+    return local.weekday() * SLOTS_PER_DAY + (local.hour * 60 + local.minute) // SLOT_MINUTES
+
+def next_open_slot(mask: int, after: datetime) -> Optional[datetime]:
+    """Start of the open stretch ``after`` falls in, else of the next one; None for an empty schedule.
+
+    While a doctor is open the value is the start of the current opening (in
+    the past), so it stays the same until the opening ends instead of moving
+    with every quarter hour.
+    """
+    if not mask:
+        return None
+    local = after.astimezone(AVAILABILITY_TZ) if after.tzinfo else after.replace(tzinfo=AVAILABILITY_TZ)
+    current = week_slot(local)
+    full = (1 << SLOTS_PER_WEEK) - 1
+    # Rotate so bit 0 is the current slot; the lowest set bit is then the offset to the next opening
+    rotated = (mask >> current) | (mask << (SLOTS_PER_WEEK - current))
+    rotated &= full
+    slot_start = local.replace(minute=local.minute - local.minute % SLOT_MINUTES, second=0, microsecond=0)
+    if rotated == full:
+        # Always open: anchor to the start of the week
+        return slot_start - timedelta(minutes=current * SLOT_MINUTES)
+    offset = (rotated & -rotated).bit_length() - 1
+    if offset == 0:
+        # The slots just before the current one sit in the top bits; count the open run there
+        back = SLOTS_PER_WEEK - (~rotated & full).bit_length()
+        return slot_start - timedelta(minutes=back * SLOT_MINUTES)
+    return slot_start + timedelta(minutes=offset * SLOT_MINUTES)
 
 class ConsultationFee(BaseModel):
     inPerson: Optional[float] = None
@@ -92,6 +167,29 @@ class DoctorMetadata(BaseModel):
     lastUpdated: datetime = Field(default_factory=datetime.now)
     isActive: bool = True
     searchCount: int = 0
+    # Bumped by every write that changes what a profile shows (saves, imports, the next-slot
+    # refresher) and by nothing else; caches and ETags are keyed on it. Counter updates such as
+    # searchCount leave it alone.
+    version: int = 0
+
+# Indexes backing the directory search; the router hints these so every query shape is index-served.
+# The trailing _id keeps keyset pagination on (sort key, _id) fully ordered by the index.
+SPECIALTY_RATING_INDEX = [("specialty", 1), ("ratings.average", -1), ("_id", 1)]
+CITY_SPECIALTY_INDEX = [("location.hospital.address.city", 1), ("specialty", 1), ("ratings.average", -1), ("_id", 1)]
+CITY_RATING_INDEX = [("location.hospital.address.city", 1), ("ratings.average", -1), ("_id", 1)]
+RATING_INDEX = [("ratings.average", -1), ("_id", 1)]
+# The importer upserts on the licence number, so it must identify one doctor. Doctors without
+# a licence are not indexed and may repeat.
+LICENSE_INDEX = IndexModel(
+    [("verification.licenseNumber", 1)],
+    name="verification.licenseNumber_unique",
+    unique=True,
+    partialFilterExpression={"verification.licenseNumber": {"$type": "string"}},
+)
+# sort=recent pages on _id alone, so its filtered shapes need (filter..., _id) indexes
+SPECIALTY_RECENT_INDEX = [("specialty", 1), ("_id", -1)]
+CITY_SPECIALTY_RECENT_INDEX = [("location.hospital.address.city", 1), ("specialty", 1), ("_id", -1)]
+CITY_RECENT_INDEX = [("location.hospital.address.city", 1), ("_id", -1)]
 
 class Doctor(Document):
     name: str
@@ -112,9 +210,16 @@ class Doctor(Document):
         name = "doctors"
         indexes = [
             [("specialty", 1), ("location.hospital.coordinates", "2dsphere")],
-            [("location.hospital.city", 1), ("specialty", 1)],
-            [("ratings.average", -1)],
+            CITY_SPECIALTY_INDEX,
+            CITY_RATING_INDEX,
+            SPECIALTY_RATING_INDEX,
+            RATING_INDEX,
+            CITY_SPECIALTY_RECENT_INDEX,
+            CITY_RECENT_INDEX,
+            SPECIALTY_RECENT_INDEX,
+            "availability.nextAvailableSlot",
             "verification.isVerified",
+            LICENSE_INDEX,
             [("name", "text"), ("location.hospital.name", "text")]
         ]
     
@@ -136,6 +241,31 @@ class Doctor(Document):
         
         return R * c
     
+    @before_event(Insert, Replace, Save, SaveChanges)
+    def compile_availability(self, now: Optional[datetime] = None):
+        """Refresh the availability bitmap and nextAvailableSlot from the schedule."""
+        if not self.availability:
+            return
+        mask = compile_schedule(self.availability.schedule)
+        self.availability.weeklyBitmap = mask.to_bytes(BITMAP_BYTES, "little") if mask else None
+        self.availability.nextAvailableSlot = next_open_slot(mask, now or datetime.now(AVAILABILITY_TZ))
+
+    @before_event(Insert, Replace, Save, SaveChanges)
+    def bump_version(self):
+        self.metadata.version += 1
+
+    @property
+    def availability_mask(self) -> int:
+        if not self.availability:
+            return 0
+        if self.availability.weeklyBitmap is not None:
+            return int.from_bytes(self.availability.weeklyBitmap, "little")
+        return compile_schedule(self.availability.schedule)
+
+    def is_open_at(self, moment: datetime) -> bool:
+        """Check if doctor has a slot covering the given time"""
+        return bool(self.availability_mask >> week_slot(moment) & 1)
+
     def increment_search_count(self):
         """Increment search count"""
         self.metadata.searchCount += 1
@@ -143,13 +273,11 @@ class Doctor(Document):
     
     def is_available_on(self, day_name: str) -> bool:
         """Check if doctor is available on a specific day"""
-        if not self.availability or not self.availability.schedule:
+        day = day_name.lower()
+        if day not in DAYS:
             return False
-            
-        return any(
-            sched.day.lower() == day_name.lower() and sched.slots
-            for sched in self.availability.schedule
-        )
+        day_bits = (1 << SLOTS_PER_DAY) - 1
+        return bool(self.availability_mask >> (DAYS.index(day) * SLOTS_PER_DAY) & day_bits)
     
     @property
     def full_address(self) -> str:
@@ -178,4 +306,44 @@ class Doctor(Document):
         elif years < 20:
             return "senior"
         else:
-            return "expert"
\ No newline at end of file
+            return "expert"
+
+class DoctorListView(BaseModel):
+    """Card shown in directory lists; Mongo only sends these fields."""
+    id: PydanticObjectId = Field(alias="_id")
+    name: str
+    specialty: str
+    hospitalName: Optional[str] = None
+    city: Optional[str] = None
+    rating: Optional[float] = None
+    isVerified: bool = False
+    nextAvailableSlot: Optional[datetime] = None
+
+    class Settings:
+        projection = {
+            "nextAvailableSlot": "$availability.nextAvailableSlot",
+            "name": 1,
+            "specialty": 1,
+            "hospitalName": "$location.hospital.name",
+            "city": "$location.hospital.address.city",
+            "rating": "$ratings.average",
+            "isVerified": "$verification.isVerified",
+        }
+
+class DoctorMapView(BaseModel):
+    """Marker payload for map views."""
+    id: PydanticObjectId = Field(alias="_id")
+    name: str
+    specialty: str
+    latitude: float
+    longitude: float
+    rating: Optional[float] = None
+
+    class Settings:
+        projection = {
+            "name": 1,
+            "specialty": 1,
+            "latitude": "$location.hospital.coordinates.latitude",
+            "longitude": "$location.hospital.coordinates.longitude",
+            "rating": "$ratings.average",
+        }
@@ -0,0 +1,15 @@
+from beanie import Document
+from datetime import datetime
+
+class Lease(Document):
+    """Which process runs a background job that must only run once across workers.
+
+    The owner renews the lease on every pass; a lease whose ``expiresAt`` has
+    passed can be taken over by any other process.
+    """
+    id: str
+    owner: str
+    expiresAt: datetime
+
+    class Settings:
+        name = "leases"
@@ -0,0 +1,24 @@
+from beanie import Document
+from pymongo import IndexModel
+from typing import Any, Dict, List
+from datetime import datetime
+import os
+
+# Long enough for a user to pan and zoom the map of one search
+NEARBY_RESULT_TTL = int(os.getenv("NEARBY_RESULT_TTL", "3600"))
+
+class NearbyResultSet(Document):
+    """Doctors returned by one nearby search, so any worker can page its map clusters.
+
+    Stored once when the search answers and never updated; the TTL index on
+    ``expiresAt`` removes it ``NEARBY_RESULT_TTL`` seconds later.
+    """
+    id: str
+    doctors: List[Dict[str, Any]]
+    expiresAt: datetime
+
+    class Settings:
+        name = "nearby_results"
+        indexes = [
+            IndexModel([("expiresAt", 1)], expireAfterSeconds=0, name="expiresAt_ttl"),
+        ]
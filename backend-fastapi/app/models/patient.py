@@ -1,9 +1,14 @@
 from beanie import Document
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, List
 from datetime import datetime
+from pymongo import ASCENDING, IndexModel
+import os
 import uuid
 
+# Sessions idle for longer than this are removed by Mongo's TTL monitor (and by the in-memory store)
+SESSION_IDLE_TTL = int(os.getenv("SESSION_IDLE_TTL", str(7 * 24 * 3600)))
+
 class SessionData(BaseModel):
     createdAt: datetime = Field(default_factory=datetime.now)
     lastActiveAt: datetime = Field(default_factory=datetime.now)
@@ -11,12 +16,25 @@ class SessionData(BaseModel):
     totalDoctorSearches: int = 0
     isActive: bool = True
 
+# Keys clients send for a position next to the city instead of under "coordinates"
+COORDINATE_KEYS = ("latitude", "longitude", "lat", "lng", "lon")
+
 class Location(BaseModel):
     city: Optional[str] = None
     state: Optional[str] = None
     country: Optional[str] = None
     coordinates: Optional[dict] = None
 
+    @model_validator(mode="before")
+    @classmethod
+    def nest_coordinates(cls, value):
+        # Undeclared keys would be dropped, and symptom trends read the position from here
+        if isinstance(value, dict) and any(k in value for k in COORDINATE_KEYS):
+            value = dict(value)
+            loose = {k: value.pop(k) for k in COORDINATE_KEYS if k in value}
+            value["coordinates"] = {**loose, **(value.get("coordinates") or {})}
+        return value
+
 class EmergencyContact(BaseModel):
     name: Optional[str] = None
     phone: Optional[str] = None
@@ -43,7 +61,11 @@ class Patient(Document):
         indexes = [
             "sessionId",
             "email",
-            "sessionData.lastActiveAt"
+            IndexModel(
+                [("sessionData.lastActiveAt", ASCENDING)],
+                name="sessionData.lastActiveAt_ttl",
+                expireAfterSeconds=SESSION_IDLE_TTL,
+            ),
         ]
     
     def update_last_active(self):
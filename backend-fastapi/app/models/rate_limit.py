@@ -0,0 +1,23 @@
+from beanie import Document
+from pydantic import Field
+from pymongo import IndexModel
+from typing import Dict
+from datetime import datetime
+
+class RateLimitCounter(Document):
+    """Request counts for one client and rate-limit rule, shared by all workers.
+
+    ``counts`` maps a window index to the requests seen in it. Only the
+    current and previous windows are kept: each hit increments the current
+    one and unsets the one before the previous in the same update. Idle
+    counters are removed by the TTL index on ``expiresAt``.
+    """
+    id: str
+    counts: Dict[str, int] = Field(default_factory=dict)
+    expiresAt: datetime
+
+    class Settings:
+        name = "rate_limits"
+        indexes = [
+            IndexModel([("expiresAt", 1)], expireAfterSeconds=0, name="expiresAt_ttl"),
+        ]
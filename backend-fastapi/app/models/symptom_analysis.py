@@ -1,12 +1,15 @@
-from beanie import Document
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Any, Optional, List
 from datetime import datetime
 
+# _id breaks createdAt ties so history pages are served straight from the index
+SESSION_HISTORY_INDEX = [("sessionId", 1), ("createdAt", -1), ("_id", -1)]
+
 class Symptom(BaseModel):
     name: str
-    severity: str  # mild, moderate, severe
-    duration: str
+    severity: Optional[str] = None  # mild, moderate, severe
+    duration: Optional[str] = None
     description: Optional[str] = None
     bodyPart: Optional[str] = None
     triggers: List[str] = []
@@ -40,18 +43,30 @@ class MedicationSuggestion(BaseModel):
 
 class SpecialistRecommendation(BaseModel):
     recommended: bool = False
+    specialty: Optional[str] = None
     specialties: List[str] = []
     urgency: Optional[str] = None  # routine, within-week, within-days, immediate
 
 class Analysis(BaseModel):
-    riskLevel: str  # low, medium, high, emergency
-    confidence: float  # 0-100
+    # Analyzers also return model, source and disclaimer; they are kept with the analysis
+    model_config = ConfigDict(extra="allow")
+
+    riskLevel: str = "unknown"  # low, medium, high, emergency, unknown
+    confidence: float = 0  # 0-100
     possibleConditions: List[PossibleCondition] = []
     recommendations: List[Recommendation] = []
     warningFlags: List[WarningFlag] = []
     medicationSuggestions: List[MedicationSuggestion] = []
     specialistRecommendation: Optional[SpecialistRecommendation] = None
 
+    @field_validator("warningFlags", mode="before")
+    @classmethod
+    def plain_warning_flags(cls, flags: Any) -> Any:
+        # The fallback analyzers return warnings as plain strings
+        if isinstance(flags, list):
+            return [{"flag": f, "severity": "warning"} if isinstance(f, str) else f for f in flags]
+        return flags
+
 class Feedback(BaseModel):
     helpful: Optional[bool] = None
     rating: Optional[int] = None  # 1-5
@@ -68,6 +83,7 @@ class Metadata(BaseModel):
 class SymptomAnalysis(Document):
     sessionId: str
     patientId: Optional[str] = None  # Changed from ObjectId to str
+    geohash: Optional[str] = None  # Coarse cell of the patient location, used for trend heatmaps
     symptoms: List[Symptom]
     analysis: Analysis
     feedback: Optional[Feedback] = None
@@ -77,7 +93,7 @@ class SymptomAnalysis(Document):
     class Settings:
         name = "symptom_analyses"
         indexes = [
-            [("sessionId", 1), ("createdAt", -1)],
+            SESSION_HISTORY_INDEX,
             "analysis.riskLevel",
             "symptoms.name"
         ]
@@ -99,4 +115,22 @@ class SymptomAnalysis(Document):
         return [
             rec for rec in self.analysis.recommendations
             if rec.priority in ["urgent", "high"]
-        ]
\ No newline at end of file
+        ]
+
+class AnalysisSummaryView(BaseModel):
+    """History row; the full analysis is only loaded when one is opened."""
+    id: PydanticObjectId = Field(alias="_id")
+    createdAt: datetime
+    riskLevel: Optional[str] = None
+    confidence: Optional[float] = None
+    symptoms: List[str] = []
+    conditions: List[str] = []
+
+    class Settings:
+        projection = {
+            "createdAt": 1,
+            "riskLevel": "$analysis.riskLevel",
+            "confidence": "$analysis.confidence",
+            "symptoms": "$symptoms.name",
+            "conditions": "$analysis.possibleConditions.name",
+        }
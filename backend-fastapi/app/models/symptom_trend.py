@@ -0,0 +1,23 @@
+from beanie import Document
+from pymongo import ASCENDING, IndexModel
+from datetime import datetime
+
+class SymptomTrendCell(Document):
+    """Number of analyses reporting one canonical symptom in one geohash cell on one day.
+
+    The cell centre is stored alongside the geohash so bounding-box queries
+    can range over latitude and longitude directly.
+    """
+    cell: str
+    day: datetime
+    symptom: str
+    total: int = 0
+    latitude: float
+    longitude: float
+
+    class Settings:
+        name = "symptom_trends"
+        indexes = [
+            IndexModel([("cell", ASCENDING), ("day", ASCENDING), ("symptom", ASCENDING)], unique=True),
+            IndexModel([("day", ASCENDING), ("latitude", ASCENDING), ("longitude", ASCENDING)]),
+        ]
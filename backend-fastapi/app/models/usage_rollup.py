@@ -0,0 +1,38 @@
+from beanie import Document
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+from typing import Dict
+from datetime import datetime
+import os
+
+# Session buckets are kept as long as the longest analytics window; global buckets are kept forever
+SESSION_ROLLUP_RETENTION = int(os.getenv("USAGE_SESSION_RETENTION", str(90 * 24 * 3600)))
+
+class UsageRollup(Document):
+    """Usage counters for one scope ("global" or "session:<id>") and one hour.
+
+    Documents are only written with ``$inc`` upserts, so each analyze or
+    nearby call adds to the current bucket instead of being recounted later.
+    Session buckets expire ``SESSION_ROLLUP_RETENTION`` seconds after their
+    hour starts.
+    """
+    scope: str
+    bucketStart: datetime
+    symptomChecks: int = 0
+    doctorSearches: int = 0
+    riskLevels: Dict[str, int] = Field(default_factory=dict)
+    symptoms: Dict[str, int] = Field(default_factory=dict)
+    specialties: Dict[str, int] = Field(default_factory=dict)
+
+    class Settings:
+        name = "usage_rollups"
+        indexes = [
+            IndexModel([("scope", ASCENDING), ("bucketStart", ASCENDING)], unique=True),
+            # Partial filters cannot use $regex; this range is exactly the scopes starting with "session:"
+            IndexModel(
+                [("bucketStart", ASCENDING)],
+                name="bucketStart_session_ttl",
+                expireAfterSeconds=SESSION_ROLLUP_RETENTION,
+                partialFilterExpression={"scope": {"$gt": "session:", "$lt": "session;"}},
+            ),
+        ]
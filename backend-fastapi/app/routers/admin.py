@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import asyncio
+from ..services.diagnostics import ADMIN_TOKEN, admin_token_valid, loop_lag_monitor, memory_snapshots, profiles
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled")
+    if not admin_token_valid(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+# Diagnostics are per worker: each request lands on whichever worker accepted the connection
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+GROUPINGS = r"^(lineno|filename|traceback)$"
+
+@router.get("/profiles")
+async def list_profiles():
+    """Profiles recorded for requests sent with ``X-Profile: 1``."""
+    return {"status": "success", "data": profiles.list()}
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    """Folded stacks (``frame;frame;frame count``) for flamegraph.pl or speedscope."""
+    profile = profiles.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(profile.folded())
+
+@router.get("/loop-lag")
+async def loop_lag():
+    return {"status": "success", "data": loop_lag_monitor.stats()}
+
+@router.get("/memory")
+async def memory_status():
+    return {"status": "success", "data": memory_snapshots.status()}
+
+@router.post("/memory/snapshot")
+async def take_memory_snapshot(
+    top: int = Query(20, ge=1, le=200),
+    group: str = Query("lineno", pattern=GROUPINGS),
+):
+    """Start tracing if needed and store a baseline snapshot."""
+    # Snapshots of a large heap take a while; keep the heartbeat and other requests moving
+    data = await asyncio.to_thread(memory_snapshots.take, top, group)
+    return {"status": "success", "data": data}
+
+@router.get("/memory/diff")
+async def diff_memory_snapshot(
+    top: int = Query(20, ge=1, le=200),
+    group: str = Query("lineno", pattern=GROUPINGS),
+    rebase: bool = Query(False, description="Make this snapshot the new baseline"),
+):
+    """Allocations that grew the most since the baseline snapshot."""
+    data = await asyncio.to_thread(memory_snapshots.diff, top, group, rebase)
+    if data is None:
+        raise HTTPException(status_code=409, detail="Take a baseline snapshot first")
+    return {"status": "success", "data": data}
+
+@router.delete("/memory/snapshot")
+async def stop_memory_tracing():
+    """Drop the baseline and stop tracemalloc, which slows down every allocation while on."""
+    memory_snapshots.stop()
+    return {"status": "success", "data": memory_snapshots.status()}
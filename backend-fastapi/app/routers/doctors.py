@@ -0,0 +1,204 @@
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING
+import base64
+import json
+from ..database import db_manager
+from ..models.doctor import (
+    AVAILABILITY_TZ,
+    Doctor,
+    DoctorListView,
+    DoctorMapView,
+    CITY_RATING_INDEX,
+    CITY_RECENT_INDEX,
+    CITY_SPECIALTY_INDEX,
+    CITY_SPECIALTY_RECENT_INDEX,
+    RATING_INDEX,
+    SPECIALTY_RATING_INDEX,
+    SPECIALTY_RECENT_INDEX,
+    week_slot,
+)
+from ..services.doctor_cache import CACHE_STALENESS_SECONDS, doctor_cache
+from ..services.http_cache import conditional, make_etag
+from ..services.search_counters import search_counts
+from ..services.specialties import normalize_specialty
+
+router = APIRouter()
+
+RATING_FIELD = "ratings.average"
+# List-style responses use projections; the full document is only loaded by the detail endpoint
+VIEWS = {"list": DoctorListView, "map": DoctorMapView}
+
+def encode_cursor(value: Any, doc_id: ObjectId) -> str:
+    raw = json.dumps({"v": value, "id": str(doc_id)}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Any, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return data.get("v"), ObjectId(data["id"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def choose_index(
+    specialty: Optional[str], city: Optional[str], q: Optional[str], sort: str = "rating",
+) -> Optional[List[Tuple[str, Any]]]:
+    """Pick the declared index that serves this query shape.
+
+    Equality filters come first in every compound index, followed by the
+    sort key (rating then _id, or _id alone for recent), so the index
+    delivers rows already in keyset order and a deep page costs the same as
+    the first one.
+    """
+    if q:
+        # $text queries always run on the text index and cannot be hinted
+        return None
+    if sort == "recent":
+        if city and specialty:
+            return CITY_SPECIALTY_RECENT_INDEX
+        if city:
+            return CITY_RECENT_INDEX
+        if specialty:
+            return SPECIALTY_RECENT_INDEX
+        return [("_id", 1)]
+    if city and specialty:
+        return CITY_SPECIALTY_INDEX
+    if city:
+        return CITY_RATING_INDEX
+    if specialty:
+        return SPECIALTY_RATING_INDEX
+    return RATING_INDEX
+
+def keyset_filter(sort: str, cursor: Optional[str]) -> Dict[str, Any]:
+    if not cursor:
+        return {}
+    value, last_id = decode_cursor(cursor)
+    if sort == "recent":
+        return {"_id": {"$lt": last_id}}
+    # Doctors without ratings sort after every rated doctor in descending order
+    if value is None:
+        return {RATING_FIELD: None, "_id": {"$gt": last_id}}
+    return {"$or": [
+        {RATING_FIELD: {"$lt": value}},
+        {RATING_FIELD: value, "_id": {"$gt": last_id}},
+        {RATING_FIELD: None},
+    ]}
+
+@router.get("/search")
+async def search_doctors(
+    response: Response,
+    q: Optional[str] = Query(None, min_length=2, description="Full-text search on doctor and hospital name"),
+    specialty: Optional[str] = None,
+    city: Optional[str] = None,
+    verified: Optional[bool] = None,
+    mode: Optional[str] = Query(None, pattern=r"^(in-person|online)$", description="Consultation mode"),
+    min_fee: Optional[float] = Query(None, ge=0),
+    max_fee: Optional[float] = Query(None, ge=0),
+    open_now: bool = Query(False, description="Only doctors with a schedule slot covering the current time"),
+    available_before: Optional[datetime] = Query(None, description="Only doctors whose next open slot starts by then"),
+    sort: str = Query("rating", pattern=r"^(rating|recent)$"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="nextCursor from the previous page"),
+    view: str = Query("list", pattern=r"^(list|map)$"),
+):
+    if not db_manager.ready:
+        raise HTTPException(status_code=503, detail="Doctor directory is unavailable")
+
+    specialty = normalize_specialty(specialty) or (specialty.strip().lower() if specialty else None)
+    city = city.strip() if city else None
+
+    filters: List[Dict[str, Any]] = [{"metadata.isActive": True}]
+    if q:
+        filters.append({"$text": {"$search": q}})
+    if city:
+        filters.append({"location.hospital.address.city": city})
+    if specialty:
+        filters.append({"specialty": specialty})
+    if verified is not None:
+        filters.append({"verification.isVerified": verified})
+    if mode:
+        filters.append({"location.consultationModes": mode})
+    if min_fee is not None or max_fee is not None:
+        fee_field = "fees.consultationFee.online" if mode == "online" else "fees.consultationFee.inPerson"
+        fee_range: Dict[str, float] = {}
+        if min_fee is not None:
+            fee_range["$gte"] = min_fee
+        if max_fee is not None:
+            fee_range["$lte"] = max_fee
+        filters.append({fee_field: fee_range})
+    if open_now:
+        # Bitwise test against the precompiled weekly bitmap instead of walking schedules
+        slot = week_slot(datetime.now(AVAILABILITY_TZ))
+        filters.append({"availability.weeklyBitmap": {"$bitsAllSet": [slot]}})
+    if available_before:
+        filters.append({"availability.nextAvailableSlot": {"$lte": available_before}})
+    page_filter = keyset_filter(sort, cursor)
+    if page_filter:
+        filters.append(page_filter)
+
+    if sort == "recent":
+        sort_spec = [("_id", DESCENDING)]
+    else:
+        sort_spec = [(RATING_FIELD, DESCENDING), ("_id", ASCENDING)]
+    index = choose_index(specialty, city, q, sort)
+
+    # open_now results change with the slot, so the slot is part of the key
+    cache_key = (
+        q, specialty, city, verified, mode, min_fee, max_fee,
+        week_slot(datetime.now(AVAILABILITY_TZ)) if open_now else None,
+        available_before, sort, limit, cursor, view,
+    )
+    cached = doctor_cache.get_query(cache_key)
+    if cached is None:
+        options: Dict[str, Any] = {"hint": index} if index else {}
+        # One extra row tells us whether another page exists without a count query
+        docs = await Doctor.find_many(
+            {"$and": filters}, projection_model=VIEWS[view], sort=sort_spec, limit=limit + 1, **options
+        ).to_list()
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+
+        next_cursor = None
+        if has_more and docs:
+            last = docs[-1]
+            value = None if sort == "recent" else last.rating
+            next_cursor = encode_cursor(value, last.id)
+        cached = ([d.id for d in docs], [d.model_dump(mode="json") for d in docs], next_cursor)
+        doctor_cache.put_query(cache_key, cached)
+
+    doctor_ids, doctors, next_cursor = cached
+    search_counts.record(doctor_ids)
+    # Pages can be reused for as long as this worker's own cache would serve them
+    response.headers["Cache-Control"] = f"public, max-age={int(CACHE_STALENESS_SECONDS)}"
+
+    return {
+        "status": "success",
+        "data": {
+            "doctors": doctors,
+            "count": len(doctors),
+            "nextCursor": next_cursor,
+        }
+    }
+
+@router.get("/{doctor_id}")
+async def get_doctor(doctor_id: str, request: Request, response: Response):
+    """Full doctor profile, loaded on demand when a card is opened."""
+    if not db_manager.ready:
+        raise HTTPException(status_code=503, detail="Doctor directory is unavailable")
+    if not ObjectId.is_valid(doctor_id):
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    doctor = await doctor_cache.get_doctor(doctor_id)
+    if not doctor:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    not_modified = conditional(
+        request, response, make_etag("doctor", doctor_id, doctor.metadata.version),
+        f"public, max-age={int(CACHE_STALENESS_SECONDS)}",
+    )
+    if not_modified:
+        return not_modified
+    # searchCount changes without a version bump, so it is left out of the versioned body
+    return {"status": "success", "data": doctor.model_dump(mode="json", exclude={"metadata": {"searchCount"}})}
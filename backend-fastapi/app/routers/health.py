@@ -1,4 +1,5 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse, Response
 import os
 import platform
 import time
@@ -6,27 +7,15 @@ try:
     import psutil  # type: ignore
 except Exception:  # pragma: no cover
     psutil = None
+from .. import import_profile
+from ..services import metrics
+from ..services.dependency_health import dependency_health
+from ..services.doctor_cache import doctor_cache
 
 router = APIRouter()
 
 start_time = time.time()
 
-def _service_status():
-    return {
-        "geminiAI": {
-            "status": "configured" if os.getenv("GEMINI_API_KEY") else "not-configured",
-            "message": "Gemini AI service ready" if os.getenv("GEMINI_API_KEY") else "Gemini API key not found",
-        },
-        "osm": {
-            "status": "configured",
-            "message": "Using OpenStreetMap (Nominatim + Overpass)",
-        },
-        "database": {
-            "status": "not-implemented",
-            "message": "Using in-memory storage (implement DB for production)",
-        },
-    }
-
 @router.get("/health")
 async def simple_health():
     return {
@@ -39,13 +28,16 @@ async def simple_health():
 @router.get("/health-check")
 async def detailed_health():
     mem = psutil.virtual_memory() if psutil else None
+    is_ready, _ = dependency_health.readiness()
     return {
-        "status": "healthy",
+        "status": "healthy" if is_ready else "degraded",
         "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
         "uptime": time.time() - start_time,
         "environment": os.getenv("ENV", "development"),
         "version": "1.0.0",
-        "services": _service_status(),
+        # Cached by the background prober; no dependency is contacted while answering
+        "services": dependency_health.snapshot()["dependencies"],
+        "caches": {"doctors": doctor_cache.stats()},
         "system": {
             "pythonVersion": platform.python_version(),
             "platform": platform.system().lower(),
@@ -72,9 +64,27 @@ async def ping():
 
 @router.get("/health-check/ready")
 async def ready():
-    # Add real readiness checks here if needed
+    is_ready, reasons = dependency_health.readiness()
+    if not is_ready:
+        return JSONResponse(status_code=503, content={"status": "not-ready", "message": "; ".join(reasons)})
     return {"status": "ready", "message": "Service is ready to handle requests"}
 
+@router.get("/health-check/dependencies")
+async def dependencies():
+    """Latest probe results for MongoDB, Gemini, Nominatim and each Overpass mirror."""
+    is_ready, reasons = dependency_health.readiness()
+    return {"status": "success", "data": {**dependency_health.snapshot(), "ready": is_ready, "notReadyReasons": reasons}}
+
+@router.get("/health-check/startup")
+async def startup_report(top: int = 25):
+    """Import and startup timings, to see what dominates cold starts."""
+    return {"status": "success", "data": import_profile.report(top=max(1, min(top, 200)))}
+
+@router.get("/metrics")
+async def prometheus_metrics():
+    """Request, upstream and cache metrics for this worker in Prometheus text format."""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @router.get("/health-check/live")
 async def live():
     return {"status": "alive", "uptime": time.time() - start_time}
@@ -1,18 +1,34 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
 import httpx
+import json
 import os
 import math
+from ..services.clustering import DoctorDeduper, dedupe_doctors, latitude_bound, result_sets
+from ..services.http_cache import conditional, make_etag
+from ..services.metrics import upstream_transport
+from ..services.overpass_stream import OverpassElementParser
+from ..services.reverse_geocoder import fill_missing_localities
+from ..services.specialties import osm_speciality_pattern, resolve_specialty
+from ..services.usage_analytics import usage_rollups
 
 OSM_NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
-OVERPASS_URLS = [
+# OVERPASS_URLS (comma separated) replaces the whole mirror list; OVERPASS_URL only the first mirror
+OVERPASS_URLS = [u.strip() for u in os.getenv("OVERPASS_URLS", "").split(",") if u.strip()] or [
     os.getenv("OVERPASS_URL", "https://overpass-api.de/api/interpreter"),
     "https://overpass.openstreetmap.ru/api/interpreter",
     "https://overpass.kumi.systems/api/interpreter"
 ]
 USER_AGENT = os.getenv("APP_USER_AGENT", "health-beacon/1.0 (contact: youremail@example.com)")
 MOCK_MODE = os.getenv("MOCK_NEARBY", "false").lower() == "true"
+# Streaming searches query this fraction of the radius first so the nearest markers arrive early
+STREAM_INNER_RING_FRACTION = float(os.getenv("NEARBY_STREAM_INNER_FRACTION", "0.25"))
+STREAM_MIN_INNER_RADIUS_M = 500
+# Adaptive searches start small and grow geometrically until enough doctors are found
+ADAPTIVE_START_RADIUS_KM = float(os.getenv("NEARBY_ADAPTIVE_START_KM", "1"))
+ADAPTIVE_GROWTH_FACTOR = float(os.getenv("NEARBY_ADAPTIVE_GROWTH", "2"))
 
 router = APIRouter()
 
@@ -26,6 +42,10 @@ class NearbyRequest(BaseModel):
     longitude: Optional[float] = Field(None, ge=-180, le=180)
     radius_km: float = Field(5, gt=0, le=50, description="Search radius in kilometers")
     limit: int = Field(25, gt=0, le=100)
+    specialty: Optional[str] = Field(None, description="Specialty to search for, e.g. the analysis specialistRecommendation")
+    condition: Optional[str] = Field(None, description="Condition name used to pick a specialty when none is given")
+    adaptive: bool = Field(False, description="Grow the radius from a small start until `limit` doctors are found")
+    sessionId: Optional[str] = Field(None, description="Patient session the search is counted against")
 
     @validator("longitude")
     def require_both_coords(cls, v, values):
@@ -40,6 +60,9 @@ class Doctor(BaseModel):
     phone: Optional[str] = None
     website: Optional[str] = None
     address: Optional[str] = None
+    approximate_locality: Optional[str] = Field(
+        None, description="Nearest gazetteer locality, set only when OSM has no address for the place"
+    )
     coordinates: Coordinates
     source: str = "osm"
     distance_km: Optional[float] = None
@@ -47,9 +70,24 @@ class Doctor(BaseModel):
 class NearbyResponse(BaseModel):
     center: Coordinates
     radius_km: float
+    effective_radius_km: Optional[float] = None
+    specialty: Optional[str] = None
+    result_id: Optional[str] = Field(None, description="Pass to /clusters/{result_id} to page map clusters")
     total: int
     doctors: List[Doctor]
 
+class MapCluster(BaseModel):
+    latitude: float
+    longitude: float
+    count: int
+    doctor: Optional[Doctor] = Field(None, description="Set when the cluster is a single doctor")
+
+class ClusterResponse(BaseModel):
+    result_id: str
+    zoom: int
+    total: int
+    clusters: List[MapCluster]
+
 async def geocode_address(address: str) -> Coordinates:
     params = {
         "q": address,
@@ -59,7 +97,7 @@ async def geocode_address(address: str) -> Coordinates:
     }
     headers = {"User-Agent": USER_AGENT}
     timeout = httpx.Timeout(10.0, read=10.0)
-    async with httpx.AsyncClient(headers=headers, timeout=timeout) as client:
+    async with httpx.AsyncClient(headers=headers, timeout=timeout, transport=upstream_transport("nominatim")) as client:
         r = await client.get(OSM_NOMINATIM_URL, params=params)
         if r.status_code != 200:
             raise HTTPException(status_code=502, detail="Geocoding service error")
@@ -70,27 +108,72 @@ async def geocode_address(address: str) -> Coordinates:
         lon = float(data[0]["lon"])
         return Coordinates(latitude=lat, longitude=lon)
 
-async def fetch_overpass(lat: float, lon: float, radius_m: int, limit: int):
-    # Doctors, clinics, hospitals
-    # amenity=doctors is rare; often healthcare=doctor; clinics/hospitals also relevant
-    query = f"""
+# Element selectors for doctors, clinics and hospitals.
+# amenity=doctors is rare; often healthcare=doctor; clinics/hospitals also relevant
+OVERPASS_SELECTORS = [
+    'node["healthcare"="doctor"]',
+    'node["healthcare"="clinic"]',
+    'node["amenity"="clinic"]',
+    'node["amenity"="hospital"]',
+    'way["healthcare"="clinic"]',
+    'way["amenity"="clinic"]',
+    'way["amenity"="hospital"]',
+    'relation["amenity"="hospital"]',
+]
+
+def _overpass_union(lat: float, lon: float, radius_m: int, tag_filter: str, indent: str) -> str:
+    return "\n".join(
+        f"{indent}{selector}{tag_filter}(around:{radius_m},{lat},{lon});" for selector in OVERPASS_SELECTORS
+    )
+
+def build_overpass_query(
+    lat: float,
+    lon: float,
+    radius_m: int,
+    limit: int,
+    speciality_pattern: Optional[str] = None,
+    exclude_radius_m: int = 0,
+) -> str:
+    # Filtering on healthcare:speciality server-side keeps untargeted POIs out of the payload
+    tag_filter = f'["healthcare:speciality"~"{speciality_pattern}",i]' if speciality_pattern else ""
+    if not exclude_radius_m:
+        statements = _overpass_union(lat, lon, radius_m, tag_filter, "      ")
+        return f"""
     [out:json][timeout:25];
     (
-      node["healthcare"="doctor"](around:{radius_m},{lat},{lon});
-      node["healthcare"="clinic"](around:{radius_m},{lat},{lon});
-      node["amenity"="clinic"](around:{radius_m},{lat},{lon});
-      node["amenity"="hospital"](around:{radius_m},{lat},{lon});
-      way["healthcare"="clinic"](around:{radius_m},{lat},{lon});
-      way["amenity"="clinic"](around:{radius_m},{lat},{lon});
-      way["amenity"="hospital"](around:{radius_m},{lat},{lon});
-      relation["amenity"="hospital"](around:{radius_m},{lat},{lon});
+{statements}
     );
     out center {limit};
     """
+    # Ring query: everything within radius_m minus what an earlier query already returned
+    outer = _overpass_union(lat, lon, radius_m, tag_filter, "        ")
+    inner = _overpass_union(lat, lon, exclude_radius_m, tag_filter, "        ")
+    return f"""
+    [out:json][timeout:25];
+    (
+      (
+{outer}
+      );
+      - (
+{inner}
+      );
+    );
+    out center {limit};
+    """
+
+async def fetch_overpass(
+    lat: float,
+    lon: float,
+    radius_m: int,
+    limit: int,
+    speciality_pattern: Optional[str] = None,
+    exclude_radius_m: int = 0,
+):
+    query = build_overpass_query(lat, lon, radius_m, limit, speciality_pattern, exclude_radius_m)
     headers = {"User-Agent": USER_AGENT, "Content-Type": "application/x-www-form-urlencoded"}
     timeout = httpx.Timeout(25.0, read=25.0)
     last_exc: Optional[Exception] = None
-    async with httpx.AsyncClient(headers=headers, timeout=timeout) as client:
+    async with httpx.AsyncClient(headers=headers, timeout=timeout, transport=upstream_transport("overpass")) as client:
         for url in OVERPASS_URLS:
             try:
                 r = await client.post(url, data={"data": query})
@@ -101,6 +184,43 @@ async def fetch_overpass(lat: float, lon: float, radius_m: int, limit: int):
                 continue
     raise HTTPException(status_code=502, detail="Overpass service error")
 
+async def stream_overpass(
+    lat: float,
+    lon: float,
+    radius_m: int,
+    limit: int,
+    speciality_pattern: Optional[str] = None,
+    exclude_radius_m: int = 0,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Yield Overpass elements as soon as each one has been received.
+
+    Mirrors are tried in order, but only until the first element has been
+    yielded; after that a failure is propagated to the caller.
+    """
+    query = build_overpass_query(lat, lon, radius_m, limit, speciality_pattern, exclude_radius_m)
+    headers = {"User-Agent": USER_AGENT, "Content-Type": "application/x-www-form-urlencoded"}
+    timeout = httpx.Timeout(25.0, read=25.0)
+    async with httpx.AsyncClient(headers=headers, timeout=timeout, transport=upstream_transport("overpass")) as client:
+        for url in OVERPASS_URLS:
+            yielded = False
+            try:
+                async with client.stream("POST", url, data={"data": query}) as r:
+                    if r.status_code != 200:
+                        continue
+                    parser = OverpassElementParser()
+                    async for chunk in r.aiter_bytes():
+                        for el in parser.feed(chunk):
+                            yielded = True
+                            yield el
+                        if parser.done:
+                            break
+                    return
+            except Exception:
+                if yielded:
+                    raise
+                continue
+    raise HTTPException(status_code=502, detail="Overpass service error")
+
 def haversine_km(lat1, lon1, lat2, lon2):
     R = 6371.0
     dlat = math.radians(lat2 - lat1)
@@ -134,88 +254,271 @@ def extract_address(tags: dict) -> Optional[str]:
     cleaned = [p for p in parts if p]
     return ", ".join(cleaned) if cleaned else None
 
-@router.post("/nearby", response_model=NearbyResponse)
-async def nearby_search(payload: NearbyRequest):
-    # Determine coordinates
-    if payload.latitude is not None and payload.longitude is not None:
-        center = Coordinates(latitude=payload.latitude, longitude=payload.longitude)
-    elif payload.address:
-        center = await geocode_address(payload.address)
+def element_to_doctor(el: Dict[str, Any], center: Coordinates) -> Optional[Doctor]:
+    tags = el.get("tags", {})
+    if not tags:
+        return None
+    # Coordinate extraction for nodes/ways/relations
+    if el.get("type") == "node":
+        lat, lon = el.get("lat"), el.get("lon")
     else:
-        raise HTTPException(status_code=400, detail="Provide either (latitude and longitude) or an address")
+        center_obj = el.get("center")
+        if not center_obj:
+            return None
+        lat, lon = center_obj.get("lat"), center_obj.get("lon")
+    if lat is None or lon is None:
+        return None
 
+    name = extract_name(tags)
+    specialty = extract_specialty(tags)
+    phone, website = extract_contact(tags)
+    addr = extract_address(tags)
+
+    distance = haversine_km(center.latitude, center.longitude, lat, lon)
+    return Doctor(
+        name=name,
+        specialty=specialty,
+        phone=phone,
+        website=website,
+        address=addr,
+        coordinates=Coordinates(latitude=lat, longitude=lon),
+        source="osm",
+        distance_km=round(distance, 2)
+    )
+
+async def resolve_center(payload: NearbyRequest) -> Coordinates:
+    if payload.latitude is not None and payload.longitude is not None:
+        return Coordinates(latitude=payload.latitude, longitude=payload.longitude)
+    if payload.address:
+        return await geocode_address(payload.address)
+    raise HTTPException(status_code=400, detail="Provide either (latitude and longitude) or an address")
+
+def mock_doctors(center: Coordinates) -> List[Doctor]:
+    # A small, deterministic mock for frontend integration testing
+    return [
+        Doctor(
+            name="City General Hospital",
+            specialty="general",
+            phone="+91-9876543210",
+            website=None,
+            address="123 Health St, Sample City",
+            coordinates=Coordinates(latitude=center.latitude + 0.005, longitude=center.longitude + 0.005),
+            source="mock",
+            distance_km=0.79,
+        ),
+        Doctor(
+            name="Heart Care Center",
+            specialty="cardiology",
+            phone=None,
+            website=None,
+            address="456 Cardiac Ave, Sample City",
+            coordinates=Coordinates(latitude=center.latitude - 0.004, longitude=center.longitude + 0.006),
+            source="mock",
+            distance_km=0.86,
+        ),
+    ]
+
+@router.post("/nearby", response_model=NearbyResponse)
+async def nearby_search(payload: NearbyRequest):
+    center = await resolve_center(payload)
     radius_m = int(payload.radius_km * 1000)
+    specialty = resolve_specialty(payload.specialty, payload.condition)
+    usage_rollups.record_doctor_search(payload.sessionId, specialty)
 
     if MOCK_MODE:
-        # Return a small, deterministic mock for frontend integration testing
-        mock_docs = [
-            Doctor(
-                name="City General Hospital",
-                specialty="general",
-                phone="+91-9876543210",
-                website=None,
-                address="123 Health St, Sample City",
-                coordinates=Coordinates(latitude=center.latitude + 0.005, longitude=center.longitude + 0.005),
-                source="mock",
-                distance_km=0.79,
-            ),
-            Doctor(
-                name="Heart Care Center",
-                specialty="cardiology",
-                phone=None,
-                website=None,
-                address="456 Cardiac Ave, Sample City",
-                coordinates=Coordinates(latitude=center.latitude - 0.004, longitude=center.longitude + 0.006),
-                source="mock",
-                distance_km=0.86,
-            ),
-        ]
-        return NearbyResponse(center=center, radius_km=payload.radius_km, total=len(mock_docs), doctors=mock_docs)
+        mock_docs = mock_doctors(center)
+        return NearbyResponse(
+            center=center,
+            radius_km=payload.radius_km,
+            effective_radius_km=payload.radius_km,
+            specialty=specialty,
+            result_id=await result_sets.put(mock_docs),
+            total=len(mock_docs),
+            doctors=mock_docs
+        )
+
+    if payload.adaptive:
+        doctors, effective_radius_km = await adaptive_search(center, payload, specialty)
+    else:
+        doctors = await fetch_doctors(center, radius_m, payload.limit, osm_speciality_pattern(specialty))
+        effective_radius_km = payload.radius_km
+
+    # Overpass returns a hospital as both its node and its building way/relation
+    doctors = dedupe_doctors(doctors)
+    # Many OSM elements carry no addr:* tags; tell the user roughly where they are from the local gazetteer
+    fill_missing_localities(doctors)
+    # Sort by distance for better UX
+    doctors.sort(key=lambda d: (d.distance_km or 0))
+    return NearbyResponse(
+        center=center,
+        radius_km=payload.radius_km,
+        effective_radius_km=effective_radius_km,
+        specialty=specialty,
+        result_id=await result_sets.put(doctors),
+        total=len(doctors),
+        doctors=doctors
+    )
 
+async def fetch_doctors(
+    center: Coordinates,
+    radius_m: int,
+    limit: int,
+    speciality_pattern: Optional[str] = None,
+    exclude_radius_m: int = 0,
+) -> List[Doctor]:
     try:
-        data = await fetch_overpass(center.latitude, center.longitude, radius_m, payload.limit)
+        data = await fetch_overpass(
+            center.latitude, center.longitude, radius_m, limit, speciality_pattern, exclude_radius_m
+        )
     except httpx.TimeoutException:
         raise HTTPException(status_code=504, detail="Overpass timeout, try reducing radius or limit")
 
-    elements = data.get("elements", [])
     doctors: List[Doctor] = []
-    for el in elements:
-        tags = el.get("tags", {})
-        if not tags:
-            continue
-        # Coordinate extraction for nodes/ways/relations
-        if el.get("type") == "node":
-            lat, lon = el.get("lat"), el.get("lon")
-        else:
-            center_obj = el.get("center")
-            if not center_obj:
-                continue
-            lat, lon = center_obj.get("lat"), center_obj.get("lon")
-        if lat is None or lon is None:
-            continue
-
-        name = extract_name(tags)
-        specialty = extract_specialty(tags)
-        phone, website = extract_contact(tags)
-        addr = extract_address(tags)
-
-        distance = haversine_km(center.latitude, center.longitude, lat, lon)
-        doctors.append(Doctor(
-            name=name,
-            specialty=specialty,
-            phone=phone,
-            website=website,
-            address=addr,
-            coordinates=Coordinates(latitude=lat, longitude=lon),
-            source="osm",
-            distance_km=round(distance, 2)
-        ))
+    for el in data.get("elements", []):
+        doctor = element_to_doctor(el, center)
+        if doctor:
+            doctors.append(doctor)
+    return doctors
 
-    # Sort by distance for better UX
-    doctors.sort(key=lambda d: (d.distance_km or 0))
-    return NearbyResponse(
+def adaptive_radii(radius_m: int) -> List[int]:
+    """Radii tried by an adaptive search: geometric growth capped at the requested radius."""
+    radii: List[int] = []
+    current = int(ADAPTIVE_START_RADIUS_KM * 1000)
+    while current < radius_m:
+        radii.append(current)
+        current = int(current * ADAPTIVE_GROWTH_FACTOR)
+    radii.append(radius_m)
+    return radii
+
+async def adaptive_search(
+    center: Coordinates, payload: NearbyRequest, specialty: Optional[str]
+) -> Tuple[List[Doctor], float]:
+    """Expand the search radius until `limit` doctors are found.
+
+    Each step only asks Overpass for the ring beyond the previous radius, so
+    doctors already fetched are kept rather than downloaded again.
+    """
+    pattern = osm_speciality_pattern(specialty)
+    doctors: List[Doctor] = []
+    previous_m = 0
+    for radius_m in adaptive_radii(int(payload.radius_km * 1000)):
+        remaining = payload.limit - len(doctors)
+        doctors.extend(await fetch_doctors(center, radius_m, remaining, pattern, previous_m))
+        previous_m = radius_m
+        if len(doctors) >= payload.limit:
+            break
+    return doctors, round(previous_m / 1000, 3)
+
+def stream_rings(radius_m: int) -> List[int]:
+    """Radii queried by the streaming search, nearest ring first."""
+    inner = int(radius_m * STREAM_INNER_RING_FRACTION)
+    if inner < STREAM_MIN_INNER_RADIUS_M or inner >= radius_m:
+        return [radius_m]
+    return [inner, radius_m]
+
+def _format_event(event: str, data: Dict[str, Any], sse: bool) -> str:
+    body = json.dumps({"event": event, **data})
+    if sse:
+        return f"event: {event}\ndata: {body}\n\n"
+    return body + "\n"
+
+async def _nearby_events(payload: NearbyRequest, center: Coordinates, sse: bool) -> AsyncIterator[str]:
+    specialty = resolve_specialty(payload.specialty, payload.condition)
+    start = {"center": center.model_dump(), "radius_km": payload.radius_km, "specialty": specialty}
+    yield _format_event("start", start, sse)
+
+    # Doctors arrive one by one, so the grid is sized for the whole search area up front
+    deduper = DoctorDeduper(max_abs_lat=latitude_bound(center.latitude, payload.radius_km * 1000))
+    if MOCK_MODE:
+        for doctor in mock_doctors(center):
+            deduper.add(doctor)
+            yield _format_event("doctor", {"ring": 0, "doctor": doctor.model_dump()}, sse)
+    else:
+        radius_m = int(payload.radius_km * 1000)
+        pattern = osm_speciality_pattern(specialty)
+        seen: Set[Tuple[str, Any]] = set()
+        try:
+            previous_m = 0
+            for ring, ring_radius in enumerate(stream_rings(radius_m)):
+                elements = stream_overpass(
+                    center.latitude, center.longitude, ring_radius, payload.limit, pattern, previous_m
+                )
+                previous_m = ring_radius
+                async for el in elements:
+                    key = (el.get("type"), el.get("id"))
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    doctor = element_to_doctor(el, center)
+                    if not doctor or not deduper.add(doctor):
+                        continue
+                    fill_missing_localities([doctor])
+                    yield _format_event("doctor", {"ring": ring, "doctor": doctor.model_dump()}, sse)
+        except httpx.TimeoutException:
+            yield _format_event("error", {"status": 504, "detail": "Overpass timeout, try reducing radius or limit"}, sse)
+        except httpx.HTTPError:
+            # Raised once elements have been sent (mirrors are only tried before that); keep what arrived
+            yield _format_event("error", {"status": 502, "detail": "Overpass connection lost"}, sse)
+        except HTTPException as e:
+            yield _format_event("error", {"status": e.status_code, "detail": e.detail}, sse)
+
+    doctors = sorted(deduper.kept, key=lambda d: (d.distance_km or 0))[:payload.limit]
+    summary = NearbyResponse(
         center=center,
         radius_km=payload.radius_km,
+        effective_radius_km=payload.radius_km,
+        specialty=specialty,
+        result_id=await result_sets.put(doctors),
         total=len(doctors),
         doctors=doctors
     )
+    yield _format_event("summary", summary.model_dump(), sse)
+
+@router.post("/nearby/stream")
+async def nearby_search_stream(payload: NearbyRequest, request: Request):
+    """Stream doctors as NDJSON (or SSE when requested) while Overpass data arrives.
+
+    Doctors from the inner ring are emitted first, then the rest of the radius,
+    followed by a ``summary`` event carrying the distance-sorted result.
+    """
+    center = await resolve_center(payload)
+    usage_rollups.record_doctor_search(payload.sessionId, resolve_specialty(payload.specialty, payload.condition))
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    media_type = "text/event-stream" if sse else "application/x-ndjson"
+    return StreamingResponse(_nearby_events(payload, center, sse), media_type=media_type)
+
+@router.get("/clusters/{result_id}", response_model=ClusterResponse)
+async def doctor_clusters(
+    result_id: str,
+    request: Request,
+    response: Response,
+    zoom: int = Query(..., ge=0, le=22),
+    west: Optional[float] = Query(None, ge=-180, le=180),
+    south: Optional[float] = Query(None, ge=-90, le=90),
+    east: Optional[float] = Query(None, ge=-180, le=180),
+    north: Optional[float] = Query(None, ge=-90, le=90),
+):
+    """Map clusters of a previous nearby result for one zoom level and viewport."""
+    entry = await result_sets.get(result_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Result set expired, repeat the nearby search")
+    # A result set never changes once stored, so the tile is fully determined by the query
+    not_modified = conditional(
+        request, response, make_etag("clusters", result_id, zoom, west, south, east, north), "private, max-age=600"
+    )
+    if not_modified:
+        return not_modified
+    doctors, hierarchy = entry
+    bounds = (west, south, east, north)
+    bbox = bounds if all(b is not None for b in bounds) else None
+
+    clusters = [
+        MapCluster(
+            latitude=c["latitude"],
+            longitude=c["longitude"],
+            count=c["count"],
+            doctor=doctors[c["members"][0]] if c["count"] == 1 else None,
+        )
+        for c in hierarchy.clusters(zoom, bbox)
+    ]
+    return ClusterResponse(result_id=result_id, zoom=zoom, total=len(clusters), clusters=clusters)
@@ -1,13 +1,17 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
-import uuid
+from bson import ObjectId
+from ..database import db_manager
+from ..models.symptom_analysis import SESSION_HISTORY_INDEX, AnalysisSummaryView, SymptomAnalysis
+from ..services.http_cache import conditional, make_etag
+from ..services.session_store import get_session_store
+from .doctors import decode_cursor, encode_cursor
+from ..services.usage_analytics import GLOBAL_SCOPE, read_rollups, session_scope
 
 router = APIRouter()
 
-_sessions: Dict[str, Dict[str, Any]] = {}
-
 class PatientSessionCreate(BaseModel):
     name: Optional[str] = None
     email: Optional[str] = None
@@ -24,46 +28,112 @@ class PatientSessionUpdate(BaseModel):
     gender: Optional[str] = Field(None, pattern=r"^(male|female|other|prefer-not-to-say)$")
     location: Optional[Dict[str, Any]] = None
 
+def _store():
+    store = get_session_store()
+    if store is None:
+        raise HTTPException(status_code=503, detail="Session store is unavailable")
+    return store
+
+async def _load_session(session_id: str) -> Dict[str, Any]:
+    sess = await _store().get(session_id)
+    if sess is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return sess
+
 @router.post("/session")
 async def create_session(payload: PatientSessionCreate):
-    session_id = f"sess_{uuid.uuid4().hex[:10]}"
-    _sessions[session_id] = {
-        "sessionId": session_id,
-        "profile": payload.model_dump(exclude_none=True),
-        "createdAt": datetime.utcnow().isoformat(),
-        "lastActiveAt": datetime.utcnow().isoformat(),
-        "totalSymptomChecks": 0,
-        "totalDoctorSearches": 0,
-        "isActive": True
-    }
-    return {"status": "success", "data": _sessions[session_id]}
+    sess = await _store().create(payload.model_dump(exclude_none=True))
+    return {"status": "success", "data": sess}
 
 @router.put("/session/{session_id}")
 async def update_session(session_id: str, payload: PatientSessionUpdate):
-    if session_id not in _sessions:
+    sess = await _store().update(session_id, payload.model_dump(exclude_none=True))
+    if sess is None:
         raise HTTPException(status_code=404, detail="Session not found")
-    sess = _sessions[session_id]
-    sess["profile"].update(payload.model_dump(exclude_none=True))
-    sess["lastActiveAt"] = datetime.utcnow().isoformat()
     return {"status": "success", "data": sess}
 
 @router.get("/session/{session_id}")
 async def get_session(session_id: str):
-    if session_id not in _sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
-    return {"status": "success", "data": _sessions[session_id]}
+    return {"status": "success", "data": await _load_session(session_id)}
 
 @router.get("/session/{session_id}/analytics")
-async def session_analytics(session_id: str):
-    if session_id not in _sessions:
-        raise HTTPException(status_code=404, detail="Session not found")
-    s = _sessions[session_id]
+async def session_analytics(session_id: str, hours: int = Query(24, ge=1, le=24 * 90)):
+    s = await _load_session(session_id)
     return {
         "status": "success",
         "data": {
             "totals": {
                 "symptomChecks": s.get("totalSymptomChecks", 0),
                 "doctorSearches": s.get("totalDoctorSearches", 0)
-            }
+            },
+            "window": await read_rollups(session_scope(session_id), hours),
+        }
+    }
+
+@router.get("/session/{session_id}/history")
+async def session_history(
+    session_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="nextCursor from the previous page"),
+):
+    """Newest-first summaries of the session's analyses.
+
+    Pages are keyset ranges on the (sessionId, createdAt) index, so every page
+    is an index range scan no matter how far back it is.
+    """
+    if not db_manager.ready:
+        raise HTTPException(status_code=503, detail="Analysis history is unavailable")
+    filters: List[Dict[str, Any]] = [{"sessionId": session_id}]
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        try:
+            created = datetime.fromisoformat(value)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        filters.append({"$or": [
+            {"createdAt": {"$lt": created}},
+            {"createdAt": created, "_id": {"$lt": last_id}},
+        ]})
+
+    rows = await SymptomAnalysis.find_many(
+        {"$and": filters},
+        projection_model=AnalysisSummaryView,
+        sort=[("createdAt", -1), ("_id", -1)],
+        limit=limit + 1,
+        hint=SESSION_HISTORY_INDEX,
+    ).to_list()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].createdAt.isoformat(), rows[-1].id)
+    return {
+        "status": "success",
+        "data": {
+            "analyses": [r.model_dump(mode="json") for r in rows],
+            "count": len(rows),
+            "nextCursor": next_cursor,
         }
     }
+
+@router.get("/session/{session_id}/history/{analysis_id}")
+async def session_history_item(session_id: str, analysis_id: str, request: Request, response: Response):
+    """Full analysis behind one history row."""
+    if not db_manager.ready:
+        raise HTTPException(status_code=503, detail="Analysis history is unavailable")
+    if not ObjectId.is_valid(analysis_id):
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    doc = await SymptomAnalysis.get_motor_collection().find_one({"_id": ObjectId(analysis_id), "sessionId": session_id})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    # Stored analyses are never modified, so once the record is known to belong to the
+    # session its ids fully determine the body and a revalidation skips serialization
+    not_modified = conditional(request, response, make_etag("analysis", session_id, analysis_id), "private, max-age=3600")
+    if not_modified:
+        return not_modified
+    doc["_id"] = str(doc["_id"])
+    return {"status": "success", "data": doc}
+
+@router.get("/analytics")
+async def global_analytics(hours: int = Query(24, ge=1, le=24 * 90)):
+    """Usage across all sessions, read from the hourly rollups."""
+    return {"status": "success", "data": await read_rollups(GLOBAL_SCOPE, hours)}
@@ -1,7 +1,12 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request, Response
 from pydantic import BaseModel, Field
 from typing import List, Optional, Any, Dict
+from ..services.analysis_history import save_analysis
 from ..services.gemini_ai import analyze_symptoms, get_medications
+from ..services.http_cache import conditional, make_etag
+from ..services.session_store import get_session_store
+from ..services.symptom_trends import coordinates_from, symptom_trends
+from ..services.usage_analytics import usage_rollups
 
 router = APIRouter()
 
@@ -15,16 +20,37 @@ class AnalyzeRequest(BaseModel):
     sessionId: Optional[str] = None
     symptoms: List[Symptom]
     patientInfo: Optional[Dict[str, Any]] = {}
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
 
 class AnalyzeResponse(BaseModel):
     status: str
     data: Dict[str, Any]
 
+async def _analysis_coordinates(req: AnalyzeRequest):
+    if req.latitude is not None and req.longitude is not None:
+        return req.latitude, req.longitude
+    store = get_session_store()
+    if not req.sessionId or store is None:
+        return None
+    session = await store.get(req.sessionId)
+    return coordinates_from(session["profile"].get("location")) if session else None
+
 @router.post("/analyze", response_model=AnalyzeResponse)
 async def analyze(req: AnalyzeRequest):
     if not req.symptoms:
         raise HTTPException(status_code=400, detail="No symptoms provided")
     analysis = await analyze_symptoms([s.model_dump() for s in req.symptoms], req.patientInfo or {})
+    names = [s.name for s in req.symptoms]
+    usage_rollups.record_analysis(req.sessionId, names, analysis.get("riskLevel"))
+
+    cell = None
+    coords = await _analysis_coordinates(req)
+    if coords:
+        cell = symptom_trends.tag(*coords)
+        symptom_trends.record(cell, names)
+    if req.sessionId:
+        await save_analysis(req.sessionId, [s.model_dump() for s in req.symptoms], analysis, geohash=cell)
     return {"status": "success", "data": {"analysis": analysis}}
 
 class MedicationRequest(BaseModel):
@@ -38,17 +64,23 @@ async def medications(req: MedicationRequest):
     result = await get_medications(req.model_dump())
     return {"status": "success", "data": result}
 
+EMERGENCY_SIGNS = [
+    "Chest pain lasting more than a few minutes",
+    "Severe shortness of breath",
+    "Sudden weakness or numbness",
+    "Severe, uncontrolled bleeding",
+    "Loss of consciousness"
+]
+EMERGENCY_SIGNS_ETAG = make_etag("emergency-signs", *EMERGENCY_SIGNS)
+
 @router.get("/emergency-signs")
-async def emergency_signs():
+async def emergency_signs(request: Request, response: Response):
+    not_modified = conditional(request, response, EMERGENCY_SIGNS_ETAG, "public, max-age=86400")
+    if not_modified:
+        return not_modified
     return {
         "status": "success",
         "data": {
-            "signs": [
-                "Chest pain lasting more than a few minutes",
-                "Severe shortness of breath",
-                "Sudden weakness or numbness",
-                "Severe, uncontrolled bleeding",
-                "Loss of consciousness"
-            ]
+            "signs": EMERGENCY_SIGNS
         }
     }
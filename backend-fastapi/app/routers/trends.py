@@ -0,0 +1,45 @@
+from fastapi import APIRouter, HTTPException, Query, Response
+from typing import Optional
+from datetime import date, datetime, timedelta
+from ..database import db_manager
+from ..services.symptom_trends import TREND_GEOHASH_PRECISION, query_heatmap
+
+router = APIRouter()
+
+MAX_HEATMAP_DAYS = 366
+
+@router.get("/heatmap")
+async def heatmap(
+    response: Response,
+    south: float = Query(..., ge=-90, le=90),
+    west: float = Query(..., ge=-180, le=180),
+    north: float = Query(..., ge=-90, le=90),
+    east: float = Query(..., ge=-180, le=180),
+    start: Optional[date] = Query(None, description="First day (UTC), default 7 days ago"),
+    end: Optional[date] = Query(None, description="Last day (UTC), default today"),
+    symptom: Optional[str] = Query(None, description="Limit to one symptom, e.g. fever"),
+    precision: int = Query(TREND_GEOHASH_PRECISION, ge=1, le=TREND_GEOHASH_PRECISION, description="Geohash length of returned cells"),
+):
+    """Symptom counts per geohash cell, read from the pre-aggregated daily cells."""
+    if south > north or west > east:
+        raise HTTPException(status_code=400, detail="Bounding box must satisfy south <= north and west <= east")
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=6)
+    if start > end or (end - start).days >= MAX_HEATMAP_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range must be 1 to {MAX_HEATMAP_DAYS} days")
+    if not db_manager.ready:
+        raise HTTPException(status_code=503, detail="Trend data is unavailable")
+
+    cells = await query_heatmap(south, west, north, east, start, end, symptom, precision)
+    # Cells change at most once per trend flush, so a short shared cache absorbs dashboard refreshes
+    response.headers["Cache-Control"] = "public, max-age=60"
+    return {
+        "status": "success",
+        "data": {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "precision": precision,
+            "symptom": symptom,
+            "cells": cells,
+        }
+    }
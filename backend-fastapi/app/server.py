@@ -0,0 +1,177 @@
+"""Production entry point.
+
+Usage::
+
+    python -m app.server --port 8000 --workers 4
+
+The application is imported once in the supervisor process (preloading the
+gazetteer and specialty tables into memory shared copy-on-write), the
+listening socket is bound there, and workers are forked onto it. Each worker
+runs its own uvicorn server and event loop. Indexes left by earlier
+releases are reconciled once in the supervisor, on a client closed again
+before forking; database clients, Gemini and background tasks are only
+created at worker startup, so nothing holding sockets or threads crosses a
+fork. On SIGTERM or SIGINT every worker stops
+accepting connections and is given ``WEB_GRACEFUL_TIMEOUT`` seconds to finish
+in-flight requests (Gemini and Overpass calls included) before being killed.
+
+Platforms without ``fork`` run a single worker with the same settings.
+"""
+from dotenv import load_dotenv
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import sys
+import time
+from typing import Dict, List, Optional
+
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env"))
+
+import uvicorn
+
+def default_workers() -> int:
+    if os.getenv("WEB_CONCURRENCY"):
+        return max(1, int(os.getenv("WEB_CONCURRENCY")))
+    # Respect CPU affinity/cgroup pinning where the platform exposes it
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    return max(1, cpus or 1)
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+KEEPALIVE_SECONDS = int(os.getenv("WEB_KEEPALIVE", "15"))
+BACKLOG = int(os.getenv("WEB_BACKLOG", "2048"))
+# Overpass requests may take up to 25 s, so in-flight searches get a little longer than that
+GRACEFUL_TIMEOUT = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "30"))
+LIMIT_CONCURRENCY = int(os.getenv("WEB_LIMIT_CONCURRENCY", "0")) or None
+
+logger = logging.getLogger("health_beacon.server")
+
+def preload():
+    """Import the app and warm read-only data before workers are forked."""
+    from .main import app
+    from .services.reverse_geocoder import get_reverse_geocoder
+    get_reverse_geocoder()
+    return app
+
+def build_config(app, host: str, port: int) -> uvicorn.Config:
+    # "auto" picks uvloop and httptools when they are installed and falls back to asyncio/h11
+    return uvicorn.Config(
+        app,
+        host=host,
+        port=port,
+        loop="auto",
+        http="auto",
+        backlog=BACKLOG,
+        timeout_keep_alive=KEEPALIVE_SECONDS,
+        timeout_graceful_shutdown=GRACEFUL_TIMEOUT,
+        limit_concurrency=LIMIT_CONCURRENCY,
+        proxy_headers=True,
+        server_header=False,
+    )
+
+def _run_worker(config: uvicorn.Config, sock) -> None:
+    # The supervisor's handlers must not leak into the worker; uvicorn installs its own while serving
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    code = 0
+    try:
+        uvicorn.Server(config).run(sockets=[sock])
+    except BaseException:
+        logger.exception("Worker crashed")
+        code = 1
+    finally:
+        os._exit(code)
+
+class Supervisor:
+    def __init__(self, config: uvicorn.Config, workers: int):
+        self.config = config
+        self.workers = workers
+        self.children: Dict[int, float] = {}
+        self.stopping = False
+        self.sock = None
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            _run_worker(self.config, self.sock)
+        self.children[pid] = time.monotonic()
+
+    def _handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def _reap(self) -> List[int]:
+        exited = []
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                break
+            if pid == 0:
+                break
+            started = self.children.pop(pid, None)
+            if started is not None:
+                exited.append(pid)
+                if not self.stopping:
+                    logger.warning(f"Worker {pid} exited with status {status}, restarting")
+                    # Avoid a tight fork loop when workers die during startup
+                    if time.monotonic() - started < 1:
+                        time.sleep(1)
+        return exited
+
+    def run(self):
+        self.sock = self.config.bind_socket()
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        for _ in range(self.workers):
+            self._spawn()
+        logger.info(f"Started {self.workers} workers")
+
+        while not self.stopping:
+            for _ in self._reap():
+                if not self.stopping:
+                    self._spawn()
+            time.sleep(0.5)
+
+        logger.info("Draining workers")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + GRACEFUL_TIMEOUT + 5
+        while self.children and time.monotonic() < deadline:
+            self._reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            logger.warning(f"Worker {pid} did not stop in time, killing it")
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        self.sock.close()
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Run the Health Beacon API with multiple workers")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=default_workers(), help="Default: WEB_CONCURRENCY or the CPU count")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    config = build_config(preload(), args.host, args.port)
+    if args.workers <= 1 or not hasattr(os, "fork"):
+        uvicorn.Server(config).run()
+        return
+    from .database import reconcile_at_startup
+    from .services.session_store import SESSION_STORE
+    if SESSION_STORE == "memory":
+        logger.warning("SESSION_STORE=memory keeps sessions per worker; requests on other workers will not find them")
+    # Once here rather than in every worker, which would race each other dropping and rebuilding indexes
+    asyncio.run(reconcile_at_startup())
+    Supervisor(config, args.workers).run()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import asyncio
+import logging
+import os
+import zlib
+import bson
+from bson import Binary
+from pydantic import ValidationError
+from ..database import db_manager
+from ..models.symptom_analysis import Metadata, SymptomAnalysis
+from .leases import acquire_lease, release_lease
+
+# Analyses older than this move to the archive collection; 0 keeps everything in the hot collection
+ANALYSIS_RETENTION_DAYS = int(os.getenv("ANALYSIS_RETENTION_DAYS", "90"))
+ARCHIVE_INTERVAL = float(os.getenv("ANALYSIS_ARCHIVE_INTERVAL", "3600"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ANALYSIS_ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_COLLECTION = "symptom_analyses_archive"
+ARCHIVE_LEASE = "analysis-archiver"
+
+async def save_analysis(
+    session_id: str,
+    symptoms: List[Dict[str, Any]],
+    analysis: Dict[str, Any],
+    geohash: Optional[str] = None,
+) -> bool:
+    """Store one analysis for the session's history.
+
+    The document goes through the ``SymptomAnalysis`` model, so history reads
+    can rely on its shape; an AI payload that does not fit it is logged and
+    not stored.
+    """
+    if not db_manager.ready:
+        return False
+    try:
+        record = SymptomAnalysis(
+            sessionId=session_id,
+            geohash=geohash,
+            symptoms=symptoms,
+            analysis=analysis,
+            metadata=Metadata(aiModel=analysis["model"]) if analysis.get("model") else Metadata(),
+            createdAt=datetime.utcnow(),
+        )
+    except ValidationError as e:
+        logging.warning(f"Analysis for {session_id} does not match the history schema, not stored: {e}")
+        return False
+    try:
+        await record.insert()
+    except Exception as e:
+        logging.warning(f"Storing analysis for {session_id} failed: {e}")
+        return False
+    return True
+
+def decode_archive(archive: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Restore the analyses packed into one archive document."""
+    return bson.decode_all(zlib.decompress(archive["payload"]))
+
+async def archive_old_analyses(
+    retention_days: int = ANALYSIS_RETENTION_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    lease_ttl: Optional[float] = None,
+) -> int:
+    """Move analyses older than the retention window into compressed archive documents.
+
+    Each batch is packed as concatenated BSON compressed with zlib, written to
+    the archive collection and only then deleted from the hot collection, so
+    an interruption can at worst archive a batch twice. Two processes reading
+    the same batch would archive it twice every time, so with ``lease_ttl``
+    the archiver lease is renewed before each batch and archiving stops as
+    soon as another process holds it.
+    """
+    if retention_days <= 0:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    hot = SymptomAnalysis.get_motor_collection()
+    archive = hot.database[ARCHIVE_COLLECTION]
+    await archive.create_index([("sessionIds", 1), ("from", 1)])
+    moved = 0
+    while True:
+        if lease_ttl is not None and not await acquire_lease(ARCHIVE_LEASE, lease_ttl):
+            return moved
+        docs = await hot.find({"createdAt": {"$lt": cutoff}}).sort("createdAt", 1).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            return moved
+        await archive.insert_one({
+            "from": docs[0]["createdAt"],
+            "to": docs[-1]["createdAt"],
+            "count": len(docs),
+            "sessionIds": sorted({d.get("sessionId") for d in docs if d.get("sessionId")}),
+            "payload": Binary(zlib.compress(b"".join(bson.encode(d) for d in docs))),
+            "archivedAt": datetime.utcnow(),
+        })
+        await hot.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+        moved += len(docs)
+
+class AnalysisArchiver:
+    def __init__(self, interval: float = ARCHIVE_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            if not db_manager.ready:
+                await asyncio.sleep(5)
+                continue
+            try:
+                # Only the worker holding the lease archives; it is renewed per batch while a run lasts
+                moved = await archive_old_analyses(lease_ttl=2 * self.interval)
+                if moved:
+                    logging.info(f"Archived {moved} analyses older than {ANALYSIS_RETENTION_DAYS} days")
+            except Exception as e:
+                logging.warning(f"Archiving analyses failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if ANALYSIS_RETENTION_DAYS > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            if db_manager.ready:
+                await release_lease(ARCHIVE_LEASE)
+
+analysis_archiver = AnalysisArchiver()
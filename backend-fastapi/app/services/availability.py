@@ -0,0 +1,95 @@
+from datetime import datetime, timezone
+from typing import Optional
+import asyncio
+import logging
+import os
+from pymongo import UpdateOne
+from ..database import db_manager
+from ..models.doctor import AVAILABILITY_TZ, SLOT_MINUTES, Doctor, next_open_slot
+from .leases import acquire_lease, release_lease
+
+REFRESH_INTERVAL = float(os.getenv("NEXT_SLOT_REFRESH_INTERVAL", str(SLOT_MINUTES * 60)))
+REFRESH_BATCH_SIZE = 1000
+REFRESH_LEASE = "next-slot-refresher"
+
+def _stored(moment: Optional[datetime]) -> Optional[datetime]:
+    # MongoDB keeps naive UTC at millisecond precision
+    if moment is None:
+        return None
+    if moment.tzinfo:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.replace(microsecond=moment.microsecond // 1000 * 1000)
+
+async def refresh_next_slots(now: Optional[datetime] = None) -> int:
+    """Move every nextAvailableSlot that has passed forward to the next opening.
+
+    Only documents whose slot is already in the past are read (an indexed range
+    scan), and the new value is computed from the stored bitmap, not the schedule.
+    Doctors who are open keep the start of their current opening, which is in
+    the past but unchanged, so they are read and skipped rather than rewritten.
+    """
+    now = now or datetime.now(AVAILABILITY_TZ)
+    collection = Doctor.get_motor_collection()
+    cursor = collection.find(
+        {"availability.nextAvailableSlot": {"$lt": now}},
+        {"availability.weeklyBitmap": 1, "availability.nextAvailableSlot": 1},
+    )
+    updated = 0
+    ops = []
+    async for doc in cursor:
+        availability = doc.get("availability") or {}
+        bitmap = availability.get("weeklyBitmap")
+        mask = int.from_bytes(bitmap, "little") if bitmap else 0
+        slot = _stored(next_open_slot(mask, now))
+        if slot == _stored(availability.get("nextAvailableSlot")):
+            continue
+        ops.append(UpdateOne(
+            {"_id": doc["_id"]},
+            # The slot is shown on the profile, so cached copies must be invalidated
+            {"$set": {"availability.nextAvailableSlot": slot}, "$inc": {"metadata.version": 1}},
+        ))
+        if len(ops) >= REFRESH_BATCH_SIZE:
+            await collection.bulk_write(ops, ordered=False)
+            updated += len(ops)
+            ops = []
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+        updated += len(ops)
+    return updated
+
+class NextSlotRefresher:
+    """Runs ``refresh_next_slots`` in whichever worker holds the refresher lease."""
+
+    def __init__(self, interval: float = REFRESH_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            if not db_manager.ready:
+                await asyncio.sleep(5)
+                continue
+            try:
+                # Held across two intervals, so the owner keeps it as long as it keeps running
+                if await acquire_lease(REFRESH_LEASE, 2 * self.interval):
+                    await refresh_next_slots()
+            except Exception as e:
+                logging.warning(f"Refreshing nextAvailableSlot failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            if db_manager.ready:
+                await release_lease(REFRESH_LEASE)
+
+next_slot_refresher = NextSlotRefresher()
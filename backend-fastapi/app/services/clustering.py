@@ -0,0 +1,208 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import logging
+import math
+import os
+import re
+import uuid
+from ..database import db_manager
+from ..models.nearby_result import NEARBY_RESULT_TTL, NearbyResultSet
+
+logger = logging.getLogger(__name__)
+
+# POIs with the same name closer than this are treated as one place (e.g. a hospital node and its building way)
+DEDUPE_RADIUS_M = float(os.getenv("NEARBY_DEDUPE_RADIUS_M", "150"))
+MIN_ZOOM = 0
+MAX_ZOOM = 18
+TILE_SIZE = 256
+CLUSTER_RADIUS_PX = int(os.getenv("MAP_CLUSTER_RADIUS_PX", "60"))
+RESULT_CACHE_SIZE = int(os.getenv("NEARBY_RESULT_CACHE_SIZE", "256"))
+
+_M_PER_DEG_LAT = 111_320.0
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_MERGE_FIELDS = ("specialty", "phone", "website", "address")
+
+def _normalize_name(name: Optional[str]) -> Optional[str]:
+    key = _NON_ALNUM.sub("", (name or "").lower())
+    # Unnamed POIs cannot be told apart by name, so they are never merged
+    return key if key and key != "unknown" else None
+
+def _distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    # Equirectangular approximation, accurate to well under a metre at dedupe distances
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return math.hypot(x, y) * 6_371_000
+
+class DoctorDeduper:
+    """Collapse near-identical POIs in a single pass using a spatial hash.
+
+    Points are bucketed into grid cells of roughly ``radius_m``; a new doctor is
+    only compared with same-named doctors in its own and the eight neighbouring
+    cells, which keeps the whole pass linear in the number of results.
+
+    Every point shares one grid. Its longitude cells are widened for
+    ``max_abs_lat``, the highest latitude (north or south) any point can
+    have, so a cell is at least ``radius_m`` wide wherever the point lies;
+    per-point widths would put two nearby points on grids that do not line up.
+    """
+
+    def __init__(self, radius_m: float = DEDUPE_RADIUS_M, max_abs_lat: float = 90.0):
+        self.radius_m = radius_m
+        self._cell_deg = radius_m / _M_PER_DEG_LAT
+        self._lon_cell_deg = self._cell_deg / max(math.cos(math.radians(min(abs(max_abs_lat), 90.0))), 0.01)
+        self._cells: Dict[Tuple[int, int, str], List[Any]] = {}
+        self.kept: List[Any] = []
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self._cell_deg), math.floor(lon / self._lon_cell_deg)
+
+    def add(self, doctor: Any) -> bool:
+        """Record a doctor; returns False if it duplicates one already kept."""
+        key = _normalize_name(doctor.name)
+        if key is None:
+            self.kept.append(doctor)
+            return True
+        lat, lon = doctor.coordinates.latitude, doctor.coordinates.longitude
+        cy, cx = self._cell(lat, lon)
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                for other in self._cells.get((cy + dy, cx + dx, key), ()):
+                    if _distance_m(lat, lon, other.coordinates.latitude, other.coordinates.longitude) <= self.radius_m:
+                        # Keep the first occurrence but let it borrow details the duplicate has
+                        for field in _MERGE_FIELDS:
+                            if getattr(other, field) is None and getattr(doctor, field) is not None:
+                                setattr(other, field, getattr(doctor, field))
+                        return False
+        self._cells.setdefault((cy, cx, key), []).append(doctor)
+        self.kept.append(doctor)
+        return True
+
+def latitude_bound(center_lat: float, radius_m: float) -> float:
+    """Highest absolute latitude of a point within ``radius_m`` of a search centre."""
+    return min(abs(center_lat) + radius_m / _M_PER_DEG_LAT, 90.0)
+
+def dedupe_doctors(doctors: Sequence[Any], radius_m: float = DEDUPE_RADIUS_M) -> List[Any]:
+    max_abs_lat = max((abs(d.coordinates.latitude) for d in doctors), default=0.0)
+    deduper = DoctorDeduper(radius_m, max_abs_lat)
+    for doctor in doctors:
+        deduper.add(doctor)
+    return deduper.kept
+
+def _project(lat: float, lon: float) -> Tuple[float, float]:
+    """Web Mercator projection to the unit square, as used by slippy-map tiles."""
+    lat = max(min(lat, 85.0511), -85.0511)
+    sin = math.sin(math.radians(lat))
+    x = lon / 360 + 0.5
+    y = 0.5 - 0.25 * math.log((1 + sin) / (1 - sin)) / math.pi
+    return x, y
+
+def _unproject(x: float, y: float) -> Tuple[float, float]:
+    lon = (x - 0.5) * 360
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return lat, lon
+
+class _Cluster:
+    __slots__ = ("x", "y", "members")
+
+    def __init__(self, x: float, y: float, members: List[int]):
+        self.x = x
+        self.y = y
+        self.members = members
+
+class ClusterHierarchy:
+    """Grid clusters for every zoom level, built bottom-up once per result set."""
+
+    def __init__(self, points: Sequence[Tuple[float, float]], radius_px: int = CLUSTER_RADIUS_PX):
+        level = [_Cluster(*_project(lat, lon), [i]) for i, (lat, lon) in enumerate(points)]
+        self.levels: Dict[int, List[_Cluster]] = {}
+        for zoom in range(MAX_ZOOM, MIN_ZOOM - 1, -1):
+            level = self._merge(level, radius_px / (TILE_SIZE * 2 ** zoom))
+            self.levels[zoom] = level
+
+    @staticmethod
+    def _merge(clusters: List[_Cluster], cell: float) -> List[_Cluster]:
+        grid: Dict[Tuple[int, int], List[_Cluster]] = {}
+        for c in clusters:
+            grid.setdefault((math.floor(c.x / cell), math.floor(c.y / cell)), []).append(c)
+        merged: List[_Cluster] = []
+        for group in grid.values():
+            if len(group) == 1:
+                merged.append(group[0])
+                continue
+            total = sum(len(c.members) for c in group)
+            x = sum(c.x * len(c.members) for c in group) / total
+            y = sum(c.y * len(c.members) for c in group) / total
+            merged.append(_Cluster(x, y, [m for c in group for m in c.members]))
+        return merged
+
+    def clusters(self, zoom: int, bbox: Optional[Tuple[float, float, float, float]] = None) -> List[Dict[str, Any]]:
+        """Clusters at ``zoom`` inside ``bbox`` given as (west, south, east, north)."""
+        zoom = max(MIN_ZOOM, min(MAX_ZOOM, zoom))
+        out: List[Dict[str, Any]] = []
+        for c in self.levels[zoom]:
+            lat, lon = _unproject(c.x, c.y)
+            if bbox:
+                west, south, east, north = bbox
+                in_lon = west <= lon <= east if west <= east else (lon >= west or lon <= east)
+                if not (south <= lat <= north and in_lon):
+                    continue
+            out.append({"latitude": lat, "longitude": lon, "count": len(c.members), "members": c.members})
+        return out
+
+class _ResultSet:
+    __slots__ = ("doctors", "hierarchy")
+
+    def __init__(self, doctors: List[Dict[str, Any]]):
+        self.doctors = doctors
+        self.hierarchy: Optional[ClusterHierarchy] = None
+
+class ResultSetStore:
+    """Recent nearby results, so the map can page clusters by viewport.
+
+    Result sets are stored in MongoDB with a TTL, so a cluster request can be
+    answered by any worker; a bounded LRU keeps the ones this worker has seen
+    together with their cluster hierarchy. While the database is unavailable
+    result sets are only kept locally.
+    """
+
+    def __init__(self, max_size: int = RESULT_CACHE_SIZE, ttl: int = NEARBY_RESULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, _ResultSet]" = OrderedDict()
+
+    def _remember(self, result_id: str, doctors: List[Dict[str, Any]]) -> _ResultSet:
+        entry = self._entries[result_id] = _ResultSet(doctors)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return entry
+
+    async def put(self, doctors: Sequence[Any]) -> str:
+        result_id = uuid.uuid4().hex[:16]
+        stored = [d.model_dump() for d in doctors]
+        self._remember(result_id, stored)
+        if db_manager.ready:
+            expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+            try:
+                await NearbyResultSet(id=result_id, doctors=stored, expiresAt=expires_at).insert()
+            except Exception as e:
+                logger.warning(f"Nearby result set {result_id} kept on this worker only: {e}")
+        return result_id
+
+    async def get(self, result_id: str) -> Optional[Tuple[List[Dict[str, Any]], ClusterHierarchy]]:
+        entry = self._entries.get(result_id)
+        if entry is not None:
+            self._entries.move_to_end(result_id)
+        elif db_manager.ready:
+            stored = await NearbyResultSet.get(result_id)
+            if stored is None:
+                return None
+            entry = self._remember(result_id, stored.doctors)
+        else:
+            return None
+        if entry.hierarchy is None:
+            points = [(d["coordinates"]["latitude"], d["coordinates"]["longitude"]) for d in entry.doctors]
+            entry.hierarchy = ClusterHierarchy(points)
+        return entry.doctors, entry.hierarchy
+
+result_sets = ResultSetStore()
@@ -0,0 +1,252 @@
+"""Drug x condition contraindication index compiled from label warning sections.
+
+Each drug label is compiled once into a small ``IndexEntry``: a bitmask of
+conditions it must not be used with, a bitmask of conditions that need a
+doctor's advice first, and the minimum ages its label states. The patient's
+free-text conditions compile to a bitmask over the same vocabulary, so
+checking a medication is a dict lookup and two ``&`` operations; no label
+text is scanned while answering a request.
+
+The index is seeded from the Drug Facts wording of the fallback OTC
+medications and grows with every OpenFDA label the medication lookup
+fetches.
+"""
+from bisect import bisect_right
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import os
+import re
+
+INDEX_MAX_DRUGS = int(os.getenv("CONTRAINDICATION_INDEX_MAX_DRUGS", "5000"))
+
+# Canonical condition -> phrases used for it in labels and by patients. The position in this
+# dict is the condition's bit, so only ever append to it.
+CONDITION_TERMS: Dict[str, List[str]] = {
+    "liver disease": ["liver disease", "liver problems", "hepatic impairment", "hepatic disease", "cirrhosis", "hepatitis"],
+    "kidney disease": ["kidney disease", "kidney problems", "renal impairment", "renal disease", "renal failure"],
+    "heart disease": ["heart disease", "heart failure", "heart attack", "coronary artery disease", "cardiovascular disease", "arrhythmia"],
+    "high blood pressure": ["high blood pressure", "hypertension"],
+    "asthma": ["asthma", "bronchospasm"],
+    "stomach ulcers": ["stomach ulcer", "stomach ulcers", "peptic ulcer", "stomach bleeding", "gastrointestinal bleeding", "stomach problems"],
+    "bleeding disorder": ["bleeding disorder", "bleeding problems", "hemophilia", "blood thinner", "anticoagulant", "warfarin"],
+    "diabetes": ["diabetes", "diabetic"],
+    "thyroid disease": ["thyroid disease", "hyperthyroidism", "hypothyroidism"],
+    "glaucoma": ["glaucoma"],
+    "enlarged prostate": ["enlarged prostate", "prostate", "difficulty in urination", "trouble urinating"],
+    "seizures": ["seizure", "seizures", "epilepsy"],
+    "pregnancy": ["pregnancy", "pregnant", "breast-feeding", "breastfeeding", "nursing"],
+    "chronic lung disease": ["chronic bronchitis", "emphysema", "copd", "chronic obstructive"],
+    "alcohol use": ["alcoholic drinks", "alcohol use", "alcoholism"],
+}
+CONDITIONS = list(CONDITION_TERMS)
+
+def _term_pattern(terms: Iterable[str]) -> "re.Pattern[str]":
+    """Match any of ``terms`` in lower-cased text.
+
+    Longest first so "stomach ulcers" is not cut short by "stomach ulcer";
+    the first-letter lookahead lets most positions fail without trying every
+    alternative.
+    """
+    terms = sorted(terms, key=len, reverse=True)
+    first_letters = "".join(sorted({re.escape(t[0]) for t in terms}))
+    return re.compile(r"\b(?=[" + first_letters + r"])(?:" + "|".join(re.escape(t) for t in terms) + r")\b")
+
+# One alternation over every phrase, so a sentence is scanned once rather than once per condition
+_TERM_BITS: Dict[str, int] = {
+    term.lower(): 1 << bit for bit, terms in enumerate(CONDITION_TERMS.values()) for term in terms
+}
+_ANY_CONDITION = _term_pattern(_TERM_BITS)
+_SENTENCE_END = re.compile(r"[.;:!?•▪](?=\s|$)")
+_DO_NOT_USE = re.compile(r"\b(?:do not (?:use|take|give)|contraindicated|must not be used|should not be used)\b", re.IGNORECASE)
+_CHILD_AGE = re.compile(r"\bchildren (?:under|younger than|less than) (\d{1,2}) years?", re.IGNORECASE)
+_ADULT_ONLY = re.compile(r"\b(?:safety and effectiveness in pediatric patients have not been established)\b", re.IGNORECASE)
+
+# Sections where every condition named is a contraindication, and sections where it is a caution
+# unless the sentence itself says "do not use"
+CONTRAINDICATION_SECTIONS = ("contraindications", "do_not_use", "boxed_warning")
+CAUTION_SECTIONS = (
+    "warnings", "warnings_and_cautions", "precautions", "ask_doctor", "ask_doctor_or_pharmacist",
+    "pregnancy_or_breast_feeding", "pregnancy", "pediatric_use", "dosage_and_administration",
+)
+
+class IndexEntry(NamedTuple):
+    contraindicated: int = 0
+    caution: int = 0
+    # Youngest age the label allows ("do not use in children under N years")
+    min_age: int = 0
+    # Youngest age it can be used without asking a doctor
+    caution_age: int = 0
+
+def conditions_mask(text: str) -> int:
+    mask = 0
+    for match in _ANY_CONDITION.finditer(text.lower()):
+        mask |= _TERM_BITS[match.group(0)]
+    return mask
+
+@lru_cache(maxsize=1024)
+def _patient_condition_mask(condition: str) -> int:
+    return conditions_mask(condition)
+
+def patient_mask(conditions: Optional[Iterable[str]]) -> int:
+    mask = 0
+    for condition in conditions or ():
+        if condition:
+            mask |= _patient_condition_mask(condition.strip().lower())
+    return mask
+
+def condition_names(mask: int) -> List[str]:
+    return [name for bit, name in enumerate(CONDITIONS) if mask & (1 << bit)]
+
+def _section_text(value: Any) -> str:
+    return " ".join(value) if isinstance(value, list) else str(value or "")
+
+def compile_label(label: Dict[str, Any]) -> IndexEntry:
+    """Reduce a label's warning sections to an ``IndexEntry``.
+
+    Sections are scanned once for condition phrases and ages; only the
+    sentences around those matches are checked for "do not use" wording.
+    """
+    contraindicated = caution = min_age = caution_age = 0
+    for section in CONTRAINDICATION_SECTIONS + CAUTION_SECTIONS:
+        text = _section_text(label.get(section)).lower()
+        if not text:
+            continue
+        always_contraindicated = section in CONTRAINDICATION_SECTIONS
+        boundaries = [m.end() for m in _SENTENCE_END.finditer(text)]
+        forbidden_sentences: Dict[int, bool] = {}
+
+        def forbidden(position: int) -> bool:
+            if always_contraindicated:
+                return True
+            i = bisect_right(boundaries, position)
+            start = boundaries[i - 1] if i else 0
+            if start not in forbidden_sentences:
+                end = boundaries[i] if i < len(boundaries) else len(text)
+                forbidden_sentences[start] = bool(_DO_NOT_USE.search(text, start, end))
+            return forbidden_sentences[start]
+
+        # Dosing tables name ages but any conditions in them are not warnings
+        if section != "dosage_and_administration":
+            for match in _ANY_CONDITION.finditer(text):
+                bit = _TERM_BITS[match.group(0)]
+                if forbidden(match.start()):
+                    contraindicated |= bit
+                else:
+                    caution |= bit
+        for match in _CHILD_AGE.finditer(text):
+            age = int(match.group(1))
+            if forbidden(match.start()):
+                min_age = max(min_age, age)
+            else:
+                caution_age = max(caution_age, age)
+        if section == "pediatric_use" and _ADULT_ONLY.search(text):
+            caution_age = max(caution_age, 18)
+    return IndexEntry(contraindicated, caution & ~contraindicated, min_age, max(caution_age, min_age))
+
+def drug_key(name: str) -> str:
+    return " ".join(name.lower().split())
+
+# Drug Facts wording of the medications get_basic_medications falls back to
+SEED_LABELS: Dict[str, Dict[str, Any]] = {
+    "acetaminophen": {
+        "warnings": ["Liver warning: This product contains acetaminophen. Severe liver damage may occur if you take "
+                     "more than the maximum daily amount or with 3 or more alcoholic drinks every day."],
+        "do_not_use": ["with any other drug containing acetaminophen"],
+        "ask_doctor": ["Ask a doctor before use if you have liver disease."],
+        "dosage_and_administration": ["children under 12 years: ask a doctor"],
+    },
+    "ibuprofen": {
+        "warnings": ["Stomach bleeding warning: This product contains an NSAID, which may cause severe stomach bleeding. "
+                     "Heart attack and stroke warning: NSAIDs may increase the risk of heart attack, heart failure, and stroke."],
+        "do_not_use": ["right before or after heart surgery; if you have ever had an allergic reaction to any pain reliever"],
+        "ask_doctor": ["Ask a doctor before use if stomach bleeding warning applies to you; you have a history of stomach "
+                       "problems; you have high blood pressure, heart disease, liver cirrhosis, kidney disease or asthma; "
+                       "you are taking a diuretic. Ask a doctor or pharmacist before use if you are taking a blood thinner."],
+        "pregnancy_or_breast_feeding": ["If pregnant or breast-feeding, ask a health professional before use. Do not use "
+                                        "during the last 3 months of pregnancy."],
+        "dosage_and_administration": ["children under 12 years: ask a doctor"],
+    },
+    "dextromethorphan": {
+        "do_not_use": ["in children under 4 years of age"],
+        "ask_doctor": ["Ask a doctor before use if you have cough that occurs with too much phlegm; chronic cough that "
+                       "lasts as occurs with smoking, asthma, or emphysema."],
+    },
+    "ginger supplements": {
+        "ask_doctor": ["Ask a doctor before use if you have a bleeding disorder, take a blood thinner, or have diabetes."],
+    },
+}
+
+class ContraindicationIndex:
+    def __init__(self, max_drugs: int = INDEX_MAX_DRUGS):
+        self.max_drugs = max_drugs
+        self._entries: "OrderedDict[str, IndexEntry]" = OrderedDict()
+        # OpenFDA returns the same labels for the same searches; each is compiled once
+        self._label_ids: "OrderedDict[str, None]" = OrderedDict()
+        self.labels_compiled = 0
+
+    def add(self, names: Iterable[str], entry: IndexEntry):
+        for name in names:
+            key = drug_key(name)
+            if not key:
+                continue
+            # Several labels per drug: keep every restriction any of them states
+            existing = self._entries.pop(key, None)
+            if existing is not None:
+                entry = IndexEntry(
+                    existing.contraindicated | entry.contraindicated,
+                    (existing.caution | entry.caution) & ~(existing.contraindicated | entry.contraindicated),
+                    max(existing.min_age, entry.min_age),
+                    max(existing.caution_age, entry.caution_age),
+                )
+            self._entries[key] = entry
+            if len(self._entries) > self.max_drugs:
+                self._entries.popitem(last=False)
+
+    def add_label(self, names: Iterable[str], label: Dict[str, Any]):
+        label_id = label.get("id") or label.get("set_id")
+        if label_id:
+            if label_id in self._label_ids:
+                return
+            self._label_ids[label_id] = None
+            if len(self._label_ids) > self.max_drugs:
+                self._label_ids.popitem(last=False)
+        self.add(names, compile_label(label))
+        self.labels_compiled += 1
+
+    def get(self, name: str) -> Optional[IndexEntry]:
+        return self._entries.get(drug_key(name))
+
+    def check(self, name: str, conditions: int, age: Optional[int]) -> Tuple[List[str], List[str]]:
+        """(reasons not to use, reasons to ask a doctor first) for one drug and patient."""
+        entry = self.get(name)
+        if entry is None:
+            return [], []
+        contraindicated = [f"Label advises against use with {c}" for c in condition_names(entry.contraindicated & conditions)]
+        cautions = [f"Label advises asking a doctor before use with {c}" for c in condition_names(entry.caution & conditions)]
+        if age is not None:
+            if age < entry.min_age:
+                contraindicated.append(f"Not for children under {entry.min_age}")
+            elif age < entry.caution_age:
+                cautions.append(f"Ask a doctor before giving to children under {entry.caution_age}")
+        return contraindicated, cautions
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+contraindication_index = ContraindicationIndex()
+for _name, _label in SEED_LABELS.items():
+    contraindication_index.add_label([_name], _label)
+
+def screen_medications(medications: List[Dict[str, Any]], conditions: int, age: Optional[int]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split medications into (usable, excluded); usable ones get ``cautions`` when a doctor should be asked first."""
+    usable, excluded = [], []
+    for medication in medications:
+        reasons, cautions = contraindication_index.check(medication.get('name', ''), conditions, age)
+        if reasons:
+            excluded.append({**medication, 'reasons': reasons})
+        elif cautions:
+            usable.append({**medication, 'cautions': cautions})
+        else:
+            usable.append(medication)
+    return usable, excluded
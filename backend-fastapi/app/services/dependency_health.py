@@ -0,0 +1,245 @@
+"""Background probing of the services the API depends on.
+
+Health endpoints used to either report hard-coded statuses or would have
+pinged Mongo on every call. Instead a task probes Mongo, Gemini, Nominatim
+and every Overpass mirror every ``DEPENDENCY_PROBE_INTERVAL`` seconds (with
+jitter so workers do not probe in lockstep), and the endpoints read the
+snapshot it leaves behind.
+
+A dependency turns ``down`` after ``PROBE_FAILURE_THRESHOLD`` consecutive
+failed probes and comes back after ``PROBE_RECOVERY_THRESHOLD`` successes;
+a successful probe slower than ``PROBE_SLOW_MS`` marks it ``degraded``.
+Readiness fails while any dependency in ``READY_REQUIRED_DEPENDENCIES`` is
+down.
+"""
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import random
+import time
+import httpx
+from ..database import db_manager
+from . import gemini_ai
+from .metrics import Gauge, registry
+
+PROBE_INTERVAL = float(os.getenv("DEPENDENCY_PROBE_INTERVAL", "30"))
+PROBE_TIMEOUT = float(os.getenv("DEPENDENCY_PROBE_TIMEOUT", "5"))
+PROBE_FAILURE_THRESHOLD = int(os.getenv("PROBE_FAILURE_THRESHOLD", "3"))
+PROBE_RECOVERY_THRESHOLD = int(os.getenv("PROBE_RECOVERY_THRESHOLD", "2"))
+PROBE_SLOW_MS = float(os.getenv("PROBE_SLOW_MS", "2000"))
+# Set to false to report ready even while MongoDB is unavailable (in-memory fallback)
+REQUIRE_DATABASE = os.getenv("REQUIRE_DATABASE", "true").lower() == "true"
+READY_REQUIRED_DEPENDENCIES = [
+    d.strip() for d in os.getenv("READY_REQUIRED_DEPENDENCIES", "mongodb" if REQUIRE_DATABASE else "").split(",")
+    if d.strip()
+]
+GEMINI_PROBE_BASE = gemini_ai.GEMINI_API_ENDPOINT or "https://generativelanguage.googleapis.com"
+
+Probe = Callable[[httpx.AsyncClient], Awaitable[Optional[Dict[str, Any]]]]
+
+class DependencyState:
+    __slots__ = (
+        "name", "status", "latency_ms", "checked_at", "last_success_at",
+        "consecutive_failures", "consecutive_successes", "last_error", "detail",
+    )
+
+    def __init__(self, name: str):
+        self.name = name
+        self.status = "unknown"
+        self.latency_ms: Optional[float] = None
+        self.checked_at: Optional[datetime] = None
+        self.last_success_at: Optional[datetime] = None
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+        self.last_error: Optional[str] = None
+        self.detail: Optional[Dict[str, Any]] = None
+
+    def record(self, ok: bool, latency_ms: float, error: Optional[str], detail: Optional[Dict[str, Any]],
+               failure_threshold: int, recovery_threshold: int, slow_ms: float):
+        now = datetime.utcnow()
+        self.checked_at = now
+        self.latency_ms = round(latency_ms, 1)
+        self.detail = detail
+        if ok:
+            self.consecutive_successes += 1
+            self.consecutive_failures = 0
+            self.last_success_at = now
+            self.last_error = None
+            if self.status == "down" and self.consecutive_successes < recovery_threshold:
+                return
+            self.status = "degraded" if latency_ms > slow_ms else "up"
+        else:
+            self.consecutive_failures += 1
+            self.consecutive_successes = 0
+            self.last_error = error
+            self.status = "down" if self.consecutive_failures >= failure_threshold else "degraded"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "latencyMs": self.latency_ms,
+            "checkedAt": self.checked_at.isoformat() if self.checked_at else None,
+            "lastSuccessAt": self.last_success_at.isoformat() if self.last_success_at else None,
+            "consecutiveFailures": self.consecutive_failures,
+            "message": self.last_error,
+            **({"detail": self.detail} if self.detail else {}),
+        }
+
+def _check_status(response: httpx.Response):
+    if not 200 <= response.status_code < 300:
+        raise RuntimeError(f"HTTP {response.status_code}")
+
+async def probe_mongodb(client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+    if not db_manager.ready or db_manager.client is None:
+        raise RuntimeError(db_manager.last_error or "Waiting for MongoDB connection pool")
+    await db_manager.client.admin.command("ping")
+    return None
+
+async def probe_gemini(client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+    # Model metadata is free to fetch and still checks reachability and the API key
+    response = await client.get(
+        f"{GEMINI_PROBE_BASE}/v1beta/models/{gemini_ai.DEFAULT_MODEL}",
+        headers={"x-goog-api-key": os.getenv("GEMINI_API_KEY", "")},
+    )
+    _check_status(response)
+    return {"model": gemini_ai.DEFAULT_MODEL}
+
+def _nominatim_status_url() -> str:
+    from ..routers.nearby import OSM_NOMINATIM_URL
+    base = OSM_NOMINATIM_URL[: -len("/search")] if OSM_NOMINATIM_URL.endswith("/search") else OSM_NOMINATIM_URL.rstrip("/")
+    return f"{base}/status"
+
+async def probe_nominatim(client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+    # /status is the endpoint Nominatim provides for monitoring; search would count against the usage policy
+    from ..routers.nearby import USER_AGENT
+    response = await client.get(_nominatim_status_url(), params={"format": "json"}, headers={"User-Agent": USER_AGENT})
+    _check_status(response)
+    return None
+
+async def probe_overpass(client: httpx.AsyncClient) -> Optional[Dict[str, Any]]:
+    """Up while at least one mirror answers; every mirror's result is kept in the detail."""
+    from ..routers.nearby import OVERPASS_URLS, USER_AGENT
+
+    async def check(url: str) -> Tuple[str, Dict[str, Any]]:
+        started = time.perf_counter()
+        try:
+            response = await client.get(url.replace("/interpreter", "/status"), headers={"User-Agent": USER_AGENT})
+            _check_status(response)
+            return url, {"ok": True, "latencyMs": round((time.perf_counter() - started) * 1000, 1)}
+        except Exception as e:
+            return url, {"ok": False, "error": str(e) or type(e).__name__}
+
+    mirrors = dict(await asyncio.gather(*(check(url) for url in OVERPASS_URLS)))
+    if not any(m["ok"] for m in mirrors.values()):
+        raise RuntimeError("No Overpass mirror reachable")
+    return {"mirrors": mirrors}
+
+class DependencyProber:
+    def __init__(
+        self,
+        interval: float = PROBE_INTERVAL,
+        timeout: float = PROBE_TIMEOUT,
+        failure_threshold: int = PROBE_FAILURE_THRESHOLD,
+        recovery_threshold: int = PROBE_RECOVERY_THRESHOLD,
+        slow_ms: float = PROBE_SLOW_MS,
+        required: Optional[List[str]] = None,
+    ):
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.recovery_threshold = recovery_threshold
+        self.slow_ms = slow_ms
+        self.required = READY_REQUIRED_DEPENDENCIES if required is None else required
+        self._probes: Dict[str, Tuple[Probe, Callable[[], bool]]] = {}
+        self.states: Dict[str, DependencyState] = {}
+        self._snapshot: Dict[str, Any] = {"checkedAt": None, "dependencies": {}}
+        self._task: Optional[asyncio.Task] = None
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def register(self, name: str, probe: Probe, configured: Callable[[], bool] = lambda: True):
+        self._probes[name] = (probe, configured)
+        self.states[name] = DependencyState(name)
+
+    async def _run_probe(self, name: str):
+        probe, configured = self._probes[name]
+        state = self.states[name]
+        if not configured():
+            state.status = "not-configured"
+            return
+        started = time.perf_counter()
+        ok, error, detail = True, None, None
+        try:
+            detail = await asyncio.wait_for(probe(self._client), self.timeout)
+        except asyncio.TimeoutError:
+            ok, error = False, f"Probe timed out after {self.timeout:g}s"
+        except Exception as e:
+            ok, error = False, str(e) or type(e).__name__
+        previous = state.status
+        state.record(ok, (time.perf_counter() - started) * 1000, error, detail,
+                     self.failure_threshold, self.recovery_threshold, self.slow_ms)
+        if state.status != previous and previous != "unknown":
+            logging.warning(f"Dependency {name} is now {state.status}" + (f": {error}" if error else ""))
+
+    async def probe_once(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        await asyncio.gather(*(self._run_probe(name) for name in self._probes))
+        # Replaced wholesale, so readers never see a half-updated round
+        self._snapshot = {
+            "checkedAt": datetime.utcnow().isoformat(),
+            "dependencies": {name: state.as_dict() for name, state in self.states.items()},
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        return self._snapshot
+
+    def readiness(self) -> Tuple[bool, List[str]]:
+        reasons = []
+        for name in self.required:
+            state = self.states.get(name)
+            if name == "mongodb" and not db_manager.ready:
+                # The connection loop notices outages before the next probe does
+                reasons.append(f"mongodb: {db_manager.last_error or 'Waiting for MongoDB connection pool'}")
+            elif state is not None and state.status == "down":
+                reasons.append(f"{name}: {state.last_error}")
+        return not reasons, reasons
+
+    async def _run(self):
+        while True:
+            try:
+                await self.probe_once()
+            except Exception as e:
+                logging.warning(f"Dependency probe round failed: {e}")
+            await asyncio.sleep(self.interval * random.uniform(0.9, 1.1))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+dependency_health = DependencyProber()
+dependency_health.register("mongodb", probe_mongodb)
+dependency_health.register("gemini", probe_gemini, configured=gemini_ai.gemini_configured)
+dependency_health.register("nominatim", probe_nominatim)
+dependency_health.register("overpass", probe_overpass)
+
+_STATUS_VALUES = {"up": 1.0, "degraded": 0.5, "down": 0.0}
+registry.register(Gauge(
+    "dependency_up", "1 when the last probes succeeded, 0.5 when degraded, 0 when down", ("dependency",),
+    callback=lambda: {
+        (name,): _STATUS_VALUES[state.status] for name, state in dependency_health.states.items()
+        if state.status in _STATUS_VALUES
+    }))
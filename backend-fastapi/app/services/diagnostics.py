@@ -0,0 +1,315 @@
+"""Opt-in diagnostics for finding blocking code and memory growth.
+
+* ``ProfilingMiddleware`` samples the event loop thread while a request runs
+  when the caller sends ``X-Profile: 1`` together with a valid
+  ``X-Admin-Token``. The folded stacks are kept in memory and the response
+  carries an ``X-Profile-Id`` to fetch them from ``/api/admin/profiles/{id}``.
+  Every coroutine sharing the loop during that time shows up in the samples,
+  which is what makes blocking calls stand out.
+* ``LoopLagMonitor`` wakes a heartbeat task every ``LOOP_LAG_INTERVAL_MS`` and
+  a watchdog thread logs the loop thread's stack whenever the heartbeat is
+  late by more than ``LOOP_LAG_THRESHOLD_MS``.
+* ``MemorySnapshots`` takes and diffs ``tracemalloc`` snapshots. Tracing
+  starts with the first snapshot and costs memory and CPU until stopped.
+
+Profiles and memory snapshots are only available when ``ADMIN_TOKEN`` is set.
+"""
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import asyncio
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import traceback
+import uuid
+from .metrics import Histogram, registry
+
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", "50"))
+LOOP_LAG_MONITOR = os.getenv("LOOP_LAG_MONITOR", "true").lower() == "true"
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "50"))
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "250"))
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "10"))
+
+LOOP_LAG = registry.register(Histogram(
+    "event_loop_lag_seconds", "How late the loop heartbeat woke up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)))
+
+def admin_token_valid(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def fold_stack(frame) -> str:
+    """Root-first ``a;b;c`` stack, the input format of flamegraph.pl and speedscope."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, interval: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.started_at = datetime.utcnow()
+        self.duration: Optional[float] = None
+        self.samples: Counter = Counter()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "profileId": self.id,
+            "method": self.method,
+            "path": self.path,
+            "startedAt": self.started_at.isoformat(),
+            "durationMs": round(self.duration * 1000, 2) if self.duration is not None else None,
+            "samples": sum(self.samples.values()),
+            "intervalMs": self.interval * 1000,
+        }
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id: int, profile: RequestProfile):
+        super().__init__(name=f"profiler-{profile.id}", daemon=True)
+        self.thread_id = thread_id
+        self.profile = profile
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.profile.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.profile.samples[fold_stack(frame)] += 1
+
+class ProfileStore:
+    """The most recent request profiles of this worker."""
+
+    def __init__(self, max_size: int = PROFILE_HISTORY):
+        self.max_size = max_size
+        self._profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+
+    def add(self, profile: RequestProfile):
+        self._profiles[profile.id] = profile
+        while len(self._profiles) > self.max_size:
+            self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [p.summary() for p in reversed(self._profiles.values())]
+
+profiles = ProfileStore()
+
+class ProfilingMiddleware:
+    def __init__(self, app, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.app = app
+        self.interval = interval_ms / 1000
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ADMIN_TOKEN:
+            await self.app(scope, receive, send)
+            return
+        headers = {k.lower(): v for k, v in scope.get("headers", [])}
+        token = headers.get(b"x-admin-token", b"").decode("latin-1")
+        if headers.get(b"x-profile") not in (b"1", b"true") or not admin_token_valid(token):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope.get("method", ""), scope.get("path", ""), self.interval)
+        sampler = _Sampler(threading.get_ident(), profile)
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            sampler.stopped.set()
+            profile.duration = time.perf_counter() - started
+            profiles.add(profile)
+
+class LoopLagMonitor:
+    """Detect callbacks that hold the event loop for longer than ``threshold``.
+
+    The heartbeat task records how late each wake-up was. The watchdog
+    thread only reads a timestamp, so while the loop is blocked it can still
+    capture the stack of whatever is blocking it; one warning is logged per
+    stall.
+    """
+
+    def __init__(self, interval_ms: float = LOOP_LAG_INTERVAL_MS, threshold_ms: float = LOOP_LAG_THRESHOLD_MS):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._last_beat = time.monotonic()
+        self._reported = False
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.last_stall: Optional[Dict[str, Any]] = None
+
+    async def _beat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._last_beat = now
+            self._reported = False
+            LOOP_LAG.observe((), lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag > self.threshold and self.last_stall is not None and self.last_stall.get("durationMs") is None:
+                self.last_stall["durationMs"] = round(lag * 1000, 1)
+
+    def _current_task(self) -> Optional[str]:
+        # Read from the watchdog thread; the loop is blocked, so the mapping is not changing
+        current = getattr(asyncio.tasks, "_current_tasks", {}).get(self._loop)
+        if current is None:
+            return None
+        return f"{current.get_name()} {current.get_coro()!r}"
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            blocked = time.monotonic() - self._last_beat - self.interval
+            if blocked < self.threshold or self._reported:
+                continue
+            self._reported = True
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+            task = self._current_task()
+            self.stalls += 1
+            self.last_stall = {
+                "detectedAt": datetime.utcnow().isoformat(),
+                "blockedForMs": round(blocked * 1000, 1),
+                "durationMs": None,
+                "task": task,
+                "stack": stack,
+            }
+            logging.warning(f"Event loop blocked for over {blocked * 1000:.0f} ms in task {task}:\n{stack}")
+
+    def start(self):
+        if not LOOP_LAG_MONITOR or (self._task is not None and not self._task.done()):
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._beat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._task is not None,
+            "thresholdMs": self.threshold * 1000,
+            "maxLagMs": round(self.max_lag * 1000, 1),
+            "stalls": self.stalls,
+            "lastStall": self.last_stall,
+        }
+
+loop_lag_monitor = LoopLagMonitor()
+
+_IGNORED_TRACES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+def _stat_entry(stat, key_type: str) -> Dict[str, Any]:
+    frame = stat.traceback[0]
+    entry = {
+        "location": f"{frame.filename}:{frame.lineno}",
+        "sizeKiB": round(stat.size / 1024, 1),
+        "count": stat.count,
+    }
+    if hasattr(stat, "size_diff"):
+        entry["sizeDiffKiB"] = round(stat.size_diff / 1024, 1)
+        entry["countDiff"] = stat.count_diff
+    if key_type == "traceback":
+        entry["traceback"] = [f"{f.filename}:{f.lineno}" for f in stat.traceback]
+    return entry
+
+class MemorySnapshots:
+    """Baseline-and-diff workflow around ``tracemalloc``.
+
+    Take a snapshot, exercise the suspect path (for example create many
+    sessions), then diff: the largest positive ``sizeDiffKiB`` entries show
+    where memory is growing.
+    """
+
+    def __init__(self, frames: int = TRACEMALLOC_FRAMES):
+        self.frames = frames
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.baseline_at: Optional[datetime] = None
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        return tracemalloc.take_snapshot().filter_traces(_IGNORED_TRACES)
+
+    def status(self) -> Dict[str, Any]:
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "tracedKiB": round(current / 1024, 1),
+            "peakKiB": round(peak / 1024, 1),
+            "baselineAt": self.baseline_at.isoformat() if self.baseline_at else None,
+        }
+
+    def take(self, top: int = 20, key_type: str = "lineno") -> Dict[str, Any]:
+        self.baseline = self._snapshot()
+        self.baseline_at = datetime.utcnow()
+        stats = self.baseline.statistics(key_type)[:top]
+        return {**self.status(), "top": [_stat_entry(s, key_type) for s in stats]}
+
+    def diff(self, top: int = 20, key_type: str = "lineno", rebase: bool = False) -> Optional[Dict[str, Any]]:
+        if self.baseline is None:
+            return None
+        current = self._snapshot()
+        stats = current.compare_to(self.baseline, key_type)[:top]
+        result = {**self.status(), "comparedAt": datetime.utcnow().isoformat(), "top": [_stat_entry(s, key_type) for s in stats]}
+        if rebase:
+            self.baseline, self.baseline_at = current, datetime.utcnow()
+        return result
+
+    def stop(self):
+        self.baseline = None
+        self.baseline_at = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+memory_snapshots = MemorySnapshots()
@@ -0,0 +1,196 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+import asyncio
+import json
+import logging
+import os
+import time
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+from ..database import db_manager
+from ..models.doctor import Doctor
+from .metrics import register_cache
+
+DOCTOR_CACHE_SIZE = int(os.getenv("DOCTOR_CACHE_SIZE", "5000"))
+QUERY_CACHE_SIZE = int(os.getenv("DOCTOR_QUERY_CACHE_SIZE", "1000"))
+# Fields written by counter-only updates, which do not change cached profiles or query results
+COUNTER_FIELDS = ("metadata.searchCount",)
+# Upper bound on how long any worker may serve a doctor or query result without checking Mongo
+CACHE_STALENESS_SECONDS = float(os.getenv("DOCTOR_CACHE_STALENESS", "30"))
+
+class _Entry:
+    __slots__ = ("value", "version", "checked_at", "size")
+
+    def __init__(self, value: Any, version: Any, size: int):
+        self.value = value
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.size = size
+
+class LRUCache:
+    """Size-bounded LRU that also tracks the approximate bytes it holds."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Hashable, value: Any, version: Any, size: int):
+        self.pop(key)
+        self._entries[key] = _Entry(value, version, size)
+        self.bytes += size
+        while len(self._entries) > self.max_size:
+            _, evicted = self._entries.popitem(last=False)
+            self.bytes -= evicted.size
+            self.evictions += 1
+
+    def pop(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "maxEntries": self.max_size,
+            "approxBytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+        }
+
+def is_content_change(change: Dict[str, Any]) -> bool:
+    """False for change events of updates that only touched COUNTER_FIELDS."""
+    if change.get("operationType") != "update":
+        return True
+    description = change.get("updateDescription") or {}
+    fields = list(description.get("updatedFields") or {}) + list(description.get("removedFields") or [])
+    return bool(description.get("truncatedArrays")) or any(not f.startswith(COUNTER_FIELDS) for f in fields)
+
+class DoctorCache:
+    """Read-through cache of Doctor documents and hot query results.
+
+    A cached doctor is served without a database round trip for
+    ``staleness`` seconds. After that it is revalidated with a projected read
+    of ``metadata.version`` and only reloaded if that version changed.
+    Query results simply expire after the same window. When Mongo runs as a
+    replica set, a change stream evicts updated doctors immediately, ignoring
+    updates that only touch counters.
+    """
+
+    def __init__(
+        self,
+        max_doctors: int = DOCTOR_CACHE_SIZE,
+        max_queries: int = QUERY_CACHE_SIZE,
+        staleness: float = CACHE_STALENESS_SECONDS,
+    ):
+        self.staleness = staleness
+        self.doctors = LRUCache(max_doctors)
+        self.queries = LRUCache(max_queries)
+        self.revalidations = 0
+        self.change_stream_active = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def get_doctor(self, doctor_id: str) -> Optional[Doctor]:
+        oid = ObjectId(doctor_id)
+        entry = self.doctors.get(oid)
+        if entry is not None:
+            if time.monotonic() - entry.checked_at < self.staleness:
+                self.doctors.hits += 1
+                return entry.value
+            self.revalidations += 1
+            raw = await Doctor.get_motor_collection().find_one({"_id": oid}, {"metadata.version": 1})
+            # Documents written before versioning have no field; the model reads them as 0
+            if raw and (raw.get("metadata") or {}).get("version", 0) == entry.version:
+                entry.checked_at = time.monotonic()
+                self.doctors.hits += 1
+                return entry.value
+
+        self.doctors.misses += 1
+        doctor = await Doctor.get(oid)
+        if doctor is None:
+            self.doctors.pop(oid)
+            return None
+        self.doctors.put(oid, doctor, doctor.metadata.version, len(doctor.model_dump_json()))
+        return doctor
+
+    def get_query(self, key: Hashable) -> Optional[Any]:
+        entry = self.queries.get(key)
+        if entry is not None and time.monotonic() - entry.checked_at < self.staleness:
+            self.queries.hits += 1
+            return entry.value
+        self.queries.misses += 1
+        return None
+
+    def put_query(self, key: Hashable, value: Any):
+        self.queries.put(key, value, None, len(json.dumps(value, default=str)))
+
+    def invalidate(self, doctor_id: Any = None):
+        if doctor_id is not None:
+            self.doctors.pop(doctor_id)
+        # Any query result may contain the changed doctor
+        self.queries.clear()
+
+    async def _watch_changes(self):
+        while True:
+            if not db_manager.ready:
+                await asyncio.sleep(5)
+                continue
+            try:
+                async with Doctor.get_motor_collection().watch() as stream:
+                    self.change_stream_active = True
+                    async for change in stream:
+                        if is_content_change(change):
+                            self.invalidate((change.get("documentKey") or {}).get("_id"))
+            except OperationFailure as e:
+                # Standalone servers have no change streams; version checks keep the cache correct
+                logging.info(f"Doctor change stream unavailable, using version checks: {e}")
+                self.change_stream_active = False
+                return
+            except Exception as e:
+                self.change_stream_active = False
+                logging.warning(f"Doctor change stream interrupted: {e}")
+                self.invalidate()
+                await asyncio.sleep(5)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch_changes())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.change_stream_active = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "doctors": self.doctors.stats(),
+            "queries": self.queries.stats(),
+            "revalidations": self.revalidations,
+            "stalenessSeconds": self.staleness,
+            "changeStream": self.change_stream_active,
+        }
+
+doctor_cache = DoctorCache()
+register_cache("doctors", lambda: (doctor_cache.doctors.hits, doctor_cache.doctors.misses))
+register_cache("doctor_queries", lambda: (doctor_cache.queries.hits, doctor_cache.queries.misses))
@@ -0,0 +1,220 @@
+"""Bulk import of registry doctors into the ``doctors`` collection.
+
+Usage::
+
+    python -m app.services.doctor_import doctors.jsonl --batch-size 2000 --checkpoint import.ckpt
+
+Records are streamed from CSV or JSONL, validated into ``Doctor`` and written
+with unordered ``bulk_write`` upserts keyed on ``verification.licenseNumber``.
+CSV columns use dotted paths for nested fields (``location.hospital.name``);
+cells holding a JSON array or object are decoded.
+"""
+from dotenv import load_dotenv
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), ".env"))
+
+from beanie import init_beanie
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from ..database import MONGODB_URI, database_name, create_mongo_client, reconcile_indexes
+from ..models.doctor import Doctor
+
+DEFAULT_BATCH_SIZE = int(os.getenv("DOCTOR_IMPORT_BATCH_SIZE", "1000"))
+LICENSE_FIELD = "verification.licenseNumber"
+
+def _unflatten(row: Dict[str, Optional[str]]) -> Dict[str, Any]:
+    record: Dict[str, Any] = {}
+    for key, value in row.items():
+        if key is None or value is None or value == "":
+            continue
+        if value[:1] in "[{":
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        target = record
+        parts = key.split(".")
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return record
+
+def iter_records(path: str, fmt: Optional[str] = None) -> Iterator[Optional[Dict[str, Any]]]:
+    """Yield one record per input row; unparseable rows are yielded as None."""
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "jsonl")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            for row in csv.DictReader(f):
+                yield _unflatten(row)
+            return
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+def upsert_operation(doctor: Doctor) -> UpdateOne:
+    # bulk_write bypasses Beanie's event hooks, so compile the availability bitmap here
+    doctor.compile_availability()
+    doc = doctor.model_dump(exclude={"id", "revision_id"})
+    metadata = doc.pop("metadata", {})
+    # Never reset popularity counters of doctors that are already in the directory
+    search_count = metadata.pop("searchCount", 0)
+    metadata.pop("version", None)
+    update = {
+        "$set": {**doc, **{f"metadata.{k}": v for k, v in metadata.items()}},
+        "$setOnInsert": {"metadata.searchCount": search_count},
+        # Cached profiles and their ETags are keyed on the version
+        "$inc": {"metadata.version": 1},
+    }
+    return UpdateOne({LICENSE_FIELD: doctor.verification.licenseNumber}, update, upsert=True)
+
+def read_checkpoint(path: Optional[str], source: str) -> int:
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return int(data.get("records", 0)) if data.get("source") == source else 0
+
+def write_checkpoint(path: Optional[str], source: str, records: int):
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"source": source, "records": records}, f)
+    os.replace(tmp, path)
+
+class ImportStats:
+    def __init__(self, skipped: int = 0):
+        self.started = time.perf_counter()
+        self.skipped = skipped
+        self.processed = 0
+        self.inserted = 0
+        self.updated = 0
+        self.invalid = 0
+        self.failed = 0
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    def report(self, prefix: str = "Imported"):
+        print(
+            f"{prefix} {self.processed} records ({self.rate:.0f}/s): {self.inserted} inserted, "
+            f"{self.updated} updated, {self.invalid} invalid, {self.failed} failed"
+        )
+
+DUPLICATE_KEY = 11000
+
+async def _write_batch(collection, ops: List[UpdateOne], stats: ImportStats, retry: bool = True):
+    try:
+        result = await collection.bulk_write(ops, ordered=False)
+        stats.inserted += result.upserted_count
+        stats.updated += result.modified_count
+    except BulkWriteError as e:
+        # Unordered writes keep going past failures; count what did succeed
+        details = e.details
+        stats.inserted += details.get("nUpserted", 0)
+        stats.updated += details.get("nModified", 0)
+        errors = details.get("writeErrors", [])
+        # Two upserts of one licence (repeated in the batch, or from a concurrent import) both
+        # missed and raced to insert; the unique index rejected the loser, which now matches
+        duplicates = [ops[error["index"]] for error in errors if error.get("code") == DUPLICATE_KEY] if retry else []
+        stats.failed += len(errors) - len(duplicates)
+        if duplicates:
+            await _write_batch(collection, duplicates, stats, retry=False)
+
+async def import_doctors(
+    path: str,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    checkpoint: Optional[str] = None,
+    fmt: Optional[str] = None,
+    defer_indexes: bool = True,
+) -> ImportStats:
+    client = create_mongo_client()
+    database = client[database_name(MONGODB_URI)]
+    await reconcile_indexes(database, [Doctor])
+    await init_beanie(database=database, document_models=[Doctor])
+    collection = Doctor.get_motor_collection()
+
+    source = os.path.abspath(path)
+    resume_from = read_checkpoint(checkpoint, source)
+    stats = ImportStats(skipped=resume_from)
+
+    # On a first load, maintaining the secondary indexes row by row costs more than building them once at the end
+    first_load = defer_indexes and await collection.estimated_document_count() == 0
+    if first_load:
+        # Upserts look doctors up by licence number, so that index is kept throughout
+        for name, info in (await collection.index_information()).items():
+            if name != "_id_" and [field for field, _ in info["key"]] != [LICENSE_FIELD]:
+                await collection.drop_index(name)
+    if resume_from:
+        print(f"Resuming {path} after {resume_from} records")
+
+    ops: List[UpdateOne] = []
+    position = 0
+    try:
+        try:
+            for record in iter_records(path, fmt):
+                position += 1
+                if position <= resume_from:
+                    continue
+                stats.processed += 1
+                try:
+                    doctor = Doctor.model_validate(record)
+                except (ValidationError, TypeError):
+                    stats.invalid += 1
+                    continue
+                if not doctor.verification or not doctor.verification.licenseNumber:
+                    stats.invalid += 1
+                    continue
+                ops.append(upsert_operation(doctor))
+                if len(ops) >= batch_size:
+                    await _write_batch(collection, ops, stats)
+                    ops = []
+                    write_checkpoint(checkpoint, source, position)
+                    stats.report()
+            if ops:
+                await _write_batch(collection, ops, stats)
+            write_checkpoint(checkpoint, source, position)
+        finally:
+            # Also after a failed or interrupted load, which would otherwise leave the directory
+            # without its search indexes (a resumed import finds documents and defers nothing)
+            if first_load:
+                print("Building doctor indexes...")
+                await init_beanie(database=database, document_models=[Doctor])
+        stats.report("Finished:")
+        return stats
+    finally:
+        client.close()
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Bulk import doctors from CSV or JSONL")
+    parser.add_argument("path", help="CSV or JSONL file of doctor records")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format (default: from file extension)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--checkpoint", help="File recording progress, used to resume an interrupted import")
+    parser.add_argument("--keep-indexes", action="store_true", help="Do not defer index builds on a first load")
+    args = parser.parse_args(argv)
+    asyncio.run(import_doctors(
+        args.path,
+        batch_size=args.batch_size,
+        checkpoint=args.checkpoint,
+        fmt=args.format,
+        defer_indexes=not args.keep_indexes,
+    ))
+
+if __name__ == "__main__":
+    main()
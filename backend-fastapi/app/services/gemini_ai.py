@@ -1,80 +1,144 @@
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import logging
 import httpx
 import json
 import asyncio
+from .contraindications import contraindication_index, patient_mask, screen_medications
+from .metrics import upstream_call, upstream_transport
 
 # Remove mock mode entirely - always use real APIs
 USE_MOCK = False
 
-try:
-    import google.generativeai as genai  # type: ignore
-except Exception:  # pragma: no cover
-    genai = None
+# google.generativeai pulls in grpc and protobuf, which is about half of the app's import time.
+# It is imported on first use, or in the background by the startup warm-up.
+genai = None
+_genai_loaded = False
+_genai_import: Optional[asyncio.Future] = None
+
+def load_genai():
+    global genai, _genai_loaded
+    if not _genai_loaded:
+        try:
+            import google.generativeai as module  # type: ignore
+            genai = module
+        except Exception:  # pragma: no cover
+            genai = None
+        _genai_loaded = True
+    return genai
+
+async def import_genai():
+    """Import the SDK in a worker thread so the event loop keeps serving requests.
+
+    Callers arriving while the warm-up is still importing wait for that same
+    import instead of starting a second one on the loop.
+    """
+    global _genai_import
+    if _genai_loaded:
+        return genai
+    if _genai_import is None:
+        _genai_import = asyncio.ensure_future(asyncio.to_thread(load_genai))
+    try:
+        # Shielded so a cancelled request does not cancel the import others wait on
+        return await asyncio.shield(_genai_import)
+    finally:
+        if _genai_import.done() and (_genai_import.cancelled() or _genai_import.exception()):
+            _genai_import = None
+
+def gemini_configured() -> bool:
+    key = os.getenv("GEMINI_API_KEY", "")
+    return bool(key) and key != "your_actual_gemini_api_key"
 
 DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# Alternative Gemini host, e.g. the benchmark stub; it is spoken to over REST so plain http:// works
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
+OPENFDA_LABEL_URL = os.getenv("OPENFDA_LABEL_URL", "https://api.fda.gov/drug/label.json")
+UMLS_SEARCH_URL = os.getenv("UMLS_SEARCH_URL", "https://uts-ws.nlm.nih.gov/rest/search/current")
+MESH_LOOKUP_URL = os.getenv("MESH_LOOKUP_URL", "https://id.nlm.nih.gov/mesh/lookup/term")
+OPENFDA_MAX_SYMPTOMS = int(os.getenv("OPENFDA_MAX_SYMPTOMS", "8"))
+
+_configured_pid: Optional[int] = None
+
+def gemini_ready() -> bool:
+    """Configure Gemini once per process.
+
+    Configuring at import time would create the client in the supervisor
+    before workers are forked; doing it on first use gives every worker its
+    own client.
+    """
+    global genai, _configured_pid
+    # Without a key the SDK is never imported
+    if not gemini_configured() or load_genai() is None:
+        return False
+    gemini_api_key = os.getenv("GEMINI_API_KEY", "")
+    if _configured_pid != os.getpid():
+        try:
+            endpoint = {"transport": "rest", "client_options": {"api_endpoint": GEMINI_API_ENDPOINT}} if GEMINI_API_ENDPOINT else {}
+            genai.configure(api_key=gemini_api_key, **endpoint)
+            _configured_pid = os.getpid()
+            logging.info(f"Gemini AI configured successfully with key ending in: ...{gemini_api_key[-4:]}")
+        except Exception as e:
+            logging.error(f"Failed to configure Gemini AI: {e}")
+            genai = None
+            return False
+    return True
 
-# Configure Gemini if API key is available
-gemini_api_key = os.getenv("GEMINI_API_KEY", "")
-if genai and gemini_api_key and gemini_api_key != "your_actual_gemini_api_key":
+async def _openfda_search(client: httpx.AsyncClient, symptom: str) -> List[Dict[str, Any]]:
+    medications = []
+    # Search for drugs related to the symptom
+    symptom_clean = symptom.lower().replace(' ', '+')
+    url = f"{OPENFDA_LABEL_URL}?search=indications_and_usage:{symptom_clean}&limit=2"
     try:
-        genai.configure(api_key=gemini_api_key)
-        logging.info(f"Gemini AI configured successfully with key ending in: ...{gemini_api_key[-4:]}")
+        response = await client.get(url)
+        if response.status_code == 200:
+            data = response.json()
+            results = data.get('results', [])
+
+            for result in results:
+                openfda = result.get('openfda', {})
+                brand_names = openfda.get('brand_name', [])
+                generic_names = openfda.get('generic_name', [])
+
+                if brand_names or generic_names:
+                    name = brand_names[0] if brand_names else generic_names[0] if generic_names else "Unknown"
+                    # The label is at hand now; later checks only need its compiled warnings
+                    contraindication_index.add_label(brand_names + generic_names, result)
+
+                    # Get dosage information
+                    dosage_info = result.get('dosage_and_administration', [''])
+                    dosage = dosage_info[0][:100] + "..." if dosage_info and dosage_info[0] else "Follow package instructions"
+
+                    medications.append({
+                        'name': name,
+                        'type': 'over-the-counter' if 'otc' in str(result).lower() else 'prescription',
+                        'dosage': dosage,
+                        'frequency': 'As directed',
+                        'source': 'OpenFDA',
+                        'indication': symptom
+                    })
     except Exception as e:
-        logging.error(f"Failed to configure Gemini AI: {e}")
-        genai = None
-else:
-    logging.warning(f"Gemini AI not configured - genai={genai is not None}, key_length={len(gemini_api_key)}")
+        logging.warning(f"OpenFDA API error for {symptom}: {e}")
+    return medications
 
 async def fetch_from_openfda_api(symptoms: List[str]) -> List[Dict[str, Any]]:
-    """Fetch real drug information from OpenFDA API with shorter timeout"""
+    """Fetch real drug information from OpenFDA API, searching every symptom concurrently"""
     medications = []
-    
+    # Keeps one request from spending a large share of the keyless 240 requests/minute quota
+    unique_symptoms = list(dict.fromkeys(s.strip() for s in symptoms if s and s.strip()))[:OPENFDA_MAX_SYMPTOMS]
+
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            for symptom in symptoms[:1]:  # Limit to 1 symptom to reduce timeout
-                # Search for drugs related to the symptom
-                symptom_clean = symptom.lower().replace(' ', '+')
-                url = f"https://api.fda.gov/drug/label.json?search=indications_and_usage:{symptom_clean}&limit=2"
-                
-                try:
-                    response = await client.get(url)
-                    if response.status_code == 200:
-                        data = response.json()
-                        results = data.get('results', [])
-                        
-                        for result in results:
-                            openfda = result.get('openfda', {})
-                            brand_names = openfda.get('brand_name', [])
-                            generic_names = openfda.get('generic_name', [])
-                            
-                            if brand_names or generic_names:
-                                name = brand_names[0] if brand_names else generic_names[0] if generic_names else "Unknown"
-                                
-                                # Get dosage information
-                                dosage_info = result.get('dosage_and_administration', [''])
-                                dosage = dosage_info[0][:100] + "..." if dosage_info and dosage_info[0] else "Follow package instructions"
-                                
-                                medications.append({
-                                    'name': name,
-                                    'type': 'over-the-counter' if 'otc' in str(result).lower() else 'prescription',
-                                    'dosage': dosage,
-                                    'frequency': 'As directed',
-                                    'source': 'OpenFDA',
-                                    'indication': symptom
-                                })
-                
-                except Exception as e:
-                    logging.warning(f"OpenFDA API error for {symptom}: {e}")
-                    continue
-                    
-                # Small delay between requests
-                await asyncio.sleep(0.2)
-                
+        async with httpx.AsyncClient(timeout=5.0, transport=upstream_transport("openfda")) as client:
+            per_symptom = await asyncio.gather(*(_openfda_search(client, symptom) for symptom in unique_symptoms))
     except Exception as e:
         logging.error(f"OpenFDA API general error: {e}")
-    
+        return medications
+
+    seen = set()
+    for results in per_symptom:
+        for medication in results:
+            if medication['name'].lower() not in seen:
+                seen.add(medication['name'].lower())
+                medications.append(medication)
     return medications
 
 async def fetch_from_umls_api(symptoms: List[str]) -> List[Dict[str, Any]]:
@@ -82,10 +146,10 @@ async def fetch_from_umls_api(symptoms: List[str]) -> List[Dict[str, Any]]:
     conditions = []
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with httpx.AsyncClient(timeout=10.0, transport=upstream_transport("umls")) as client:
             for symptom in symptoms[:2]:
                 # Search UMLS for conditions related to symptom
-                url = f"https://uts-ws.nlm.nih.gov/rest/search/current"
+                url = UMLS_SEARCH_URL
                 params = {
                     'string': symptom,
                     'searchType': 'words',
@@ -127,10 +191,10 @@ async def fetch_from_mesh_api(symptoms: List[str]) -> List[Dict[str, Any]]:
     conditions = []
     
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with httpx.AsyncClient(timeout=10.0, transport=upstream_transport("mesh")) as client:
             for symptom in symptoms:
                 # Search MeSH terms
-                url = f"https://id.nlm.nih.gov/mesh/lookup/term"
+                url = MESH_LOOKUP_URL
                 params = {
                     'label': symptom,
                     'match': 'contains',
@@ -248,9 +312,8 @@ async def analyze_symptoms(symptoms: List[Dict[str, Any]], patient_info: Dict[st
     symptom_names = [s.get("name", "").lower() for s in symptoms]
     severities = [s.get("severity", "moderate") for s in symptoms]
     
-    # Try Gemini AI first if available
-    gemini_api_key = os.getenv("GEMINI_API_KEY", "")
-    if genai and gemini_api_key and gemini_api_key != "your_actual_gemini_api_key":
+    # Try Gemini AI first if available; gemini_ready only finds the SDK once it is imported
+    if gemini_configured() and await import_genai() is not None and gemini_ready():
         try:
             logging.info("Attempting Gemini AI analysis...")
             model = genai.GenerativeModel(DEFAULT_MODEL)
@@ -273,7 +336,8 @@ async def analyze_symptoms(symptoms: List[Dict[str, Any]], patient_info: Dict[st
             Return only valid JSON format.
             """
             
-            response = model.generate_content(prompt)
+            with upstream_call("gemini", DEFAULT_MODEL):
+                response = model.generate_content(prompt)
             result_text = response.text
             logging.info(f"Gemini response received: {len(result_text)} characters")
             
@@ -296,7 +360,7 @@ async def analyze_symptoms(symptoms: List[Dict[str, Any]], patient_info: Dict[st
         except Exception as e:
             logging.error(f"Gemini API error: {e}")
     else:
-        logging.info(f"Gemini AI not available - genai={genai is not None}, key_available={bool(gemini_api_key)}")
+        logging.info(f"Gemini AI not available - genai={genai is not None}, key_available={bool(os.getenv('GEMINI_API_KEY'))}")
     
     # Fallback to external medical APIs
     try:
@@ -400,13 +464,18 @@ async def get_medications(input_payload: Dict[str, Any]) -> Dict[str, Any]:
     else:
         symptom_names = []
     
+    patient_conditions = patient_mask(input_payload.get('conditions'))
+    age = input_payload.get('age')
+    severity = (input_payload.get('severity') or '').lower()
+
     # Try to get medications from external APIs
     try:
-        medications_fda = await fetch_from_openfda_api(symptom_names)
+        medications_fda, excluded = screen_medications(await fetch_from_openfda_api(symptom_names), patient_conditions, age)
         
         if not medications_fda:
-            # Fallback to basic medication recommendations
-            medications_fda = await get_basic_medications(symptom_names)
+            # Fallback to basic medication recommendations, unless they are ruled out as well
+            medications_fda, excluded_basic = screen_medications(await get_basic_medications(symptom_names), patient_conditions, age)
+            excluded.extend(excluded_basic)
         
         # Additional general advice based on symptoms
         general_advice = []
@@ -450,9 +519,16 @@ async def get_medications(input_payload: Dict[str, Any]) -> Dict[str, Any]:
         # Add specific warnings based on symptoms
         if any('stomach' in s.lower() or 'nausea' in s.lower() for s in symptom_names):
             warnings.append("Take medications with food if stomach upset occurs")
+
+        if severity == 'severe':
+            warnings.insert(0, "Severe symptoms should be assessed by a healthcare provider before relying on over-the-counter medication")
+
+        if excluded:
+            warnings.append("Some medications were left out because their labels advise against them for your conditions or age")
         
         return {
             "medications": medications_fda[:6],  # Top 6 from external APIs
+            "excludedMedications": excluded[:6],
             "generalAdvice": general_advice,
             "warnings": warnings,
             "source": "External APIs (OpenFDA)",
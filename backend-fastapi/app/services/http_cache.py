@@ -0,0 +1,197 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import gzip
+import hashlib
+import os
+from fastapi import Request, Response
+from .metrics import register_cache
+
+try:
+    import brotli  # type: ignore
+except Exception:  # pragma: no cover
+    try:
+        import brotlicffi as brotli  # type: ignore
+    except Exception:
+        brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# Brotli quality 4-5 compresses better than gzip -6 at similar speed; 11 is only worth it offline
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+COMPRESSED_CACHE_SIZE = int(os.getenv("COMPRESSED_CACHE_SIZE", "512"))
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+# Streaming bodies are passed through untouched so events are not held back by a compressor
+STREAMING_TYPES = ("text/event-stream", "application/x-ndjson")
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+def make_etag(*parts) -> str:
+    """Strong ETag derived from the inputs that fully determine a response."""
+    return body_etag("\x1f".join(str(p) for p in parts).encode())
+
+def _base_tag(tag: str) -> str:
+    # Compressed variants carry a -gzip/-br suffix; they validate the same representation
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in ('-gzip"', '-br"'):
+        if tag.endswith(suffix):
+            return tag[: -len(suffix)] + '"'
+    return tag
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    base = _base_tag(etag)
+    return any(_base_tag(tag) == base for tag in if_none_match.split(","))
+
+def conditional(request: Request, response: Response, etag: str, cache_control: str) -> Optional[Response]:
+    """Set validators on ``response``; return a 304 when the client already has this version.
+
+    Called before the body is built, so a revalidation costs no serialization.
+    """
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"})
+    return None
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from Accept-Encoding, honouring q-values."""
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    wildcard = weights.get("*", 0.0)
+    candidates = (["br"] if brotli else []) + ["gzip"]
+    best = max(candidates, key=lambda c: weights.get(c, wildcard))
+    return best if weights.get(best, wildcard) > 0 else None
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+class CompressedBodyCache:
+    """LRU of compressed bodies keyed by a hash of the body, so repeated responses skip the compressor.
+
+    Handler ETags are built from version inputs rather than the bytes, and a
+    body can change while they stay the same; hashing is far cheaper than
+    compressing, so the key is always computed from the body itself.
+    """
+
+    def __init__(self, max_size: int = COMPRESSED_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, body_hash: str, encoding: str, body: bytes) -> bytes:
+        key = (body_hash, encoding)
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+        self.misses += 1
+        data = compress(body, encoding)
+        self._entries[key] = data
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        return data
+
+compressed_bodies = CompressedBodyCache()
+register_cache("compressed_bodies", lambda: (compressed_bodies.hits, compressed_bodies.misses))
+
+class CompressionMiddleware:
+    """Strong ETags, 304 revalidation and negotiated gzip/brotli for buffered responses.
+
+    Only complete (single-message) 200 responses are touched. GET responses
+    without an ETag get one computed from the body; responses that already
+    carry a Content-Encoding or are streamed are passed through.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        accept_encoding = headers.get("accept-encoding", "")
+        if_none_match = headers.get("if-none-match")
+        is_get = scope.get("method") in ("GET", "HEAD")
+        start_message = None
+        passthrough = False
+
+        async def wrapped_send(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+            if start_message is not None and message.get("more_body", False):
+                # Streaming response: forward as-is
+                passthrough = True
+                await send(start_message)
+                start_message = None
+                await send(message)
+                return
+            if start_message is None:
+                await send(message)
+                return
+            await self._finish(start_message, message.get("body", b""), accept_encoding, if_none_match, is_get, send)
+            start_message = None
+
+        await self.app(scope, receive, wrapped_send)
+
+    async def _finish(self, start, body: bytes, accept_encoding: str, if_none_match: Optional[str], is_get: bool, send):
+        raw_headers: List[Tuple[bytes, bytes]] = list(start.get("headers", []))
+        names = {k.lower(): v for k, v in raw_headers}
+        content_type = names.get(b"content-type", b"").decode("latin-1")
+        status = start["status"]
+        if status != 200 or b"content-encoding" in names or content_type.startswith(STREAMING_TYPES):
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        etag = names.get(b"etag", b"").decode("latin-1")
+        body_hash = None
+        if not etag and is_get:
+            etag = body_hash = body_etag(body)
+            raw_headers.append((b"etag", etag.encode("latin-1")))
+        if etag and is_get and etag_matches(if_none_match, etag):
+            kept = [(k, v) for k, v in raw_headers if k.lower() in (b"etag", b"cache-control", b"vary")]
+            await send({"type": "http.response.start", "status": 304, "headers": kept})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        encoding = None
+        if len(body) >= self.minimum_size and content_type.startswith(COMPRESSIBLE_TYPES):
+            encoding = negotiate_encoding(accept_encoding)
+        if encoding:
+            body = compressed_bodies.get(body_hash or body_etag(body), encoding, body)
+            raw_headers = [(k, v) for k, v in raw_headers if k.lower() not in (b"content-length", b"etag")]
+            raw_headers.append((b"content-encoding", encoding.encode()))
+            raw_headers.append((b"content-length", str(len(body)).encode()))
+            if etag:
+                raw_headers.append((b"etag", f'{etag[:-1]}-{encoding}"'.encode("latin-1")))
+        if content_type.startswith(COMPRESSIBLE_TYPES):
+            raw_headers.append((b"vary", b"Accept-Encoding"))
+        await send({**start, "headers": raw_headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,41 @@
+"""Leases for background jobs that must run in one process only.
+
+Every worker forked by the supervisor starts the same background services;
+jobs that rewrite shared data (moving availability slots forward, archiving
+analyses) take a lease first, so exactly one process runs them at a time and
+another takes over once the holder stops renewing.
+"""
+from datetime import datetime, timedelta
+import logging
+import os
+import socket
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from ..models.lease import Lease
+
+def _owner() -> str:
+    # Workers are forked after import, so the pid is read when the lease is taken
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+async def acquire_lease(name: str, ttl: float) -> bool:
+    """Take or renew the lease ``name`` for ``ttl`` seconds; False while another process holds it."""
+    owner = _owner()
+    now = datetime.utcnow()
+    try:
+        doc = await Lease.get_motor_collection().find_one_and_update(
+            {"_id": name, "$or": [{"owner": owner}, {"expiresAt": {"$lte": now}}]},
+            {"$set": {"owner": owner, "expiresAt": now + timedelta(seconds=ttl)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+    except DuplicateKeyError:
+        # The lease exists and is held by someone else, so the upsert tried to insert a second one
+        return False
+    return bool(doc) and doc.get("owner") == owner
+
+async def release_lease(name: str):
+    """Give the lease up on shutdown so another process does not wait for it to expire."""
+    try:
+        await Lease.get_motor_collection().delete_one({"_id": name, "owner": _owner()})
+    except Exception as e:
+        logging.warning(f"Releasing lease {name} failed: {e}")
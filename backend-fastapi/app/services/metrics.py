@@ -0,0 +1,313 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Recording is a dict lookup and a couple of additions on the event loop
+thread, so nothing takes a lock and the instrumentation can stay on in
+production. Every worker keeps its own registry and reports its pid as a
+label; sum across ``pid`` in queries. Set ``METRICS_ENABLED=false`` to skip
+recording altogether.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import os
+import time
+import httpx
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Upstream calls range from ~50 ms (MeSH) to the 25 s Overpass timeout
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+UNMATCHED_ROUTE = "<unmatched>"
+
+Labels = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = ("pid",) + tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        if METRICS_ENABLED:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Labels = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self, pid: str) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, (pid,) + labels)} {_format_value(v)}"
+            for labels, v in self._values.items()
+        ]
+
+class Gauge(Counter):
+    """Set or adjusted directly, or computed at scrape time by ``callback``."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = (),
+                 callback: Optional[Callable[[], Dict[Labels, float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, labels: Labels, value: float):
+        self._values[labels] = value
+
+    def dec(self, labels: Labels = (), amount: float = 1):
+        if METRICS_ENABLED:
+            self._values[labels] = self._values.get(labels, 0) - amount
+
+    def samples(self, pid: str) -> List[str]:
+        if self.callback is not None:
+            self._values = dict(self.callback())
+        return super().samples(pid)
+
+class _HistogramSeries:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, size: int):
+        # One slot per bucket plus +Inf; stored per bucket and made cumulative when rendered
+        self.counts = [0] * (size + 1)
+        self.sum = 0.0
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Labels = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, _HistogramSeries] = {}
+
+    def observe(self, labels: Labels, value: float):
+        if not METRICS_ENABLED:
+            return
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _HistogramSeries(len(self.buckets))
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.sum += value
+
+    def samples(self, pid: str) -> List[str]:
+        lines = []
+        for labels, series in self._series.items():
+            values = (pid,) + labels
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series.counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, values)} {series.sum!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        pid = str(os.getpid())
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.header())
+            lines.extend(metric.samples(pid))
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter(
+    "http_requests_total", "Requests handled, by route template and status code", ("method", "route", "status")))
+HTTP_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "Time from request start to the last body byte", ("method", "route")))
+HTTP_IN_FLIGHT = registry.register(Gauge(
+    "http_requests_in_flight", "Requests currently being handled"))
+UPSTREAM_REQUESTS = registry.register(Counter(
+    "upstream_requests_total",
+    "Outbound calls by upstream and host; outcome is the status class, timeout or error",
+    ("upstream", "target", "outcome")))
+UPSTREAM_LATENCY = registry.register(Histogram(
+    "upstream_request_duration_seconds", "Outbound call time including the response body", ("upstream", "target")))
+UPSTREAM_IN_FLIGHT = registry.register(Gauge(
+    "upstream_requests_in_flight", "Outbound calls currently waiting on an upstream", ("upstream",)))
+
+_cache_sources: Dict[str, Callable[[], Tuple[int, int]]] = {}
+
+def register_cache(name: str, source: Callable[[], Tuple[int, int]]):
+    """Expose a cache's (hits, misses), read only when metrics are scraped."""
+    _cache_sources[name] = source
+
+def _cache_counts() -> Dict[str, Tuple[int, int]]:
+    return {name: source() for name, source in _cache_sources.items()}
+
+registry.register(Gauge(
+    "cache_hits", "Lookups served from a local cache since the worker started", ("cache",),
+    callback=lambda: {(name,): hits for name, (hits, _) in _cache_counts().items()}))
+registry.register(Gauge(
+    "cache_misses", "Lookups a local cache could not serve since the worker started", ("cache",),
+    callback=lambda: {(name,): misses for name, (_, misses) in _cache_counts().items()}))
+registry.register(Gauge(
+    "cache_hit_ratio", "hits / (hits + misses) for each local cache", ("cache",),
+    callback=lambda: {
+        (name,): hits / (hits + misses) for name, (hits, misses) in _cache_counts().items() if hits + misses
+    }))
+
+_started = time.time()
+registry.register(Gauge(
+    "process_start_time_seconds", "Unix time the worker process started", callback=lambda: {(): _started}))
+
+def render() -> str:
+    return registry.render()
+
+def record_upstream(upstream: str, target: str, outcome: str, seconds: float):
+    UPSTREAM_REQUESTS.inc((upstream, target, outcome))
+    UPSTREAM_LATENCY.observe((upstream, target), seconds)
+
+def _exception_outcome(exc: BaseException) -> str:
+    # Covers httpx, asyncio and SDK deadline errors (e.g. google.api_core DeadlineExceeded)
+    name = type(exc).__name__
+    if isinstance(exc, (TimeoutError, httpx.TimeoutException)) or "Timeout" in name or "Deadline" in name:
+        return "timeout"
+    return "error"
+
+@contextmanager
+def upstream_call(upstream: str, target: str = "default") -> Iterator[None]:
+    """Time a call to an upstream that is not made through an instrumented httpx client."""
+    UPSTREAM_IN_FLIGHT.inc((upstream,))
+    started = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException as exc:
+        outcome = _exception_outcome(exc)
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec((upstream,))
+        record_upstream(upstream, target, outcome, time.perf_counter() - started)
+
+class _TimedStream(httpx.AsyncByteStream):
+    """Response body wrapper that records the call once the body is consumed or closed."""
+
+    def __init__(self, stream, upstream: str, target: str, status: int, started: float):
+        self._stream = stream
+        self._upstream = upstream
+        self._target = target
+        self._outcome = f"{status // 100}xx"
+        self._started = started
+        self._done = False
+
+    async def __aiter__(self):
+        try:
+            async for chunk in self._stream:
+                yield chunk
+        except BaseException as exc:
+            self._outcome = _exception_outcome(exc)
+            raise
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._done:
+                self._done = True
+                UPSTREAM_IN_FLIGHT.dec((self._upstream,))
+                record_upstream(self._upstream, self._target, self._outcome, time.perf_counter() - self._started)
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """httpx transport that records latency, status class, timeouts and errors per upstream host."""
+
+    def __init__(self, upstream: str, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.upstream = upstream
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        target = request.url.host
+        UPSTREAM_IN_FLIGHT.inc((self.upstream,))
+        started = time.perf_counter()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException as exc:
+            UPSTREAM_IN_FLIGHT.dec((self.upstream,))
+            record_upstream(self.upstream, target, _exception_outcome(exc), time.perf_counter() - started)
+            raise
+        if response.is_closed:
+            # Body already read by the transport (e.g. mocks); nothing left to time
+            UPSTREAM_IN_FLIGHT.dec((self.upstream,))
+            record_upstream(self.upstream, target, f"{response.status_code // 100}xx", time.perf_counter() - started)
+            return response
+        response.stream = _TimedStream(response.stream, self.upstream, target, response.status_code, started)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+def upstream_transport(upstream: str) -> httpx.AsyncBaseTransport:
+    return InstrumentedTransport(upstream) if METRICS_ENABLED else httpx.AsyncHTTPTransport()
+
+def route_template(scope) -> str:
+    # Newer FastAPI resolves included routers lazily and leaves the un-prefixed route in scope["route"]
+    context = (scope.get("fastapi") or {}).get("effective_route_context")
+    path = getattr(context, "path", None) or getattr(scope.get("route"), "path", None)
+    return path or UNMATCHED_ROUTE
+
+class MetricsMiddleware:
+    """Per-route latency, status codes and in-flight requests.
+
+    Requests are labelled with the matched route template (``/api/doctors/{doctor_id}``),
+    never the raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        started = time.perf_counter()
+
+        async def wrapped_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, wrapped_send)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            template = route_template(scope)
+            method = scope.get("method", "")
+            HTTP_REQUESTS.inc((method, template, str(status)))
+            HTTP_LATENCY.observe((method, template), time.perf_counter() - started)
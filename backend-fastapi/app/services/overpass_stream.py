@@ -0,0 +1,87 @@
+import codecs
+import json
+import re
+from typing import Any, Dict, List
+
+# Matches the opening of the top-level "elements" array in an Overpass JSON body
+_ELEMENTS_START = re.compile(r'"elements"\s*:\s*\[')
+
+
+class OverpassElementParser:
+    """Incrementally extract element objects from a streamed Overpass JSON body.
+
+    Chunks are fed as they arrive from the network; every element object that
+    has been fully received is returned by ``feed`` so callers can act on it
+    without waiting for the rest of the response.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._in_array = False
+        self._done = False
+        # State of the object currently being scanned
+        self._obj_start = -1
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        if self._done:
+            return []
+        self._buf += self._decoder.decode(chunk)
+        elements: List[Dict[str, Any]] = []
+
+        if not self._in_array:
+            match = _ELEMENTS_START.search(self._buf)
+            if not match:
+                # Keep a short tail in case the key is split across chunks
+                self._buf = self._buf[-32:]
+                return elements
+            self._in_array = True
+            self._buf = self._buf[match.end():]
+            self._pos = 0
+
+        buf = self._buf
+        i = self._pos
+        n = len(buf)
+        while i < n:
+            ch = buf[i]
+            if self._obj_start < 0:
+                if ch == "{":
+                    self._obj_start = i
+                    self._depth = 1
+                elif ch == "]":
+                    self._done = True
+                    break
+                # whitespace and commas between elements are skipped
+            elif self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    elements.append(json.loads(buf[self._obj_start:i + 1]))
+                    self._obj_start = -1
+            i += 1
+
+        # Drop everything that has already been consumed
+        keep_from = self._obj_start if self._obj_start >= 0 else i
+        self._buf = buf[keep_from:]
+        self._pos = i - keep_from
+        if self._obj_start >= 0:
+            self._obj_start = 0
+        return elements
@@ -0,0 +1,312 @@
+"""Per-client, per-route request limits.
+
+Limits use a sliding window counter: the count for the current fixed window
+plus the previous window's count weighted by how much of it the sliding
+window still covers. That is two integers per client and rule, cheap to keep
+in memory and to share through MongoDB with one upsert per request. Every
+attempt is counted, including rejected ones, so a client that keeps retrying
+stays limited until it backs off.
+
+Rules match on the longest path prefix (``/api/doctors/nearby`` covers the
+streaming variant too) and can be overridden with ``RATE_LIMITS``, e.g.
+``/api/symptoms/analyze=5/60;/api/health=0/60`` (a limit of 0 disables the
+rule). Clients are identified by the first available of ``RATE_LIMIT_KEYS``:
+``api_key`` (an ``X-API-Key`` listed in ``RATE_LIMIT_API_KEYS``),
+``session`` (``X-Session-Id`` or ``?sessionId=``; client-chosen, so only
+enable it when sessions are not the thing being abused) and ``ip``.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from ..database import db_manager
+from ..models.rate_limit import RateLimitCounter
+from .metrics import Counter, registry
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# "memory" limits per worker; "mongo" shares counters between workers and falls back to memory while Mongo is down
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory").lower()
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "16"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_SWEEP_INTERVAL = float(os.getenv("RATE_LIMIT_SWEEP_INTERVAL", "10"))
+RATE_LIMIT_KEYS = [k.strip() for k in os.getenv("RATE_LIMIT_KEYS", "api_key,ip").split(",") if k.strip()]
+RATE_LIMIT_API_KEYS = {k.strip() for k in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if k.strip()}
+
+# (path prefix, requests, window seconds). Analysis costs Gemini quota and nearby costs Overpass
+# capacity, so they get the tightest budgets; probes and scrapes the loosest.
+DEFAULT_RULES: List[Tuple[str, int, int]] = [
+    ("/api/symptoms/analyze", 10, 60),
+    ("/api/symptoms/medications", 30, 60),
+    ("/api/doctors/nearby", 20, 60),
+    ("/api/admin", 60, 60),
+    ("/api/health", 600, 60),
+    ("/api/metrics", 600, 60),
+    ("/api", 300, 60),
+]
+
+RATE_LIMITED = registry.register(Counter(
+    "rate_limited_requests_total", "Requests rejected with 429, by rate-limit rule", ("rule",)))
+
+class RateLimitRule:
+    __slots__ = ("prefix", "limit", "window", "policy")
+
+    def __init__(self, prefix: str, limit: int, window: int):
+        self.prefix = prefix
+        self.limit = limit
+        self.window = window
+        self.policy = f"{limit};w={window}"
+
+def parse_rules(spec: str, defaults: Iterable[Tuple[str, int, int]] = DEFAULT_RULES) -> List[RateLimitRule]:
+    """Defaults overridden by ``prefix=limit/window`` entries separated by ``;``, longest prefix first."""
+    rules = {prefix: (limit, window) for prefix, limit, window in defaults}
+    for item in spec.split(";"):
+        if not item.strip():
+            continue
+        try:
+            prefix, _, value = item.partition("=")
+            limit, _, window = value.partition("/")
+            rules[prefix.strip()] = (int(limit), int(window or 60))
+        except ValueError:
+            logging.warning(f"Ignoring malformed RATE_LIMITS entry: {item!r}")
+    return sorted(
+        (RateLimitRule(prefix, limit, window) for prefix, (limit, window) in rules.items() if limit > 0 and window > 0),
+        key=lambda r: len(r.prefix), reverse=True,
+    )
+
+class _WindowCounter:
+    __slots__ = ("window_index", "current", "previous", "expires_at")
+
+    def __init__(self):
+        self.window_index = 0
+        self.current = 0
+        self.previous = 0
+        self.expires_at = 0.0
+
+class MemoryRateLimitStore:
+    """Counters spread over dict shards kept in last-hit order.
+
+    Because a hit moves its key to the end of its shard, expired counters
+    are always at the front: sweeping and evicting (when a shard is full)
+    only ever look at the oldest entries instead of scanning everything.
+    """
+
+    def __init__(self, shards: int = RATE_LIMIT_SHARDS, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self._shards: List[Dict[str, _WindowCounter]] = [{} for _ in range(max(1, shards))]
+        self.max_per_shard = max(1, max_keys // len(self._shards))
+        self.evictions = 0
+
+    async def hit(self, key: str, window: int, now: float) -> Tuple[int, int]:
+        shard = self._shards[hash(key) % len(self._shards)]
+        index = int(now // window)
+        counter = shard.pop(key, None)
+        if counter is None:
+            if len(shard) >= self.max_per_shard:
+                shard.pop(next(iter(shard)))
+                self.evictions += 1
+            counter = _WindowCounter()
+            counter.window_index = index
+        if counter.window_index != index:
+            counter.previous = counter.current if counter.window_index == index - 1 else 0
+            counter.current = 0
+            counter.window_index = index
+        counter.current += 1
+        # Once two windows have passed neither count affects the estimate any more
+        counter.expires_at = (index + 2) * window
+        shard[key] = counter
+        return counter.current, counter.previous
+
+    def sweep(self, now: float) -> int:
+        removed = 0
+        for shard in self._shards:
+            while shard:
+                key = next(iter(shard))
+                if shard[key].expires_at > now:
+                    break
+                del shard[key]
+                removed += 1
+        return removed
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
+
+class MongoRateLimitStore:
+    """Counters in ``rate_limits``, one document per client and rule, shared by every worker."""
+
+    async def hit(self, key: str, window: int, now: float) -> Tuple[int, int]:
+        index = int(now // window)
+        update = {
+            "$inc": {f"counts.{index}": 1},
+            "$unset": {f"counts.{index - 2}": ""},
+            "$set": {"expiresAt": datetime.utcfromtimestamp((index + 2) * window)},
+        }
+        collection = RateLimitCounter.get_motor_collection()
+        try:
+            doc = await collection.find_one_and_update(
+                {"_id": key}, update, upsert=True, return_document=ReturnDocument.AFTER, projection={"counts": 1},
+            )
+        except DuplicateKeyError:
+            # Two workers upserted the same new key at once; the document exists now
+            doc = await collection.find_one_and_update(
+                {"_id": key}, update, return_document=ReturnDocument.AFTER, projection={"counts": 1},
+            )
+        counts = (doc or {}).get("counts", {})
+        return counts.get(str(index), 0), counts.get(str(index - 1), 0)
+
+class RateLimitDecision:
+    __slots__ = ("rule", "allowed", "remaining", "reset", "retry_after")
+
+    def __init__(self, rule: RateLimitRule, allowed: bool, remaining: int, reset: int, retry_after: Optional[int]):
+        self.rule = rule
+        self.allowed = allowed
+        self.remaining = remaining
+        self.reset = reset
+        self.retry_after = retry_after
+
+    def headers(self) -> List[Tuple[bytes, bytes]]:
+        headers = [
+            (b"ratelimit-limit", str(self.rule.limit).encode()),
+            (b"ratelimit-remaining", str(self.remaining).encode()),
+            (b"ratelimit-reset", str(self.reset).encode()),
+            (b"ratelimit-policy", self.rule.policy.encode()),
+        ]
+        if self.retry_after is not None:
+            headers.append((b"retry-after", str(self.retry_after).encode()))
+        return headers
+
+def _retry_after(limit: int, window: int, current: int, previous: int, elapsed: float) -> int:
+    """Seconds until one more request fits, assuming the client sends nothing meanwhile."""
+    budget = limit - 1
+    if current > budget:
+        # Not before the next window, where this window's count becomes the weighted one
+        weight_needed = budget / current if current else 1.0
+        wait = (window - elapsed) + (1 - weight_needed) * window
+    else:
+        weight_needed = (budget - current) / previous if previous else 1.0
+        wait = (1 - weight_needed) * window - elapsed
+    return max(1, math.ceil(wait))
+
+class RateLimiter:
+    def __init__(self, rules: Optional[List[RateLimitRule]] = None, store: str = RATE_LIMIT_STORE):
+        self.rules = parse_rules(os.getenv("RATE_LIMITS", "")) if rules is None else rules
+        self.store_mode = store
+        self.memory = MemoryRateLimitStore()
+        self.mongo = MongoRateLimitStore()
+        self._task: Optional[asyncio.Task] = None
+
+    def rule_for(self, path: str) -> Optional[RateLimitRule]:
+        for rule in self.rules:
+            if path.startswith(rule.prefix):
+                return rule
+        return None
+
+    async def hit(self, rule: RateLimitRule, client: str, now: Optional[float] = None) -> RateLimitDecision:
+        # Wall-clock time so every worker agrees on window boundaries when counters are shared
+        now = time.time() if now is None else now
+        key = f"{rule.prefix}|{client}"
+        counts = None
+        if self.store_mode == "mongo" and db_manager.ready:
+            try:
+                counts = await self.mongo.hit(key, rule.window, now)
+            except Exception as e:
+                logging.warning(f"Shared rate-limit store failed, limiting per worker: {e}")
+        if counts is None:
+            counts = await self.memory.hit(key, rule.window, now)
+        current, previous = counts
+        elapsed = now % rule.window
+        estimate = previous * (1 - elapsed / rule.window) + current
+        allowed = estimate <= rule.limit
+        return RateLimitDecision(
+            rule,
+            allowed,
+            remaining=max(0, math.floor(rule.limit - estimate)),
+            reset=max(1, math.ceil(rule.window - elapsed)),
+            retry_after=None if allowed else _retry_after(rule.limit, rule.window, current, previous, elapsed),
+        )
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(RATE_LIMIT_SWEEP_INTERVAL)
+            self.memory.sweep(time.time())
+
+    def start(self):
+        if RATE_LIMIT_ENABLED and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+rate_limiter = RateLimiter()
+
+def client_identity(scope, headers: Dict[bytes, bytes]) -> str:
+    for source in RATE_LIMIT_KEYS:
+        if source == "api_key":
+            api_key = headers.get(b"x-api-key", b"").decode("latin-1")
+            if api_key and api_key in RATE_LIMIT_API_KEYS:
+                return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+        elif source == "session":
+            session_id = headers.get(b"x-session-id", b"").decode("latin-1")
+            if not session_id and scope.get("query_string"):
+                session_id = parse_qs(scope["query_string"].decode("latin-1")).get("sessionId", [""])[0]
+            if session_id:
+                return "session:" + session_id[:64]
+        elif source == "ip":
+            # uvicorn already substituted X-Forwarded-For from trusted proxies (proxy_headers=True)
+            client = scope.get("client")
+            if client:
+                return "ip:" + client[0]
+    return "anonymous"
+
+class RateLimitMiddleware:
+    """Reject over-limit requests with 429 and add ``RateLimit-*`` headers to limited routes.
+
+    Mounted inside CORS, so preflights are never counted and 429s still
+    carry the CORS headers the browser needs to read them.
+    """
+
+    def __init__(self, app, limiter: RateLimiter = rate_limiter):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED or scope.get("method") == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        rule = self.limiter.rule_for(scope.get("path", ""))
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.lower(): v for k, v in scope.get("headers", [])}
+        decision = await self.limiter.hit(rule, client_identity(scope, headers))
+        limit_headers = decision.headers()
+        if not decision.allowed:
+            RATE_LIMITED.inc((rule.prefix,))
+            body = json.dumps({"detail": "Rate limit exceeded"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 429,
+                "headers": limit_headers + [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) + limit_headers}
+            await send(message)
+
+        await self.app(scope, receive, wrapped_send)
@@ -0,0 +1,130 @@
+"""Offline reverse geocoding from a local gazetteer.
+
+The gazetteer is a CSV file with the header
+``name,kind,latitude,longitude,city,state,postcode,country`` where ``kind`` is
+one of locality, suburb or postcode. It is loaded once into a grid index so a
+lookup only inspects the cells around the query point.
+
+The nearest entry only tells which locality a place is in, never its street
+address, so it is reported separately as ``approximate_locality``.
+"""
+import csv
+import logging
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+GAZETTEER_PATH = os.getenv(
+    "GAZETTEER_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "gazetteer.csv"),
+)
+# Places further than this from every gazetteer entry are left without a locality
+MAX_DISTANCE_KM = float(os.getenv("GAZETTEER_MAX_DISTANCE_KM", "15"))
+CELL_DEG = 0.1
+
+class Place:
+    __slots__ = ("lat", "lon", "label")
+
+    def __init__(self, lat: float, lon: float, label: str):
+        self.lat = lat
+        self.lon = lon
+        self.label = label
+
+def _label(row: Dict[str, str]) -> str:
+    name = (row.get("name") or "").strip()
+    city = (row.get("city") or "").strip()
+    state = (row.get("state") or "").strip()
+    postcode = (row.get("postcode") or "").strip()
+    parts = [name if name != city else None, city, f"{state} {postcode}".strip(), (row.get("country") or "").strip()]
+    return ", ".join(p for p in parts if p)
+
+class ReverseGeocoder:
+    def __init__(self, places: Sequence[Place], max_distance_km: float = MAX_DISTANCE_KM):
+        self.max_distance_km = max_distance_km
+        self._grid: Dict[Tuple[int, int], List[Place]] = {}
+        for place in places:
+            self._grid.setdefault(self._cell(place.lat, place.lon), []).append(place)
+        self.size = len(places)
+
+    @classmethod
+    def from_csv(cls, path: str) -> "ReverseGeocoder":
+        places: List[Place] = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    places.append(Place(float(row["latitude"]), float(row["longitude"]), _label(row)))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        return cls(places)
+
+    @staticmethod
+    def _cell(lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / CELL_DEG), math.floor(lon / CELL_DEG)
+
+    @staticmethod
+    def _ring_cells(ring: int) -> List[Tuple[int, int]]:
+        if ring == 0:
+            return [(0, 0)]
+        cells = [(dy, dx) for dy in (-ring, ring) for dx in range(-ring, ring + 1)]
+        cells += [(dy, dx) for dx in (-ring, ring) for dy in range(-ring + 1, ring)]
+        return cells
+
+    def nearest(self, lat: float, lon: float) -> Optional[Place]:
+        """Nearest gazetteer entry within ``max_distance_km``, searching outward ring by ring."""
+        cy, cx = self._cell(lat, lon)
+        cos_lat = max(math.cos(math.radians(lat)), 0.01)
+        # A ring of cells is guaranteed to cover at least this much distance in every direction
+        ring_km = CELL_DEG * 111.32 * cos_lat
+        max_ring = int(self.max_distance_km / ring_km) + 1
+        # Compare squared planar degrees; convert the bound once instead of per candidate
+        deg_per_km = 1 / 111.32
+        best: Optional[Place] = None
+        best_d2 = (self.max_distance_km * deg_per_km) ** 2
+        grid = self._grid
+        for ring in range(max_ring + 1):
+            if best is not None and ((ring - 1) * ring_km * deg_per_km) ** 2 > best_d2:
+                break
+            for dy, dx in _RING_CELLS[ring] if ring < len(_RING_CELLS) else self._ring_cells(ring):
+                for place in grid.get((cy + dy, cx + dx), ()):
+                    x = (place.lon - lon) * cos_lat
+                    y = place.lat - lat
+                    d2 = x * x + y * y
+                    if d2 <= best_d2:
+                        best, best_d2 = place, d2
+        return best
+
+    def fill_localities(self, doctors: Sequence[Any]) -> int:
+        """Set ``approximate_locality`` on every doctor without an address; returns how many were filled."""
+        filled = 0
+        for doctor in doctors:
+            if doctor.address or doctor.approximate_locality:
+                continue
+            place = self.nearest(doctor.coordinates.latitude, doctor.coordinates.longitude)
+            if place:
+                doctor.approximate_locality = place.label
+                filled += 1
+        return filled
+
+_RING_CELLS = [ReverseGeocoder._ring_cells(ring) for ring in range(8)]
+
+_geocoder: Optional[ReverseGeocoder] = None
+_loaded = False
+
+def get_reverse_geocoder() -> Optional[ReverseGeocoder]:
+    """Load the gazetteer on first use; None when no gazetteer file is available."""
+    global _geocoder, _loaded
+    if not _loaded:
+        _loaded = True
+        if os.path.exists(GAZETTEER_PATH):
+            try:
+                _geocoder = ReverseGeocoder.from_csv(GAZETTEER_PATH)
+                logging.info(f"Loaded {_geocoder.size} gazetteer entries from {GAZETTEER_PATH}")
+            except Exception as e:
+                logging.error(f"Failed to load gazetteer {GAZETTEER_PATH}: {e}")
+        else:
+            logging.warning(f"Gazetteer not found at {GAZETTEER_PATH}; localities will not be filled")
+    return _geocoder
+
+def fill_missing_localities(doctors: Sequence[Any]) -> int:
+    geocoder = get_reverse_geocoder()
+    return geocoder.fill_localities(doctors) if geocoder else 0
@@ -0,0 +1,72 @@
+from collections import Counter
+from typing import Iterable, Optional
+import asyncio
+import logging
+import os
+from pymongo import UpdateOne
+from ..database import db_manager
+from ..models.doctor import Doctor
+
+FLUSH_INTERVAL = float(os.getenv("SEARCH_COUNT_FLUSH_INTERVAL", "10"))
+
+class SearchCountAggregator:
+    """Accumulate doctor search counts in memory and persist them in periodic batches.
+
+    ``record`` only touches a dict, so popularity tracking never adds a database
+    write to the request path. Each flush sends one unordered ``bulk_write`` of
+    ``$inc`` updates, and a final flush runs on shutdown. Counts are not profile
+    content, so the flush leaves ``metadata.version`` and ``lastUpdated`` alone
+    and cached profiles stay valid.
+    """
+
+    def __init__(self, interval: float = FLUSH_INTERVAL):
+        self.interval = interval
+        self._pending: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+        self.flushed = 0
+
+    def record(self, doctor_ids: Iterable) -> None:
+        self._pending.update(doctor_ids)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        if not self._pending or not db_manager.ready:
+            return 0
+        batch, self._pending = self._pending, Counter()
+        ops = [
+            UpdateOne({"_id": doctor_id}, {"$inc": {"metadata.searchCount": count}})
+            for doctor_id, count in batch.items()
+        ]
+        try:
+            await Doctor.get_motor_collection().bulk_write(ops, ordered=False)
+        except Exception as e:
+            # Put the increments back so they go out with the next flush
+            self._pending.update(batch)
+            logging.warning(f"Search count flush failed, will retry: {e}")
+            return 0
+        self.flushed += len(ops)
+        return len(ops)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+search_counts = SearchCountAggregator()
@@ -0,0 +1,202 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+import logging
+import os
+import time
+import uuid
+from pymongo import ReturnDocument
+from ..database import db_manager
+from ..models.patient import SESSION_IDLE_TTL, Patient
+from .doctor_cache import LRUCache
+from .metrics import register_cache
+
+# "mongo" shares sessions between workers through the patients collection and answers 503
+# while the database is down; "memory" keeps them per process, for single-worker development
+SESSION_STORE = os.getenv("SESSION_STORE", "mongo").lower()
+if SESSION_STORE not in ("mongo", "memory"):
+    # Switching stores at runtime lost sessions on reconnect and split them across workers
+    logging.warning(f"Unsupported SESSION_STORE={SESSION_STORE!r}, using mongo")
+    SESSION_STORE = "mongo"
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "100000"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "2000"))
+# How long a worker may serve a session from its local cache before rereading Mongo
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "5"))
+# Reads refresh lastActiveAt (and so the idle TTL) at most this often per session
+SESSION_TOUCH_INTERVAL = float(os.getenv("SESSION_TOUCH_INTERVAL", "60"))
+
+PROFILE_FIELDS = ("name", "email", "phone", "age", "gender", "location")
+
+def new_session_id() -> str:
+    return f"sess_{uuid.uuid4().hex[:10]}"
+
+class _SessionRecord:
+    __slots__ = ("profile", "created_at", "last_active", "symptom_checks", "doctor_searches")
+
+    def __init__(self, profile: Dict[str, Any]):
+        self.profile = profile
+        self.created_at = self.last_active = time.time()
+        self.symptom_checks = 0
+        self.doctor_searches = 0
+
+    def to_dict(self, session_id: str) -> Dict[str, Any]:
+        return {
+            "sessionId": session_id,
+            "profile": dict(self.profile),
+            "createdAt": datetime.utcfromtimestamp(self.created_at).isoformat(),
+            "lastActiveAt": datetime.utcfromtimestamp(self.last_active).isoformat(),
+            "totalSymptomChecks": self.symptom_checks,
+            "totalDoctorSearches": self.doctor_searches,
+            "isActive": True,
+        }
+
+class MemorySessionStore:
+    """Per-process sessions with idle expiry and a hard size bound.
+
+    Records are kept in order of last activity, so expired sessions are
+    always at the front and each sweep only touches what it removes. When the
+    store is full the least recently active session is dropped.
+    """
+
+    def __init__(self, max_entries: int = SESSION_MAX_ENTRIES, idle_ttl: float = SESSION_IDLE_TTL):
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self._records: "OrderedDict[str, _SessionRecord]" = OrderedDict()
+
+    def _evict(self):
+        cutoff = time.time() - self.idle_ttl
+        while self._records:
+            oldest = next(iter(self._records.values()))
+            if oldest.last_active >= cutoff and len(self._records) <= self.max_entries:
+                break
+            self._records.popitem(last=False)
+
+    def _touch(self, session_id: str) -> Optional[_SessionRecord]:
+        self._evict()
+        record = self._records.get(session_id)
+        if record is not None:
+            record.last_active = time.time()
+            self._records.move_to_end(session_id)
+        return record
+
+    async def create(self, profile: Dict[str, Any]) -> Dict[str, Any]:
+        session_id = new_session_id()
+        self._records[session_id] = _SessionRecord(profile)
+        self._evict()
+        return self._records[session_id].to_dict(session_id)
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        record = self._touch(session_id)
+        return record.to_dict(session_id) if record else None
+
+    async def update(self, session_id: str, profile: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        record = self._touch(session_id)
+        if record is None:
+            return None
+        record.profile.update(profile)
+        return record.to_dict(session_id)
+
+    def increment(self, session_id: str, symptom_checks: int = 0, doctor_searches: int = 0) -> bool:
+        record = self._touch(session_id)
+        if record is None:
+            return False
+        record.symptom_checks += symptom_checks
+        record.doctor_searches += doctor_searches
+        return True
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+class MongoSessionStore:
+    """Sessions stored as ``Patient`` documents, shared by every worker.
+
+    Idle sessions are removed by the TTL index on ``sessionData.lastActiveAt``.
+    Reads go through a small local cache that is refreshed after
+    ``SESSION_CACHE_TTL`` seconds, so polling a session does not hit Mongo.
+    A refresh also moves ``lastActiveAt`` forward once it is more than
+    ``SESSION_TOUCH_INTERVAL`` seconds old, so sessions that are only read
+    do not expire while in use.
+    """
+
+    def __init__(
+        self,
+        cache_size: int = SESSION_CACHE_SIZE,
+        cache_ttl: float = SESSION_CACHE_TTL,
+        touch_interval: float = SESSION_TOUCH_INTERVAL,
+    ):
+        self.cache_ttl = cache_ttl
+        self.touch_interval = touch_interval
+        self.cache = LRUCache(cache_size)
+
+    @staticmethod
+    def _to_session(doc: Dict[str, Any]) -> Dict[str, Any]:
+        data = doc.get("sessionData") or {}
+        return {
+            "sessionId": doc["sessionId"],
+            "profile": {k: doc[k] for k in PROFILE_FIELDS if doc.get(k) is not None},
+            "createdAt": data["createdAt"].isoformat() if data.get("createdAt") else None,
+            "lastActiveAt": data["lastActiveAt"].isoformat() if data.get("lastActiveAt") else None,
+            "totalSymptomChecks": data.get("totalSymptomChecks", 0),
+            "totalDoctorSearches": data.get("totalDoctorSearches", 0),
+            "isActive": data.get("isActive", True),
+        }
+
+    def _cache(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        self.cache.put(session["sessionId"], session, None, 0)
+        return session
+
+    async def create(self, profile: Dict[str, Any]) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        patient = Patient(sessionId=new_session_id(), **profile)
+        patient.sessionData.createdAt = patient.sessionData.lastActiveAt = now
+        await patient.insert()
+        return self._cache(self._to_session(patient.model_dump()))
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        entry = self.cache.get(session_id)
+        if entry is not None and time.monotonic() - entry.checked_at < self.cache_ttl:
+            self.cache.hits += 1
+            return entry.value
+        self.cache.misses += 1
+        doc = await Patient.get_motor_collection().find_one({"sessionId": session_id})
+        if doc is None:
+            self.cache.pop(session_id)
+            return None
+        await self._touch(doc)
+        return self._cache(self._to_session(doc))
+
+    async def _touch(self, doc: Dict[str, Any]):
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.touch_interval)
+        data = doc.setdefault("sessionData", {})
+        if data.get("lastActiveAt") and data["lastActiveAt"] >= cutoff:
+            return
+        # The cutoff in the filter lets only one of several workers refreshing the session write
+        await Patient.get_motor_collection().update_one(
+            {"sessionId": doc["sessionId"], "sessionData.lastActiveAt": {"$not": {"$gte": cutoff}}},
+            {"$set": {"sessionData.lastActiveAt": now}},
+        )
+        data["lastActiveAt"] = now
+
+    async def update(self, session_id: str, profile: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # Validate through the model so nested fields are stored in their document shape
+        changes = Patient(**profile).model_dump(include=set(profile))
+        doc = await Patient.get_motor_collection().find_one_and_update(
+            {"sessionId": session_id},
+            {"$set": {**changes, "sessionData.lastActiveAt": datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            self.cache.pop(session_id)
+            return None
+        return self._cache(self._to_session(doc))
+
+memory_sessions = MemorySessionStore()
+mongo_sessions = MongoSessionStore()
+register_cache("sessions", lambda: (mongo_sessions.cache.hits, mongo_sessions.cache.misses))
+
+def get_session_store():
+    """Return the configured store, or None when it is the database and that is not connected."""
+    if SESSION_STORE == "memory":
+        return memory_sessions
+    return mongo_sessions if db_manager.ready else None
@@ -0,0 +1,193 @@
+from typing import Dict, List, Optional, Pattern, Tuple
+import re
+
+# Canonical specialty -> accepted values of the OSM "healthcare:speciality" tag.
+# An empty list means the specialty is served by any doctor, so no tag filter applies.
+SPECIALTY_OSM_VALUES: Dict[str, List[str]] = {
+    "general-practitioner": [],
+    "emergency": [],
+    "cardiology": ["cardiology", "cardiac_surgery"],
+    "dermatology": ["dermatology", "dermatovenereology"],
+    "paediatrics": ["paediatrics", "pediatrics", "neonatology"],
+    "gynaecology": ["gynaecology", "obstetrics", "obstetrics_gynaecology"],
+    "ophthalmology": ["ophthalmology", "optometry"],
+    "otolaryngology": ["otolaryngology", "ent"],
+    "orthopaedics": ["orthopaedics", "orthopedics", "trauma"],
+    "psychiatry": ["psychiatry", "psychology", "child_psychiatry"],
+    "neurology": ["neurology", "neurosurgery"],
+    "gastroenterology": ["gastroenterology", "hepatology"],
+    "pulmonology": ["pulmonology", "respiratory"],
+    "endocrinology": ["endocrinology", "diabetology"],
+    "urology": ["urology"],
+    "nephrology": ["nephrology"],
+    "oncology": ["oncology", "radiotherapy"],
+    "dentistry": ["dentistry", "orthodontics", "oral_surgery"],
+    "rheumatology": ["rheumatology"],
+    "infectious-diseases": ["infectious_diseases", "tropical_medicine"],
+}
+
+# Free-text specialty names (including Gemini's specialistRecommendation output) -> canonical specialty
+SPECIALTY_ALIASES: Dict[str, str] = {
+    "general": "general-practitioner",
+    "general practice": "general-practitioner",
+    "general practitioner": "general-practitioner",
+    "family medicine": "general-practitioner",
+    "family physician": "general-practitioner",
+    "internal medicine": "general-practitioner",
+    "primary care": "general-practitioner",
+    "emergency medicine": "emergency",
+    "emergency room": "emergency",
+    "cardiologist": "cardiology",
+    "dermatologist": "dermatology",
+    "pediatrics": "paediatrics",
+    "pediatrician": "paediatrics",
+    "paediatrician": "paediatrics",
+    "gynecology": "gynaecology",
+    "gynecologist": "gynaecology",
+    "gynaecologist": "gynaecology",
+    "obstetrics": "gynaecology",
+    "ophthalmologist": "ophthalmology",
+    "eye specialist": "ophthalmology",
+    "ent": "otolaryngology",
+    "ent specialist": "otolaryngology",
+    "otolaryngologist": "otolaryngology",
+    "orthopedics": "orthopaedics",
+    "orthopedic": "orthopaedics",
+    "orthopaedic": "orthopaedics",
+    "orthopedist": "orthopaedics",
+    "psychiatrist": "psychiatry",
+    "psychology": "psychiatry",
+    "mental health": "psychiatry",
+    "neurologist": "neurology",
+    "gastroenterologist": "gastroenterology",
+    "pulmonologist": "pulmonology",
+    "respiratory medicine": "pulmonology",
+    "endocrinologist": "endocrinology",
+    "urologist": "urology",
+    "nephrologist": "nephrology",
+    "oncologist": "oncology",
+    "dentist": "dentistry",
+    "dental": "dentistry",
+    "rheumatologist": "rheumatology",
+    "infectious disease": "infectious-diseases",
+}
+
+# Condition keywords -> canonical specialty. Matched as whole words (a plural "s"/"es" is allowed);
+# the first keyword that matches wins, so phrases that contain a broader keyword come first.
+CONDITION_SPECIALTIES: Dict[str, str] = {
+    "heartburn": "gastroenterology",
+    "heat stroke": "emergency",
+    "heatstroke": "emergency",
+    "sunstroke": "emergency",
+    "heart": "cardiology",
+    "cardiac": "cardiology",
+    "hypertension": "cardiology",
+    "arrhythmia": "cardiology",
+    "chest pain": "cardiology",
+    "rash": "dermatology",
+    "eczema": "dermatology",
+    "psoriasis": "dermatology",
+    "acne": "dermatology",
+    "skin": "dermatology",
+    "migraine": "neurology",
+    "seizure": "neurology",
+    "epilepsy": "neurology",
+    "stroke": "neurology",
+    "vertigo": "otolaryngology",
+    "sinus": "otolaryngology",
+    "ear infection": "otolaryngology",
+    "earache": "otolaryngology",
+    "otitis": "otolaryngology",
+    "tonsil": "otolaryngology",
+    "tonsillitis": "otolaryngology",
+    "sinusitis": "otolaryngology",
+    "asthma": "pulmonology",
+    "bronchitis": "pulmonology",
+    "pneumonia": "pulmonology",
+    "respiratory": "pulmonology",
+    "copd": "pulmonology",
+    "gastric": "gastroenterology",
+    "gastroenteritis": "gastroenterology",
+    "gastritis": "gastroenterology",
+    "reflux": "gastroenterology",
+    "ulcer": "gastroenterology",
+    "liver": "gastroenterology",
+    "diabetes": "endocrinology",
+    "thyroid": "endocrinology",
+    "kidney": "nephrology",
+    "urinary": "urology",
+    "prostate": "urology",
+    "arthritis": "rheumatology",
+    "fracture": "orthopaedics",
+    "sprain": "orthopaedics",
+    "back pain": "orthopaedics",
+    "musculoskeletal": "orthopaedics",
+    "depression": "psychiatry",
+    "anxiety": "psychiatry",
+    "conjunctivitis": "ophthalmology",
+    "eye": "ophthalmology",
+    "tooth": "dentistry",
+    "dental": "dentistry",
+    "pregnancy": "gynaecology",
+    "pregnant": "gynaecology",
+    "menstrual": "gynaecology",
+    "menstruation": "gynaecology",
+    "period pain": "gynaecology",
+    "malaria": "infectious-diseases",
+    "dengue": "infectious-diseases",
+    "tuberculosis": "infectious-diseases",
+    "cancer": "oncology",
+    "tumor": "oncology",
+    "tumour": "oncology",
+}
+
+def _build_specialty_lookup() -> Dict[str, str]:
+    lookup = {name: name for name in SPECIALTY_OSM_VALUES}
+    lookup.update({name.replace("-", " "): name for name in SPECIALTY_OSM_VALUES})
+    lookup.update(SPECIALTY_ALIASES)
+    return lookup
+
+def _build_tag_patterns() -> Dict[str, Optional[str]]:
+    patterns: Dict[str, Optional[str]] = {}
+    for name, values in SPECIALTY_OSM_VALUES.items():
+        # healthcare:speciality may hold a semicolon-separated list of values
+        patterns[name] = f"(^|;) *({'|'.join(values)}) *(;|$)" if values else None
+    return patterns
+
+def _build_condition_patterns() -> List[Tuple[Pattern[str], str]]:
+    return [
+        (re.compile(rf"\b{re.escape(keyword)}(?:e?s)?\b"), specialty)
+        for keyword, specialty in CONDITION_SPECIALTIES.items()
+    ]
+
+# Precomputed once at import so request handling is a pair of dict lookups
+_SPECIALTY_LOOKUP = _build_specialty_lookup()
+_TAG_PATTERNS = _build_tag_patterns()
+_CONDITION_PATTERNS = _build_condition_patterns()
+
+def normalize_specialty(specialty: Optional[str]) -> Optional[str]:
+    """Map a free-text specialty name to its canonical form, or None if unknown."""
+    if not specialty:
+        return None
+    key = specialty.strip().lower().replace("_", " ")
+    return _SPECIALTY_LOOKUP.get(key) or _SPECIALTY_LOOKUP.get(key.replace(" ", "-"))
+
+def specialty_for_condition(condition: Optional[str]) -> Optional[str]:
+    """Pick the specialty that treats a condition, based on whole-word keyword matches."""
+    if not condition:
+        return None
+    text = condition.lower()
+    for pattern, specialty in _CONDITION_PATTERNS:
+        if pattern.search(text):
+            return specialty
+    return None
+
+def resolve_specialty(specialty: Optional[str] = None, condition: Optional[str] = None) -> Optional[str]:
+    """An explicit specialty wins; otherwise derive one from the condition."""
+    return normalize_specialty(specialty) or specialty_for_condition(condition)
+
+def osm_speciality_pattern(specialty: Optional[str]) -> Optional[str]:
+    """Overpass regex for the healthcare:speciality tag, or None when no filter applies."""
+    if not specialty:
+        return None
+    return _TAG_PATTERNS.get(specialty)
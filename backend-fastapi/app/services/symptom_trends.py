@@ -0,0 +1,181 @@
+from collections import Counter
+from datetime import date, datetime, time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import re
+from pymongo import UpdateOne
+from ..database import db_manager
+from ..models.symptom_trend import SymptomTrendCell
+from . import geohash
+
+# Precision 5 cells are about 5 x 5 km: fine enough for a heatmap, too coarse to locate a patient
+TREND_GEOHASH_PRECISION = int(os.getenv("TREND_GEOHASH_PRECISION", "5"))
+FLUSH_INTERVAL = float(os.getenv("TREND_FLUSH_INTERVAL", "10"))
+MAX_PENDING_CELLS = int(os.getenv("TREND_MAX_PENDING", "50000"))
+# Symptom names are free text and become trend keys (and usage rollup field names), so their shape is bounded
+OTHER_SYMPTOM = "other"
+_SYMPTOM_KEY = re.compile(r"^[a-z][a-z '-]{0,39}$")
+
+# Common free-text variants -> canonical symptom name used as the trend key
+SYMPTOM_ALIASES: Dict[str, str] = {
+    "high temperature": "fever",
+    "temperature": "fever",
+    "pyrexia": "fever",
+    "feverish": "fever",
+    "coughing": "cough",
+    "dry cough": "cough",
+    "wet cough": "cough",
+    "head ache": "headache",
+    "migraine": "headache",
+    "breathlessness": "shortness of breath",
+    "difficulty breathing": "shortness of breath",
+    "short of breath": "shortness of breath",
+    "diarrhoea": "diarrhea",
+    "loose motions": "diarrhea",
+    "throwing up": "vomiting",
+    "vomit": "vomiting",
+    "nauseous": "nausea",
+    "tiredness": "fatigue",
+    "tired": "fatigue",
+    "exhaustion": "fatigue",
+    "runny nose": "cold",
+    "blocked nose": "cold",
+    "throat pain": "sore throat",
+    "body ache": "body pain",
+    "body aches": "body pain",
+    "muscle pain": "body pain",
+    "rashes": "rash",
+    "skin rash": "rash",
+}
+
+def canonical_symptom(name: str) -> str:
+    key = " ".join(name.strip().lower().replace(".", " ").replace("$", " ").split())
+    return SYMPTOM_ALIASES.get(key, key)[:64]
+
+def symptom_key(name: str) -> str:
+    """Canonical symptom name, or "other" for text that does not look like one."""
+    key = canonical_symptom(name)
+    return key if _SYMPTOM_KEY.match(key) and len(key.split()) <= 4 else OTHER_SYMPTOM
+
+def coordinates_from(location: Optional[Dict[str, Any]]) -> Optional[Tuple[float, float]]:
+    """Read (lat, lon) from a session location, which may nest them under ``coordinates``."""
+    if not isinstance(location, dict):
+        return None
+    coords = location.get("coordinates") if isinstance(location.get("coordinates"), dict) else location
+    lat = coords.get("latitude", coords.get("lat"))
+    lon = coords.get("longitude", coords.get("lng", coords.get("lon")))
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+def utc_day(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.utcnow()).replace(hour=0, minute=0, second=0, microsecond=0)
+
+class SymptomTrendAggregator:
+    """Count analyses per geohash cell, day and canonical symptom.
+
+    Counts accumulate in memory and are flushed periodically as one unordered
+    ``bulk_write`` of ``$inc`` upserts into ``symptom_trends``.
+    """
+
+    def __init__(self, interval: float = FLUSH_INTERVAL, precision: int = TREND_GEOHASH_PRECISION):
+        self.interval = interval
+        self.precision = precision
+        self._pending: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    def tag(self, latitude: float, longitude: float) -> str:
+        return geohash.encode(latitude, longitude, self.precision)
+
+    def record(self, cell: str, symptoms: Iterable[str], now: Optional[datetime] = None):
+        day = utc_day(now)
+        for symptom in {symptom_key(s) for s in symptoms if s and s.strip()}:
+            key = (cell, day, symptom)
+            if key not in self._pending and len(self._pending) >= MAX_PENDING_CELLS:
+                self.dropped += 1
+                continue
+            self._pending[key] += 1
+
+    async def flush(self) -> int:
+        if not self._pending or not db_manager.ready:
+            return 0
+        batch, self._pending = self._pending, Counter()
+        ops = []
+        for (cell, day, symptom), count in batch.items():
+            latitude, longitude = geohash.center(cell)
+            ops.append(UpdateOne(
+                {"cell": cell, "day": day, "symptom": symptom},
+                {"$inc": {"total": count}, "$setOnInsert": {"latitude": latitude, "longitude": longitude}},
+                upsert=True,
+            ))
+        try:
+            await SymptomTrendCell.get_motor_collection().bulk_write(ops, ordered=False)
+        except Exception as e:
+            self._pending.update(batch)
+            logging.warning(f"Symptom trend flush failed, will retry: {e}")
+            return 0
+        return len(ops)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+symptom_trends = SymptomTrendAggregator()
+
+async def query_heatmap(
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+    start: date,
+    end: date,
+    symptom: Optional[str] = None,
+    precision: int = TREND_GEOHASH_PRECISION,
+) -> List[Dict[str, Any]]:
+    """Sum the stored cells inside a bounding box and day range, optionally coarsened."""
+    match: Dict[str, Any] = {
+        "day": {"$gte": datetime.combine(start, time()), "$lte": datetime.combine(end, time())},
+        "latitude": {"$gte": south, "$lte": north},
+        "longitude": {"$gte": west, "$lte": east},
+    }
+    if symptom:
+        match["symptom"] = symptom_key(symptom)
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"cell": {"$substrCP": ["$cell", 0, precision]}, "symptom": "$symptom"},
+            "count": {"$sum": "$total"},
+        }},
+    ]
+    cells: Dict[str, Dict[str, Any]] = {}
+    async for row in SymptomTrendCell.get_motor_collection().aggregate(pipeline):
+        cell = row["_id"]["cell"]
+        entry = cells.get(cell)
+        if entry is None:
+            latitude, longitude = geohash.center(cell)
+            entry = cells[cell] = {"geohash": cell, "latitude": latitude, "longitude": longitude, "count": 0, "symptoms": {}}
+        entry["count"] += row["count"]
+        entry["symptoms"][row["_id"]["symptom"]] = row["count"]
+    return sorted(cells.values(), key=lambda c: c["count"], reverse=True)
@@ -0,0 +1,236 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import logging
+import os
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from ..database import db_manager
+from ..models.patient import Patient
+from ..models.usage_rollup import UsageRollup
+from .session_store import memory_sessions, get_session_store
+from .symptom_trends import OTHER_SYMPTOM, symptom_key
+
+FLUSH_INTERVAL = float(os.getenv("USAGE_ROLLUP_FLUSH_INTERVAL", "5"))
+# Bound on buffered (scope, hour) buckets while MongoDB is unreachable
+MAX_PENDING_BUCKETS = int(os.getenv("USAGE_ROLLUP_MAX_PENDING", "20000"))
+# Symptom names are free text and become field names, so both their shape and their number are bounded
+MAX_SYMPTOMS_PER_RECORD = int(os.getenv("USAGE_MAX_SYMPTOMS_PER_RECORD", "10"))
+MAX_SYMPTOM_KEYS = int(os.getenv("USAGE_MAX_SYMPTOM_KEYS", "200"))
+GLOBAL_SCOPE = "global"
+
+def session_scope(session_id: str) -> str:
+    return f"session:{session_id}"
+
+def hour_bucket(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+
+def _field_key(value: str) -> str:
+    # Counter names become document keys, which cannot contain dots or start with $
+    return value.strip().lower().replace(".", "_").replace("$", "_")[:64] or "unknown"
+
+class UsageRollupAggregator:
+    """Maintain hourly usage rollups with batched ``$inc`` upserts.
+
+    Every analyze and nearby call adds to in-memory counters keyed by scope
+    and hour; a periodic flush turns them into one unordered ``bulk_write``
+    against ``usage_rollups`` and the session counters on ``patients``.
+    Analytics then read a handful of precomputed buckets instead of raw data.
+    """
+
+    def __init__(self, interval: float = FLUSH_INTERVAL):
+        self.interval = interval
+        self._buckets: Dict[Tuple[str, datetime], Counter] = {}
+        self._sessions: Dict[str, Counter] = {}
+        # Symptom keys this worker has written to each (scope, hour), to cap them per document
+        self._symptom_keys: Dict[Tuple[str, datetime], set] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    def _add(self, scope: str, increments: Dict[str, int], symptoms: Iterable[str] = (), now: Optional[datetime] = None):
+        key = (scope, hour_bucket(now))
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= MAX_PENDING_BUCKETS:
+                self.dropped += 1
+                return
+            bucket = self._buckets[key] = Counter()
+        bucket.update(increments)
+        if symptoms:
+            seen = self._symptom_keys.setdefault(key, set())
+            for symptom in symptoms:
+                if symptom not in seen and len(seen) >= MAX_SYMPTOM_KEYS:
+                    symptom = OTHER_SYMPTOM
+                seen.add(symptom)
+                bucket[f"symptoms.{symptom}"] += 1
+
+    def _count_session(self, session_id: Optional[str], field: str):
+        if not session_id:
+            return
+        if get_session_store() is memory_sessions:
+            # In-memory sessions are updated in place; only Mongo sessions need a write
+            memory_sessions.increment(session_id, **{field: 1})
+            return
+        self._sessions.setdefault(session_id, Counter())[field] += 1
+
+    def record_analysis(self, session_id: Optional[str], symptoms: Iterable[str], risk_level: Optional[str]):
+        increments = Counter({"symptomChecks": 1, f"riskLevels.{_field_key(risk_level or 'unknown')}": 1})
+        keys = list(dict.fromkeys(symptom_key(name) for name in symptoms))[:MAX_SYMPTOMS_PER_RECORD]
+        self._add(GLOBAL_SCOPE, increments, keys)
+        if session_id:
+            self._add(session_scope(session_id), increments, keys)
+        self._count_session(session_id, "symptom_checks")
+
+    def record_doctor_search(self, session_id: Optional[str], specialty: Optional[str]):
+        increments = Counter({"doctorSearches": 1})
+        if specialty:
+            increments[f"specialties.{_field_key(specialty)}"] = 1
+        self._add(GLOBAL_SCOPE, increments)
+        if session_id:
+            self._add(session_scope(session_id), increments)
+        self._count_session(session_id, "doctor_searches")
+
+    async def _existing_sessions(self, session_ids: Iterable[str]) -> set:
+        session_ids = list(session_ids)
+        if not session_ids:
+            return set()
+        if get_session_store() is memory_sessions:
+            return {s for s in session_ids if await memory_sessions.get(s) is not None}
+        docs = await Patient.get_motor_collection().find(
+            {"sessionId": {"$in": session_ids}}, {"sessionId": 1}
+        ).to_list(length=None)
+        return {doc["sessionId"] for doc in docs}
+
+    def _requeue_bucket(self, key: Tuple[str, datetime], counts: Counter):
+        self._buckets.setdefault(key, Counter()).update(counts)
+
+    def _requeue_session(self, session_id: str, counts: Counter):
+        self._sessions.setdefault(session_id, Counter()).update(counts)
+
+    @staticmethod
+    async def _bulk_write(collection, items: List[Tuple[Any, Counter]], ops: List[UpdateOne], requeue) -> int:
+        """Run one unordered bulk write and re-queue only the increments that were not applied.
+
+        ``$inc`` is not idempotent, so ops that did apply must never be sent
+        again: a ``BulkWriteError`` lists exactly the ops that failed.
+        """
+        try:
+            await collection.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            for index in failed:
+                requeue(*items[index])
+            logging.warning(f"{len(failed)} of {len(ops)} usage updates on {collection.name} failed, will retry")
+            return len(ops) - len(failed)
+        except Exception as e:
+            for item in items:
+                requeue(*item)
+            logging.warning(f"Usage updates on {collection.name} failed, will retry: {e}")
+            return 0
+        return len(ops)
+
+    async def flush(self) -> int:
+        if not (self._buckets or self._sessions) or not db_manager.ready:
+            return 0
+        buckets, self._buckets = self._buckets, {}
+        sessions, self._sessions = self._sessions, {}
+        now = datetime.utcnow()
+        current_hour = hour_bucket(now)
+        self._symptom_keys = {k: v for k, v in self._symptom_keys.items() if k[1] >= current_hour}
+        # sessionId is client-supplied; only sessions that exist get rollups and counters
+        prefix = session_scope("")
+        try:
+            existing = await self._existing_sessions(
+                {scope[len(prefix):] for scope, _ in buckets if scope.startswith(prefix)} | set(sessions)
+            )
+        except Exception as e:
+            # Nothing was written yet, so everything goes out with the next flush
+            for key, counts in buckets.items():
+                self._requeue_bucket(key, counts)
+            for session_id, counts in sessions.items():
+                self._requeue_session(session_id, counts)
+            logging.warning(f"Usage rollup flush failed, will retry: {e}")
+            return 0
+        bucket_items = [
+            ((scope, start), counts) for (scope, start), counts in buckets.items()
+            if not scope.startswith(prefix) or scope[len(prefix):] in existing
+        ]
+        session_items = [(session_id, counts) for session_id, counts in sessions.items() if session_id in existing]
+
+        # Separate writes, so a failure of one never re-sends the other's increments
+        written = 0
+        if bucket_items:
+            written += await self._bulk_write(UsageRollup.get_motor_collection(), bucket_items, [
+                UpdateOne({"scope": scope, "bucketStart": start}, {"$inc": dict(counts)}, upsert=True)
+                for (scope, start), counts in bucket_items
+            ], self._requeue_bucket)
+        if session_items:
+            written += await self._bulk_write(Patient.get_motor_collection(), session_items, [
+                UpdateOne(
+                    {"sessionId": session_id},
+                    {
+                        "$inc": {
+                            "sessionData.totalSymptomChecks": counts["symptom_checks"],
+                            "sessionData.totalDoctorSearches": counts["doctor_searches"],
+                        },
+                        "$set": {"sessionData.lastActiveAt": now},
+                    },
+                )
+                for session_id, counts in session_items
+            ], self._requeue_session)
+        return written
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+usage_rollups = UsageRollupAggregator()
+
+async def read_rollups(scope: str, hours: int, top: int = 10) -> Dict[str, Any]:
+    """Summarize the last ``hours`` hourly buckets of one scope."""
+    since = hour_bucket() - timedelta(hours=hours - 1)
+    buckets: List[Dict[str, Any]] = []
+    if db_manager.ready:
+        buckets = await UsageRollup.get_motor_collection().find(
+            {"scope": scope, "bucketStart": {"$gte": since}}
+        ).sort("bucketStart", 1).to_list(length=hours)
+
+    risk_levels: Counter = Counter()
+    symptoms: Counter = Counter()
+    specialties: Counter = Counter()
+    for bucket in buckets:
+        risk_levels.update(bucket.get("riskLevels") or {})
+        symptoms.update(bucket.get("symptoms") or {})
+        specialties.update(bucket.get("specialties") or {})
+    return {
+        "since": since.isoformat(),
+        "symptomChecks": sum(b.get("symptomChecks", 0) for b in buckets),
+        "doctorSearches": sum(b.get("doctorSearches", 0) for b in buckets),
+        "riskLevels": dict(risk_levels),
+        "topSymptoms": [{"name": k, "count": v} for k, v in symptoms.most_common(top)],
+        "topSpecialties": [{"name": k, "count": v} for k, v in specialties.most_common(top)],
+        "hourly": [
+            {
+                "bucketStart": b["bucketStart"].isoformat(),
+                "symptomChecks": b.get("symptomChecks", 0),
+                "doctorSearches": b.get("doctorSearches", 0),
+            }
+            for b in buckets
+        ],
+    }
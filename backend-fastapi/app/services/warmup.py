@@ -0,0 +1,44 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+from .. import import_profile
+from . import gemini_ai
+
+async def _timed(name: str, load):
+    started = time.perf_counter()
+    try:
+        await load()
+    except Exception as e:
+        logging.warning(f"Warm-up of {name} failed: {e}")
+        return
+    import_profile.record_warm_up(name, time.perf_counter() - started)
+
+class WarmUp:
+    """Load the slow optional SDKs once the server is already answering requests."""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        # Let the server finish binding and answer the first probes before taking the GIL for imports
+        await asyncio.sleep(0)
+        if gemini_ai.gemini_configured():
+            await _timed("google.generativeai", gemini_ai.import_genai)
+        import_profile.mark("warm_up_complete")
+        import_profile.uninstall()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+warm_up = WarmUp()
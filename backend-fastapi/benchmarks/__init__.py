@@ -0,0 +1 @@
+"""Load and latency benchmarks against local upstream stand-ins; see ``__main__`` for usage."""
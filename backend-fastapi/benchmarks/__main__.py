@@ -0,0 +1,176 @@
+"""Benchmark the API against local upstream stubs and save the results as JSON.
+
+Run from ``backend-fastapi``::
+
+    python -m benchmarks --workers 2 --concurrency 1,8,32 --duration 20
+    python -m benchmarks --compare benchmarks/results/<earlier>.json --fail-on-regression 0.15
+    python -m benchmarks --base-url http://127.0.0.1:8000   # drive an already running server
+
+Unless ``--base-url`` is given, the stubs and the API (``app.server``) are
+started as subprocesses wired to each other through the upstream URL
+environment variables, and stopped afterwards. Results are written to
+``benchmarks/results/<commit>-<timestamp>.json`` together with the commit,
+machine and stub configuration they were measured with; server and stub
+logs go to the ``.log`` file beside it.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import httpx
+from .driver import SCENARIOS, compare, run_suite
+from .stubs import load_profiles, upstream_env
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _wait_until_up(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+def _start(args: List[str], env: Dict[str, str], log) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=BACKEND_DIR, env={**os.environ, **env},
+                            stdout=log, stderr=subprocess.STDOUT)
+
+def _stop(process: Optional[subprocess.Popen]):
+    if process and process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=40)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def _print_result(result: Dict[str, Any]):
+    lat = result["latencyMs"]
+    print(
+        f"{result['scenario']:<12} c={result['concurrency']:<4} {result['throughputRps'] or 0:>8.1f} req/s  "
+        f"p50 {lat['p50'] or 0:>8.1f}  p95 {lat['p95'] or 0:>8.1f}  p99 {lat['p99'] or 0:>8.1f} ms  "
+        f"errors {result['errors']}/{result['requests']}",
+        flush=True,
+    )
+
+def _print_comparison(rows: List[Dict[str, Any]]):
+    pct = lambda v: f"{v * 100:+.1f}%" if v is not None else "n/a"
+    for row in rows:
+        flag = "  REGRESSION: " + ", ".join(row["regressions"]) if row["regressions"] else ""
+        print(
+            f"{row['scenario']:<12} c={row['concurrency']:<4} throughput {pct(row['throughput']):>8}  "
+            f"p50 {pct(row['p50']):>8}  p95 {pct(row['p95']):>8}  p99 {pct(row['p99']):>8}{flag}"
+        )
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load and latency benchmarks with local upstream stubs")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"Comma separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="Comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20.0, help="Measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Unmeasured seconds before each level")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="API worker processes")
+    parser.add_argument("--api-port", type=int, default=8765)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--stub-config", help="JSON overrides for the stub latency/error profiles")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplier for all stub latencies")
+    parser.add_argument("--no-gemini", action="store_true", help="Run without a Gemini key so analyze uses UMLS/MeSH/OpenFDA")
+    parser.add_argument("--base-url", help="Benchmark an already running API instead of starting one")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/<commit>-<timestamp>.json)")
+    parser.add_argument("--compare", help="Earlier result file to compare against")
+    parser.add_argument("--fail-on-regression", type=float, default=None, metavar="FRACTION",
+                        help="Exit with status 1 if any percentile or throughput worsens by more than this (e.g. 0.15)")
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    commit = _git("rev-parse", "--short", "HEAD")
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{commit or 'unknown'}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    # Server and stub output goes next to the results instead of interleaving with the table
+    log = open(os.path.splitext(output)[0] + ".log", "w")
+    stubs = api = None
+    base_url = args.base_url
+    try:
+        if not base_url:
+            stub_url = f"http://127.0.0.1:{args.stub_port}"
+            stub_args = ["-m", "benchmarks.stubs", "--port", str(args.stub_port), "--seed", str(args.seed),
+                         "--latency-scale", str(args.latency_scale)]
+            if args.stub_config:
+                stub_args += ["--config", args.stub_config]
+            stubs = _start(stub_args, {}, log)
+            _wait_until_up(f"{stub_url}/health")
+
+            env = {
+                **upstream_env(stub_url),
+                "GEMINI_API_KEY": "" if args.no_gemini else "benchmark-key",
+                "MOCK_NEARBY": "false",
+                # The driver is one client hammering the API on purpose
+                "RATE_LIMIT_ENABLED": "false",
+                "WEB_CONCURRENCY": str(args.workers),
+            }
+            api = _start(["-m", "app.server", "--host", "127.0.0.1", "--port", str(args.api_port),
+                          "--workers", str(args.workers)], env, log)
+            base_url = f"http://127.0.0.1:{args.api_port}"
+            _wait_until_up(f"{base_url}/api/health-check/live", timeout=60)
+
+        results = asyncio.run(run_suite(base_url, scenarios, levels, args.duration, args.warmup, args.seed, progress=_print_result))
+    finally:
+        _stop(api)
+        _stop(stubs)
+        log.close()
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "baseUrl": base_url if args.base_url else None,
+            "workers": None if args.base_url else args.workers,
+            "durationSeconds": args.duration,
+            "warmupSeconds": args.warmup,
+            "seed": args.seed,
+            "gemini": not args.no_gemini,
+            "stubProfiles": None if args.base_url else load_profiles(args.stub_config),
+            "latencyScale": args.latency_scale,
+        },
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            rows = compare(json.load(f), report, args.fail_on_regression or 0.1)
+        _print_comparison(rows)
+        if args.fail_on_regression is not None and any(row["regressions"] for row in rows):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""Closed-loop load driver: throughput and latency percentiles per endpoint and concurrency.
+
+Each level runs ``concurrency`` workers that send requests back to back for
+``duration`` seconds after a short warm-up whose samples are discarded.
+Payloads are drawn from a seeded generator, so two runs with the same seed
+send the same request mix.
+"""
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import math
+import random
+import time
+import httpx
+
+SYMPTOM_SETS = [
+    [("headache", "moderate"), ("fever", "mild")],
+    [("cough", "mild"), ("sore throat", "mild"), ("fatigue", "moderate")],
+    [("chest pain", "severe")],
+    [("nausea", "moderate"), ("dizziness", "mild")],
+    [("shortness of breath", "moderate"), ("cough", "moderate")],
+    [("back pain", "mild")],
+]
+# Search centres spread over a few cities so results differ between requests
+CITIES = [(17.385, 78.4867), (12.9716, 77.5946), (19.076, 72.8777), (28.6139, 77.209), (13.0827, 80.2707)]
+SPECIALTIES = [None, "cardiology", "dermatology", "pediatrics", "orthopedics"]
+
+def analyze_request(rng: random.Random) -> Dict[str, Any]:
+    symptoms = rng.choice(SYMPTOM_SETS)
+    lat, lon = rng.choice(CITIES)
+    return {
+        "symptoms": [{"name": name, "severity": severity} for name, severity in symptoms],
+        "patientInfo": {"age": rng.randint(5, 85), "gender": rng.choice(["male", "female"])},
+        "latitude": lat + rng.uniform(-0.05, 0.05),
+        "longitude": lon + rng.uniform(-0.05, 0.05),
+    }
+
+def medications_request(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "symptoms": [name for name, _ in rng.choice(SYMPTOM_SETS)],
+        "severity": rng.choice(["mild", "moderate", "severe"]),
+        "age": rng.randint(5, 85),
+        "conditions": rng.choice([[], ["hypertension"], ["diabetes", "asthma"]]),
+    }
+
+def nearby_request(rng: random.Random) -> Dict[str, Any]:
+    lat, lon = rng.choice(CITIES)
+    return {
+        "latitude": lat + rng.uniform(-0.05, 0.05),
+        "longitude": lon + rng.uniform(-0.05, 0.05),
+        "radius_km": rng.choice([2, 5, 10]),
+        "limit": 25,
+        "specialty": rng.choice(SPECIALTIES),
+    }
+
+SCENARIOS: Dict[str, Tuple[str, str, Callable[[random.Random], Dict[str, Any]]]] = {
+    "analyze": ("POST", "/api/symptoms/analyze", analyze_request),
+    "medications": ("POST", "/api/symptoms/medications", medications_request),
+    "nearby": ("POST", "/api/doctors/nearby", nearby_request),
+}
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(
+    scenario: str, concurrency: int, duration: float, elapsed: float, in_window: int,
+    latencies: List[float], statuses: Counter,
+) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    completed = len(latencies)
+    errors = sum(count for status, count in statuses.items() if not str(status).startswith("2"))
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": completed,
+        "errors": errors,
+        "errorRate": round(errors / completed, 4) if completed else None,
+        "statusCounts": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        "durationSeconds": round(duration, 3),
+        "drainSeconds": round(max(0.0, elapsed - duration), 3),
+        "throughputRps": round(in_window / duration, 2) if duration else None,
+        "latencyMs": {
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "mean": ms(sum(latencies) / completed) if completed else None,
+            "max": ms(latencies[-1]) if latencies else None,
+        },
+    }
+
+async def run_level(
+    client: httpx.AsyncClient,
+    scenario: str,
+    concurrency: int,
+    duration: float,
+    warmup: float,
+    rng: random.Random,
+) -> Dict[str, Any]:
+    method, path, build = SCENARIOS[scenario]
+    # Payloads are generated up front so their cost and randomness stay out of the timings
+    payloads = [build(rng) for _ in range(512)]
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    in_window = 0
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def worker(offset: int):
+        nonlocal in_window
+        i = offset
+        while True:
+            sent = time.perf_counter()
+            if sent >= deadline:
+                return
+            try:
+                response = await client.request(method, path, json=payloads[i % len(payloads)])
+                status: Any = response.status_code
+            except httpx.TimeoutException:
+                status = "timeout"
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            finished = time.perf_counter()
+            if sent >= measure_from:
+                latencies.append(finished - sent)
+                statuses[status] += 1
+                if finished <= deadline:
+                    in_window += 1
+            i += concurrency
+
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    # Requests still in flight at the deadline are waited for and count towards the latency
+    # percentiles, but throughput only counts completions inside the window so one hung
+    # upstream call cannot stretch the denominator
+    elapsed = time.perf_counter() - measure_from
+    return summarize(scenario, concurrency, duration, elapsed, in_window, latencies, statuses)
+
+async def run_suite(
+    base_url: str,
+    scenarios: List[str],
+    concurrency_levels: List[int],
+    duration: float,
+    warmup: float,
+    seed: int,
+    timeout: float = 60.0,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> List[Dict[str, Any]]:
+    results = []
+    limits = httpx.Limits(max_connections=max(concurrency_levels), max_keepalive_connections=max(concurrency_levels))
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        for scenario in scenarios:
+            for concurrency in concurrency_levels:
+                rng = random.Random(f"{seed}:{scenario}:{concurrency}")
+                result = await run_level(client, scenario, concurrency, duration, warmup, rng)
+                results.append(result)
+                if progress:
+                    progress(result)
+    return results
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """Relative change per (scenario, concurrency); regressions exceed ``tolerance`` (0.1 = 10 %)."""
+    before = {(r["scenario"], r["concurrency"]): r for r in baseline.get("results", [])}
+    rows = []
+    for result in current.get("results", []):
+        old = before.get((result["scenario"], result["concurrency"]))
+        if not old:
+            continue
+        row: Dict[str, Any] = {"scenario": result["scenario"], "concurrency": result["concurrency"], "regressions": []}
+        for key in ("p50", "p95", "p99"):
+            a, b = old["latencyMs"].get(key), result["latencyMs"].get(key)
+            change = (b - a) / a if a and b is not None else None
+            row[key] = change
+            if change is not None and change > tolerance:
+                row["regressions"].append(key)
+        a, b = old.get("throughputRps"), result.get("throughputRps")
+        change = (b - a) / a if a and b is not None else None
+        row["throughput"] = change
+        if change is not None and change < -tolerance:
+            row["regressions"].append("throughput")
+        rows.append(row)
+    return rows
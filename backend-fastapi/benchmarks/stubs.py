@@ -0,0 +1,231 @@
+"""Local stand-ins for every upstream the API calls, for offline benchmarks.
+
+One process serves all of them under path prefixes (Gemini at the root,
+since the SDK only takes a host)::
+
+    python -m benchmarks.stubs --port 9100 [--config stubs.json] [--seed 1]
+
+Each upstream has a log-normal latency (``median_ms`` and ``sigma``), an
+``error_rate`` answered with ``error_status``, a ``timeout_rate`` of requests
+that hang for ``hang_seconds`` (longer than the API's client timeouts), and
+payload-size knobs sized after real responses. ``--config`` takes a JSON
+object whose per-upstream entries override ``DEFAULT_PROFILES``;
+``--latency-scale 0`` removes all simulated latency to isolate the API's own
+overhead.
+"""
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+from urllib.parse import parse_qs
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+import uvicorn
+
+# Rough orders of magnitude for the public services; tune per environment with --config
+DEFAULT_PROFILES: Dict[str, Dict[str, Any]] = {
+    "gemini": {"median_ms": 2500, "sigma": 0.4, "error_rate": 0.01, "timeout_rate": 0.0},
+    "nominatim": {"median_ms": 250, "sigma": 0.5, "error_rate": 0.01, "timeout_rate": 0.0},
+    "overpass": {"median_ms": 1800, "sigma": 0.7, "error_rate": 0.05, "timeout_rate": 0.01, "element_tags": 12},
+    "openfda": {"median_ms": 400, "sigma": 0.5, "error_rate": 0.02, "timeout_rate": 0.0, "label_bytes": 12000},
+    "umls": {"median_ms": 350, "sigma": 0.4, "error_rate": 0.01, "timeout_rate": 0.0},
+    "mesh": {"median_ms": 200, "sigma": 0.4, "error_rate": 0.01, "timeout_rate": 0.0},
+}
+DEFAULTS = {"error_status": 503, "hang_seconds": 30.0}
+
+_AROUND = re.compile(r"around:(\d+),(-?[\d.]+),(-?[\d.]+)")
+_OUT_LIMIT = re.compile(r"out center (\d+)")
+_FILLER = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt. "
+
+def _text(size: int) -> str:
+    return (_FILLER * (size // len(_FILLER) + 1))[:size]
+
+class StubUpstreams:
+    def __init__(self, profiles: Dict[str, Dict[str, Any]], seed: Optional[int] = None, latency_scale: float = 1.0):
+        self.profiles = {name: {**DEFAULTS, **profile} for name, profile in profiles.items()}
+        self.rng = random.Random(seed)
+        self.latency_scale = latency_scale
+        self.calls: Dict[str, int] = {name: 0 for name in profiles}
+
+    async def delay(self, upstream: str) -> Optional[Response]:
+        """Sleep for one latency sample; return an error response when this call should fail."""
+        profile = self.profiles[upstream]
+        self.calls[upstream] += 1
+        roll = self.rng.random()
+        if roll < profile["timeout_rate"]:
+            await asyncio.sleep(profile["hang_seconds"])
+        latency = profile["median_ms"] * math.exp(profile["sigma"] * self.rng.gauss(0, 1)) / 1000
+        await asyncio.sleep(latency * self.latency_scale)
+        if roll < profile["timeout_rate"] + profile["error_rate"]:
+            return JSONResponse({"error": f"{upstream} stub failure"}, status_code=profile["error_status"])
+        return None
+
+def gemini_payload(rng: random.Random) -> Dict[str, Any]:
+    analysis = {
+        "riskLevel": rng.choice(["low", "medium", "high"]),
+        "confidence": rng.randint(55, 90),
+        "possibleConditions": [
+            {"name": name, "probability": rng.randint(20, 80), "description": _text(160)}
+            for name in ("Viral Infection", "Tension Headache", "Migraine", "Sinusitis")
+        ],
+        "recommendations": [
+            {"type": "self-care", "action": _text(90), "priority": "medium"} for _ in range(5)
+        ],
+        "warningFlags": [_text(80) for _ in range(3)],
+        "medicationSuggestions": [
+            {"name": name, "type": "over-the-counter", "dosage": "As directed"} for name in ("Acetaminophen", "Ibuprofen")
+        ],
+        "specialistRecommendation": {"recommended": True, "specialty": "Family Medicine", "urgency": "routine"},
+    }
+    text = "```json\n" + json.dumps(analysis, indent=2) + "\n```"
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+        "usageMetadata": {"promptTokenCount": 220, "candidatesTokenCount": len(text) // 4, "totalTokenCount": 220 + len(text) // 4},
+    }
+
+def overpass_payload(rng: random.Random, query: str, tag_count: int) -> Dict[str, Any]:
+    around = _AROUND.search(query)
+    radius, lat, lon = (int(around.group(1)), float(around.group(2)), float(around.group(3))) if around else (5000, 17.385, 78.4867)
+    limit_match = _OUT_LIMIT.search(query)
+    limit = int(limit_match.group(1)) if limit_match else 25
+    spread = radius / 111_000
+    elements: List[Dict[str, Any]] = []
+    for i in range(limit):
+        tags = {
+            "name": f"Clinic {rng.randint(1, 99999)}",
+            "amenity": rng.choice(["clinic", "hospital", "doctors"]),
+            "healthcare": "doctor",
+            "healthcare:speciality": rng.choice(["general", "paediatrics", "cardiology", "dermatology", "orthopaedics"]),
+            "phone": f"+91 40 {rng.randint(10000000, 99999999)}",
+            "addr:street": "Main Road",
+            "addr:city": "Hyderabad",
+            "opening_hours": "Mo-Sa 09:00-18:00",
+        }
+        for t in range(max(0, tag_count - len(tags))):
+            tags[f"note:{t}"] = _text(24)
+        element = {"type": "node", "id": 1_000_000 + i, "lat": lat + rng.uniform(-spread, spread),
+                   "lon": lon + rng.uniform(-spread, spread), "tags": tags}
+        if i % 4 == 0:
+            element = {"type": "way", "id": 2_000_000 + i, "center": {"lat": element["lat"], "lon": element["lon"]}, "tags": tags}
+        elements.append(element)
+    return {"version": 0.6, "generator": "Overpass API stub", "osm3s": {"copyright": "stub"}, "elements": elements}
+
+def create_app(stubs: StubUpstreams) -> FastAPI:
+    app = FastAPI(title="Upstream stubs")
+    rng = stubs.rng
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "calls": stubs.calls}
+
+    # Endpoints the API's dependency prober uses
+    @app.get("/v1beta/models/{model}")
+    async def gemini_model(model: str):
+        return {"name": f"models/{model}", "displayName": model, "inputTokenLimit": 1048576, "outputTokenLimit": 65536}
+
+    @app.get("/nominatim/status")
+    async def nominatim_status():
+        return {"status": 0, "message": "OK", "data_updated": "2024-01-01T00:00:00+00:00"}
+
+    @app.get("/overpass/{mirror}/api/status", response_class=Response)
+    async def overpass_status(mirror: str):
+        return Response("Connected as: 1\nRate limit: 2\n2 slots available now.\n", media_type="text/plain")
+
+    @app.post("/v1beta/models/{model}:generateContent")
+    async def gemini(model: str):
+        return await stubs.delay("gemini") or gemini_payload(rng)
+
+    @app.get("/nominatim/search")
+    async def nominatim(q: str = ""):
+        failed = await stubs.delay("nominatim")
+        if failed:
+            return failed
+        lat, lon = 17.385 + rng.uniform(-0.1, 0.1), 78.4867 + rng.uniform(-0.1, 0.1)
+        return [{
+            "place_id": rng.randint(1, 10**8), "licence": "Data © OpenStreetMap contributors, ODbL 1.0",
+            "osm_type": "way", "osm_id": rng.randint(1, 10**9), "lat": f"{lat:.7f}", "lon": f"{lon:.7f}",
+            "class": "place", "type": "suburb", "display_name": f"{q}, Hyderabad, Telangana, 500001, India",
+            "address": {"suburb": q, "city": "Hyderabad", "state": "Telangana", "postcode": "500001", "country": "India", "country_code": "in"},
+            "boundingbox": [f"{lat - 0.01:.7f}", f"{lat + 0.01:.7f}", f"{lon - 0.01:.7f}", f"{lon + 0.01:.7f}"],
+        }]
+
+    @app.post("/overpass/{mirror}/api/interpreter")
+    async def overpass(mirror: str, request: Request):
+        # Parsed by hand so the stubs do not need python-multipart
+        query = parse_qs((await request.body()).decode()).get("data", [""])[0]
+        failed = await stubs.delay("overpass")
+        if failed:
+            return failed
+        return overpass_payload(rng, query, stubs.profiles["overpass"].get("element_tags", 12))
+
+    @app.get("/openfda/drug/label.json")
+    async def openfda(search: str = "", limit: int = 2):
+        failed = await stubs.delay("openfda")
+        if failed:
+            return failed
+        size = stubs.profiles["openfda"].get("label_bytes", 12000)
+        results = [{
+            "id": f"stub-label-{rng.randint(1, 200)}",
+            "openfda": {"brand_name": [f"Brand {rng.randint(1, 999)}"], "generic_name": ["ACETAMINOPHEN"], "product_type": ["HUMAN OTC DRUG"]},
+            "indications_and_usage": [_text(size // 4)],
+            "dosage_and_administration": [_text(size // 4)],
+            "warnings": [_text(size // 2)],
+        } for _ in range(limit)]
+        return {"meta": {"results": {"skip": 0, "limit": limit, "total": 120}}, "results": results}
+
+    @app.get("/umls/rest/search/current")
+    async def umls(string: str = "", pageSize: int = 3):
+        failed = await stubs.delay("umls")
+        if failed:
+            return failed
+        results = [{"ui": f"C{rng.randint(1000000, 9999999)}", "rootSource": "MTH",
+                    "uri": "https://uts-ws.nlm.nih.gov/rest/content/current/CUI/C0018681", "name": f"{string.title()} disorder {i}"}
+                   for i in range(pageSize)]
+        return {"pageSize": pageSize, "pageNumber": 1, "result": {"classType": "searchResults", "results": results}}
+
+    @app.get("/mesh/lookup/term")
+    async def mesh(label: str = "", limit: int = 3):
+        failed = await stubs.delay("mesh")
+        if failed:
+            return failed
+        return [{"resource": f"http://id.nlm.nih.gov/mesh/T{rng.randint(100000, 999999)}",
+                 "concept": f"http://id.nlm.nih.gov/mesh/M{rng.randint(100000, 999999)}", "label": f"{label.title()} {i}"}
+                for i in range(limit)]
+
+    return app
+
+def upstream_env(base_url: str) -> Dict[str, str]:
+    """Environment that points the API at stubs served from ``base_url``."""
+    return {
+        "GEMINI_API_ENDPOINT": base_url,
+        "NOMINATIM_URL": f"{base_url}/nominatim/search",
+        "OVERPASS_URLS": ",".join(f"{base_url}/overpass/mirror{i}/api/interpreter" for i in range(3)),
+        "OPENFDA_LABEL_URL": f"{base_url}/openfda/drug/label.json",
+        "UMLS_SEARCH_URL": f"{base_url}/umls/rest/search/current",
+        "MESH_LOOKUP_URL": f"{base_url}/mesh/lookup/term",
+    }
+
+def load_profiles(path: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    profiles = {name: dict(profile) for name, profile in DEFAULT_PROFILES.items()}
+    if path:
+        with open(path) as f:
+            for name, overrides in json.load(f).items():
+                profiles.setdefault(name, {}).update(overrides)
+    return profiles
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Serve stand-ins for Gemini, Nominatim, Overpass, OpenFDA, UMLS and MeSH")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--config", help="JSON file with per-upstream overrides of DEFAULT_PROFILES")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--latency-scale", type=float, default=1.0)
+    args = parser.parse_args(argv)
+    stubs = StubUpstreams(load_profiles(args.config), seed=args.seed, latency_scale=args.latency_scale)
+    uvicorn.run(create_app(stubs), host=args.host, port=args.port, log_level="warning", backlog=4096)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
 import motor.motor_asyncio
 from core import config
 
-# Create a Motor client
-client = motor.motor_asyncio.AsyncIOMotorClient(config.MONGO_URI)
+_client = None
 
-# Access your specific database by name.
-# Replace "HealthAppDB" with your desired database name.
-# MongoDB will create it automatically if it doesn't exist.
-db = client["HealthAppDB"]
\ No newline at end of file
+def get_db():
+    """Access the application database, creating the Motor client on first use.
+
+    Replace "HealthAppDB" with your desired database name.
+    MongoDB will create it automatically if it doesn't exist.
+    """
+    global _client
+    if _client is None:
+        _client = motor.motor_asyncio.AsyncIOMotorClient(config.MONGO_URI)
+    return _client["HealthAppDB"]
@@ -1,7 +1,7 @@
 import os
 import httpx
 from datetime import datetime
-from core.database import db
+from core.database import get_db
 from models.schemas import SymptomCheckRequest, SymptomCheckResponse, DoctorFinderRequest, DoctorFinderResponse
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -25,7 +25,7 @@ async def analyze_symptoms(request: SymptomCheckRequest) -> SymptomCheckResponse
         "response": data,
         "timestamp": datetime.utcnow(),
     }
-    await db.symptom_checks.insert_one(document)
+    await get_db().symptom_checks.insert_one(document)
 
     return SymptomCheckResponse(**data)
 
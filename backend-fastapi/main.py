@@ -1,5 +1,6 @@
 from app.main import app
 
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Multi-worker production launcher; set WEB_CONCURRENCY=1 for a single process
+    from app.server import main
+    main()
@@ -0,0 +1,87 @@
+"""Shared fixtures for the backend tests.
+
+The backend is imported as the ``app`` package from ``backend-fastapi``.
+Tests that need MongoDB run against mongomock_motor and are skipped when it
+is not installed.
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend-fastapi"))
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+def _lookup(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return None
+        doc = doc[part]
+    return doc
+
+def _teach_mongomock(monkeypatch):
+    """Cover the query features the app relies on that mongomock lacks.
+
+    ``hint`` only picks an index, so it is ignored; projections that rename
+    fields with ``"$path"`` (MongoDB 4.4+) are resolved like the server does;
+    ``$substrCP`` is ``$substr`` on Python's code-point strings.
+    """
+    from mongomock.aggregate import _Parser
+    from mongomock.collection import Collection
+
+    find, copy_only_fields = Collection.find, Collection._copy_only_fields
+
+    def find_with_hint(self, *args, hint=None, **kwargs):
+        return find(self, *args, **kwargs)
+
+    def project(self, doc, fields, container):
+        if not isinstance(fields, dict) or not any(isinstance(v, str) and v.startswith("$") for v in fields.values()):
+            return copy_only_fields(self, doc, fields, container)
+        projected = container()
+        if fields.get("_id", 1) and "_id" in doc:
+            projected["_id"] = doc["_id"]
+        for field, spec in fields.items():
+            if field == "_id":
+                continue
+            value = _lookup(doc, spec[1:] if isinstance(spec, str) else field)
+            if value is not None or isinstance(spec, str):
+                projected[field] = value
+        return projected
+
+    handle_string_operator = _Parser._handle_string_operator
+
+    def string_operator(self, operator, values):
+        return handle_string_operator(self, "$substr" if operator == "$substrCP" else operator, values)
+
+    monkeypatch.setattr(_Parser, "_handle_string_operator", string_operator)
+    monkeypatch.setattr(Collection, "find", find_with_hint)
+    monkeypatch.setattr(Collection, "_copy_only_fields", project)
+
+@pytest.fixture
+async def mongo(anyio_backend, monkeypatch):
+    """Beanie initialised on an in-memory database, with the app's db_manager marked ready."""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    _teach_mongomock(monkeypatch)
+    from beanie import init_beanie
+    from app.database import DOCUMENT_MODELS, db_manager
+    from app.services.doctor_cache import doctor_cache
+
+    client = mongomock_motor.AsyncMongoMockClient()
+    database = client["health-beacon-test"]
+    await init_beanie(database=database, document_models=DOCUMENT_MODELS)
+    db_manager.client, db_manager.database, db_manager.ready = client, database, True
+    doctor_cache.doctors.clear()
+    doctor_cache.queries.clear()
+    yield database
+    db_manager.client, db_manager.database, db_manager.ready = None, None, False
+
+@pytest.fixture
+async def api(mongo):
+    """HTTP client for the app, without running its startup tasks."""
+    import httpx
+    from app.main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        yield client
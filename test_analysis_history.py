@@ -0,0 +1,78 @@
+"""Analysis history storage and retrieval tests (in-memory MongoDB)."""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+FALLBACK_ANALYSIS = {
+    "riskLevel": "medium",
+    "confidence": 75,
+    "possibleConditions": [{"name": "Viral Infection", "probability": 70, "description": "Common viral illness"}],
+    "recommendations": [{"type": "medical-attention", "action": "Rest and drink fluids", "priority": "medium"}],
+    "warningFlags": ["Seek immediate medical attention if symptoms worsen rapidly"],
+    "medicationSuggestions": [{"name": "Acetaminophen", "type": "over-the-counter", "dosage": "500mg"}],
+    "specialistRecommendation": {"recommended": False, "specialty": "Family Medicine", "urgency": "routine"},
+    "model": "External Medical APIs",
+    "source": "UMLS, MeSH, OpenFDA APIs",
+}
+
+async def test_saved_analysis_matches_the_model(mongo):
+    from app.models.symptom_analysis import SymptomAnalysis
+    from app.services.analysis_history import save_analysis
+
+    assert await save_analysis("session-a", [{"name": "fever", "severity": None, "duration": None}], FALLBACK_ANALYSIS)
+    record = await SymptomAnalysis.find_one(SymptomAnalysis.sessionId == "session-a")
+    assert record.analysis.warningFlags[0].flag.startswith("Seek immediate")
+    assert record.analysis.specialistRecommendation.specialty == "Family Medicine"
+    assert record.metadata.aiModel == "External Medical APIs"
+    assert record.analysis.model_dump()["source"] == "UMLS, MeSH, OpenFDA APIs"
+
+    # A payload that cannot be read back as an Analysis is not stored
+    assert not await save_analysis("session-a", [{"name": "cough"}], {"confidence": "very"})
+    assert await SymptomAnalysis.find(SymptomAnalysis.sessionId == "session-a").count() == 1
+
+async def test_history_item_is_not_revalidated_for_another_session(api):
+    from app.models.symptom_analysis import SymptomAnalysis
+    from app.services.analysis_history import save_analysis
+    from app.services.http_cache import make_etag
+
+    await save_analysis("session-a", [{"name": "fever"}], FALLBACK_ANALYSIS)
+    record = await SymptomAnalysis.find_one(SymptomAnalysis.sessionId == "session-a")
+    analysis_id = str(record.id)
+
+    response = await api.get(f"/api/patients/session/session-a/history/{analysis_id}")
+    assert response.status_code == 200
+    revalidated = await api.get(
+        f"/api/patients/session/session-a/history/{analysis_id}", headers={"If-None-Match": response.headers["etag"]}
+    )
+    assert revalidated.status_code == 304
+
+    forged = make_etag("analysis", "session-b", analysis_id)
+    other = await api.get(f"/api/patients/session/session-b/history/{analysis_id}", headers={"If-None-Match": forged})
+    assert other.status_code == 404
+
+async def test_only_the_lease_holder_archives(mongo, monkeypatch):
+    from datetime import datetime, timedelta
+    from app.models.symptom_analysis import SymptomAnalysis
+    from app.services import leases
+    from app.services.analysis_history import ARCHIVE_COLLECTION, archive_old_analyses, save_analysis
+
+    await save_analysis("session-a", [{"name": "fever"}], FALLBACK_ANALYSIS)
+    await SymptomAnalysis.get_motor_collection().update_many({}, {"$set": {"createdAt": datetime.utcnow() - timedelta(days=400)}})
+
+    monkeypatch.setattr(leases, "_owner", lambda: "host:1")
+    assert await leases.acquire_lease("analysis-archiver", 60)
+    monkeypatch.setattr(leases, "_owner", lambda: "host:2")
+    assert await archive_old_analyses(lease_ttl=60) == 0
+    monkeypatch.setattr(leases, "_owner", lambda: "host:1")
+    assert await archive_old_analyses(lease_ttl=60) == 1
+    assert await mongo[ARCHIVE_COLLECTION].count_documents({}) == 1
+
+async def test_retired_history_index_is_dropped(anyio_backend):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from app.database import reconcile_indexes
+    from app.models.symptom_analysis import SymptomAnalysis
+
+    database = mongomock_motor.AsyncMongoMockClient()["health-beacon-legacy"]
+    await database["symptom_analyses"].create_index([("sessionId", 1), ("createdAt", -1)])
+    await reconcile_indexes(database, [SymptomAnalysis])
+    assert "sessionId_1_createdAt_-1" not in await database["symptom_analyses"].index_information()
@@ -0,0 +1,49 @@
+"""Contraindication index tests."""
+from app.services.contraindications import (
+    ContraindicationIndex, IndexEntry, compile_label, condition_names, contraindication_index, patient_mask,
+    screen_medications,
+)
+
+def test_label_sections_compile_to_condition_masks_and_ages():
+    entry = compile_label({
+        "warnings": ["Do not use if you have liver disease. May cause drowsiness in patients with asthma."],
+        "do_not_use": ["in children under 6 years of age"],
+        "ask_doctor": ["Ask a doctor before use if you have high blood pressure or are pregnant."],
+        "dosage_and_administration": ["children under 12 years: ask a doctor; not for use with glaucoma"],
+    })
+    assert condition_names(entry.contraindicated) == ["liver disease"]
+    assert condition_names(entry.caution) == ["high blood pressure", "asthma", "pregnancy"]
+    assert (entry.min_age, entry.caution_age) == (6, 12)
+
+def test_patient_conditions_use_label_vocabulary():
+    assert condition_names(patient_mask(["Hypertension", " Peptic Ulcer ", "", "seasonal allergies"])) == [
+        "high blood pressure", "stomach ulcers"]
+    assert patient_mask(None) == 0
+
+def test_screen_medications_against_seeded_labels():
+    conditions = patient_mask(["asthma"])
+    usable, excluded = screen_medications(
+        [{"name": "Ibuprofen"}, {"name": "Dextromethorphan"}, {"name": "Unknown Remedy"}], conditions, age=3
+    )
+    assert excluded == [{"name": "Dextromethorphan", "reasons": ["Not for children under 4"]}]
+    assert usable[0]["name"] == "Ibuprofen"
+    assert "Label advises asking a doctor before use with asthma" in usable[0]["cautions"]
+    assert "Ask a doctor before giving to children under 12" in usable[0]["cautions"]
+    assert usable[1] == {"name": "Unknown Remedy"}
+    assert contraindication_index.check("acetaminophen", patient_mask(["cirrhosis"]), 40)[1] == [
+        "Label advises asking a doctor before use with liver disease"]
+
+def test_index_merges_labels_once_and_stays_bounded():
+    index = ContraindicationIndex(max_drugs=2)
+    label = {"id": "label-1", "contraindications": ["Known hypersensitivity; severe renal impairment"]}
+    index.add_label(["Drug A", "drug  a"], label)
+    index.add_label(["Drug A"], label)
+    assert index.labels_compiled == 1
+    index.add(["drug a"], IndexEntry(caution=patient_mask(["asthma"]), min_age=12))
+    entry = index.get("DRUG A")
+    assert condition_names(entry.contraindicated) == ["kidney disease"]
+    assert condition_names(entry.caution) == ["asthma"] and entry.min_age == 12
+
+    index.add(["drug b"], IndexEntry())
+    index.add(["drug c"], IndexEntry())
+    assert len(index) == 2 and index.get("drug a") is None
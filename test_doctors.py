@@ -0,0 +1,270 @@
+"""Doctor model and directory endpoint tests (in-memory MongoDB)."""
+from datetime import datetime
+import base64
+import pytest
+from app.models.doctor import AVAILABILITY_TZ, BITMAP_BYTES, Doctor, Schedule, compile_schedule, next_open_slot, week_slot
+from app.services.doctor_cache import CACHE_STALENESS_SECONDS
+
+pytestmark = pytest.mark.anyio
+
+def make_doctor(**overrides) -> Doctor:
+    fields = {
+        "name": "Dr. Test",
+        "specialty": "cardiology",
+        "location": {
+            "hospital": {
+                "name": "Test Hospital",
+                "address": {"city": "Delhi"},
+                "coordinates": {"latitude": 28.6, "longitude": 77.2},
+            }
+        },
+        "availability": {
+            "schedule": [
+                {"day": "monday", "slots": [{"startTime": "09:00", "endTime": "17:00"}]},
+                {"day": "sunday", "slots": [{"startTime": "22:00", "endTime": "02:00"}]},
+            ]
+        },
+        "verification": {"licenseNumber": "DL-TEST-001"},
+    }
+    fields.update(overrides)
+    return Doctor(**fields)
+
+def test_schedule_bitmap():
+    mask = compile_schedule([
+        Schedule(day="monday", slots=[{"startTime": "09:00", "endTime": "17:00"}]),
+        Schedule(day="sunday", slots=[{"startTime": "22:00", "endTime": "02:00"}]),
+    ])
+    monday_9 = datetime(2024, 1, 1, 9, 0, tzinfo=AVAILABILITY_TZ)
+    monday_17 = datetime(2024, 1, 1, 17, 0, tzinfo=AVAILABILITY_TZ)
+    assert mask >> week_slot(monday_9) & 1
+    assert not mask >> week_slot(monday_17) & 1
+    # Sunday's overnight slot wraps into Monday morning
+    assert mask >> week_slot(datetime(2024, 1, 1, 1, 45, tzinfo=AVAILABILITY_TZ)) & 1
+    assert next_open_slot(mask, datetime(2024, 1, 1, 2, 5, tzinfo=AVAILABILITY_TZ)) == monday_9
+
+async def test_scheduled_doctor_round_trips_through_detail_endpoint(api):
+    doctor = make_doctor()
+    await doctor.insert()
+    assert len(doctor.availability.weeklyBitmap) == BITMAP_BYTES
+
+    stored = await Doctor.get(doctor.id)
+    assert bytes(stored.availability.weeklyBitmap) == doctor.availability.weeklyBitmap
+    assert stored.is_available_on("monday") and not stored.is_available_on("tuesday")
+
+    response = await api.get(f"/api/doctors/{doctor.id}")
+    assert response.status_code == 200
+    availability = response.json()["data"]["availability"]
+    assert base64.urlsafe_b64decode(availability["weeklyBitmap"]) == doctor.availability.weeklyBitmap
+
+    revalidated = await api.get(f"/api/doctors/{doctor.id}", headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+
+async def test_open_doctors_are_not_rewritten_while_they_stay_open(mongo):
+    from app.services.availability import refresh_next_slots
+
+    monday_9 = datetime(2100, 1, 4, 9, 0, tzinfo=AVAILABILITY_TZ)
+    doctor = make_doctor()
+    await doctor.insert()
+    # As compiled on the morning of 4 January 2100, before the Monday opening
+    await Doctor.get_motor_collection().update_one(
+        {"_id": doctor.id}, {"$set": {"availability.nextAvailableSlot": monday_9}})
+
+    # The stored slot is the start of the opening already, for every pass until it closes
+    for minute in (9 * 60 + 7, 12 * 60 + 22, 16 * 60 + 59):
+        assert await refresh_next_slots(monday_9.replace(hour=minute // 60, minute=minute % 60)) == 0
+    assert await refresh_next_slots(datetime(2100, 1, 4, 17, 7, tzinfo=AVAILABILITY_TZ)) == 1
+    stored = await Doctor.get(doctor.id)
+    assert stored.availability.nextAvailableSlot.replace(tzinfo=None) == datetime(2100, 1, 10, 16, 30)
+    assert stored.metadata.version == doctor.metadata.version + 1
+
+async def test_refresher_lease_is_held_by_one_worker(mongo, monkeypatch):
+    from app.services import leases
+
+    monkeypatch.setattr(leases, "_owner", lambda: "host:1")
+    assert await leases.acquire_lease("job", 60)
+    assert await leases.acquire_lease("job", 60)
+    monkeypatch.setattr(leases, "_owner", lambda: "host:2")
+    assert not await leases.acquire_lease("job", 60)
+    # An expired lease can be taken over
+    assert await leases.acquire_lease("other-job", -1)
+    monkeypatch.setattr(leases, "_owner", lambda: "host:1")
+    assert await leases.acquire_lease("other-job", 60)
+    await leases.release_lease("job")
+    monkeypatch.setattr(leases, "_owner", lambda: "host:2")
+    assert await leases.acquire_lease("job", 60)
+
+async def test_doctor_cache_version_ignores_counter_updates(api):
+    from app.services.availability import refresh_next_slots
+    from app.services.doctor_cache import doctor_cache
+    from app.services.search_counters import search_counts
+
+    doctor = make_doctor()
+    await doctor.insert()
+    first = await api.get(f"/api/doctors/{doctor.id}")
+    cached = await doctor_cache.get_doctor(str(doctor.id))
+
+    # Search count flushes do not touch the version, so revalidation keeps the cached profile
+    search_counts.record([doctor.id])
+    assert await search_counts.flush() == 1
+    doctor_cache.staleness = 0
+    try:
+        assert await doctor_cache.get_doctor(str(doctor.id)) is cached
+        unchanged = await api.get(f"/api/doctors/{doctor.id}", headers={"If-None-Match": first.headers["etag"]})
+        assert unchanged.status_code == 304
+
+        # Moving the next slot forward is visible content and must invalidate
+        later = datetime(2100, 1, 4, 10, 7, tzinfo=AVAILABILITY_TZ)
+        assert await refresh_next_slots(later) == 1
+        reloaded = await doctor_cache.get_doctor(str(doctor.id))
+        assert reloaded is not cached
+        assert reloaded.metadata.version == cached.metadata.version + 1
+        changed = await api.get(f"/api/doctors/{doctor.id}", headers={"If-None-Match": first.headers["etag"]})
+        assert changed.status_code == 200 and changed.headers["etag"] != first.headers["etag"]
+    finally:
+        doctor_cache.staleness = CACHE_STALENESS_SECONDS
+
+def test_change_stream_skips_counter_only_updates():
+    from app.services.doctor_cache import is_content_change
+
+    counter_only = {"operationType": "update", "updateDescription": {"updatedFields": {"metadata.searchCount": 4}}}
+    slot = {"operationType": "update", "updateDescription": {
+        "updatedFields": {"availability.nextAvailableSlot": None, "metadata.version": 3}}}
+    assert not is_content_change(counter_only)
+    assert is_content_change(slot)
+    assert is_content_change({"operationType": "replace"})
+
+def test_every_search_shape_has_an_index_in_sort_order():
+    from app.routers.doctors import choose_index
+
+    for sort, sort_keys in (("rating", [("ratings.average", -1), ("_id", 1)]), ("recent", [("_id", -1)])):
+        for city in (None, "Delhi"):
+            for specialty in (None, "cardiology"):
+                index = choose_index(specialty, city, None, sort)
+                equality = [field for field, value in (("location.hospital.address.city", city), ("specialty", specialty)) if value]
+                assert [field for field, _ in index[:len(equality)]] == equality
+                assert index in Doctor.Settings.indexes or index == [("_id", 1)]
+                # Equality keys first, then exactly the sort keys (or all of them reversed)
+                rest = index[len(equality):]
+                assert rest == sort_keys or rest == [(f, -d) for f, d in sort_keys]
+
+async def seed_directory():
+    """Nine doctors across two cities, with tied ratings and two legacy records without a rating."""
+    ratings = [4.5, 4.5, 3.0, None, 4.9, 3.0, None, 2.0, 4.5]
+    doctors = []
+    for i, rating in enumerate(ratings):
+        doctor = make_doctor(
+            name=f"Dr. {i}",
+            location={"hospital": {
+                "name": "H",
+                "address": {"city": "Delhi" if i % 3 else "Pune"},
+                "coordinates": {"latitude": 28.6, "longitude": 77.2},
+            }},
+            ratings={"average": rating or 0.0},
+            verification={"licenseNumber": f"DL-SEARCH-{i:03d}"},
+        )
+        await doctor.insert()
+        if rating is None:
+            await Doctor.get_motor_collection().update_one({"_id": doctor.id}, {"$unset": {"ratings.average": ""}})
+        doctors.append((doctor.id, rating, doctor.location.hospital.address.city))
+    return doctors
+
+async def walk_search(api, **params):
+    pages, cursor = [], None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        data = (await api.get("/api/doctors/search", params=query)).json()["data"]
+        pages.append(data["doctors"])
+        cursor = data["nextCursor"]
+        if not cursor:
+            return pages
+
+def rating_order(doctors):
+    # Highest rating first, ties by _id, unrated doctors last
+    return [d for d, _, _ in sorted(doctors, key=lambda d: (d[1] is None, -(d[1] or 0), d[0]))]
+
+async def test_search_cursor_pages_cover_every_doctor_once_in_rating_order(api):
+    doctors = await seed_directory()
+    pages = await walk_search(api, limit=2)
+
+    assert [len(page) for page in pages] == [2, 2, 2, 2, 1]
+    listed = [d["id"] for page in pages for d in page]
+    assert listed == [str(i) for i in rating_order(doctors)]
+    assert [d["rating"] for d in pages[-1]] == [None]
+    assert {"hospitalName": "H", "isVerified": False}.items() <= pages[0][0].items()
+
+async def test_search_cursor_pages_past_unrated_doctors(api):
+    doctors = await seed_directory()
+    unrated = [str(i) for i, rating, _ in doctors if rating is None]
+
+    pages = await walk_search(api, limit=1)
+    assert [d["id"] for page in pages[-2:] for d in page] == sorted(unrated)
+    assert all(len(page) == 1 for page in pages) and len(pages) == len(doctors)
+
+async def test_search_by_city_orders_by_rating(api):
+    doctors = await seed_directory()
+    delhi = [d for d in doctors if d[2] == "Delhi"]
+
+    pages = await walk_search(api, city="Delhi", limit=4)
+    assert [d["id"] for page in pages for d in page] == [str(i) for i in rating_order(delhi)]
+    assert {d["city"] for page in pages for d in page} == {"Delhi"}
+
+async def test_search_recent_orders_newest_first(api):
+    doctors = await seed_directory()
+
+    pages = await walk_search(api, sort="recent", limit=4)
+    assert [len(page) for page in pages] == [4, 4, 1]
+    assert [d["id"] for page in pages for d in page] == [str(i) for i, _, _ in reversed(doctors)]
+
+async def test_import_upserts_one_doctor_per_licence(mongo):
+    from app.services.doctor_import import ImportStats, _write_batch, upsert_operation
+
+    collection = Doctor.get_motor_collection()
+    stats = ImportStats()
+    batch = [upsert_operation(make_doctor(name=name)) for name in ("Dr. First", "Dr. Second")]
+    await _write_batch(collection, batch, stats)
+    await _write_batch(collection, [upsert_operation(make_doctor(name="Dr. Rerun"))], stats)
+
+    docs = await collection.find({"verification.licenseNumber": "DL-TEST-001"}).to_list(None)
+    assert [d["name"] for d in docs] == ["Dr. Rerun"]
+    assert docs[0]["metadata"]["version"] == 3
+    assert stats.failed == 0 and stats.inserted == 1
+
+async def test_import_retries_upserts_that_lost_an_insert_race(anyio_backend):
+    from pymongo.errors import BulkWriteError
+    from app.services.doctor_import import DUPLICATE_KEY, ImportStats, _write_batch
+
+    class RacingCollection:
+        """Rejects the second upsert once as a concurrent insert would, then accepts everything."""
+        def __init__(self):
+            self.calls = []
+
+        async def bulk_write(self, ops, ordered):
+            self.calls.append(list(ops))
+            if len(self.calls) == 1:
+                raise BulkWriteError({"nUpserted": 1, "nModified": 0, "writeErrors": [
+                    {"index": 1, "code": DUPLICATE_KEY, "errmsg": "E11000 duplicate key"}]})
+            class Result:
+                upserted_count, modified_count = 0, len(ops)
+            return Result()
+
+    collection, stats = RacingCollection(), ImportStats()
+    await _write_batch(collection, ["first", "second"], stats)
+    assert collection.calls == [["first", "second"], ["second"]]
+    assert (stats.inserted, stats.updated, stats.failed) == (1, 1, 0)
+
+async def test_failed_first_load_still_rebuilds_deferred_indexes(mongo, monkeypatch, tmp_path):
+    from app.services import doctor_import
+
+    monkeypatch.setattr(doctor_import, "create_mongo_client", lambda: mongo.client)
+    monkeypatch.setattr(doctor_import, "database_name", lambda url: mongo.name)
+    monkeypatch.setattr(mongo.client, "close", lambda: None)
+    async def fail(collection, ops, stats, retry=True):
+        raise OSError("connection reset")
+    monkeypatch.setattr(doctor_import, "_write_batch", fail)
+    source = tmp_path / "doctors.jsonl"
+    source.write_text(make_doctor().model_dump_json(exclude={"id", "revision_id"}) + "\n")
+
+    declared = set(await Doctor.get_motor_collection().index_information())
+    with pytest.raises(OSError):
+        await doctor_import.import_doctors(str(source), batch_size=1)
+    assert set(await Doctor.get_motor_collection().index_information()) == declared
@@ -0,0 +1,52 @@
+"""Health, readiness and dependency probe tests."""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+async def probes(monkeypatch):
+    """Replace every registered probe with one that counts its calls and never leaves the process."""
+    from app.services.dependency_health import dependency_health
+
+    calls = []
+    for name in list(dependency_health._probes):
+        async def probe(client, name=name):
+            calls.append(name)
+            return {"probe": name}
+        monkeypatch.setitem(dependency_health._probes, name, (probe, lambda: True))
+    monkeypatch.setattr(dependency_health, "_snapshot", {"checkedAt": None, "dependencies": {}})
+    yield calls
+    await dependency_health.stop()
+
+async def test_readiness_is_503_while_mongo_is_not_ready(api, probes):
+    from app.database import db_manager
+    from app.services.dependency_health import dependency_health
+
+    await dependency_health.probe_once()
+    assert (await api.get("/api/health-check/ready")).status_code == 200
+
+    db_manager.ready, db_manager.last_error = False, "connection refused"
+    try:
+        response = await api.get("/api/health-check/ready")
+        assert response.status_code == 503
+        assert response.json() == {"status": "not-ready", "message": "mongodb: connection refused"}
+        assert (await api.get("/api/health-check")).json()["status"] == "degraded"
+    finally:
+        db_manager.last_error = None
+
+async def test_health_check_serves_the_cached_snapshot(api, probes):
+    from app.services.dependency_health import dependency_health
+
+    await dependency_health.probe_once()
+    assert sorted(probes) == sorted(dependency_health._probes)
+    probed = list(probes)
+
+    for _ in range(3):
+        body = (await api.get("/api/health-check")).json()
+        assert body["status"] == "healthy"
+        assert body["services"] == dependency_health.snapshot()["dependencies"]
+        assert body["services"]["nominatim"]["detail"] == {"probe": "nominatim"}
+    dependencies = (await api.get("/api/health-check/dependencies")).json()["data"]
+    assert dependencies["checkedAt"] == dependency_health.snapshot()["checkedAt"]
+    # Answering never ran a probe; only the background round does
+    assert probes == probed
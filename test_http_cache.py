@@ -0,0 +1,24 @@
+"""Conditional response and compression middleware tests."""
+import gzip
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+async def test_compressed_body_follows_content_under_a_fixed_etag(anyio_backend):
+    import httpx
+    from app.services.http_cache import CompressionMiddleware
+
+    # A handler ETag built from version inputs can outlive the bytes it was issued for
+    bodies = [b'{"name": "first"}' * 100, b'{"name": "second"}' * 100]
+
+    async def handler(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"application/json"), (b"etag", b'"v1"')]})
+        await send({"type": "http.response.body", "body": bodies.pop(0)})
+
+    transport = httpx.ASGITransport(app=CompressionMiddleware(handler))
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        for expected in (b'{"name": "first"}', b'{"name": "second"}'):
+            response = await client.get("/", headers={"Accept-Encoding": "gzip"})
+            assert response.headers["etag"] == '"v1-gzip"'
+            assert response.content.startswith(expected)
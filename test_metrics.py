@@ -0,0 +1,59 @@
+"""Prometheus metrics tests."""
+import re
+import pytest
+from bson import ObjectId
+
+pytestmark = pytest.mark.anyio
+
+def parse_samples(text):
+    """{(name, {label: value}): value} for every sample line of an exposition."""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = re.fullmatch(r"(\w+)(?:\{(.*)\})? (\S+)", line)
+        assert match, line
+        labels = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(2) or ""))
+        samples[(match.group(1), tuple(sorted(labels.items())))] = float(match.group(3))
+    return samples
+
+def series(samples, name, **labels):
+    return {
+        dict(key).get("le"): value for (metric, key), value in samples.items()
+        if metric == name and labels.items() <= dict(key).items()
+    }
+
+def test_histogram_buckets_are_cumulative():
+    from app.services.metrics import Histogram
+
+    histogram = Histogram("job_seconds", "Job time", ("job",), buckets=(0.1, 1.0, 10.0))
+    for value in (0.05, 0.1, 0.5, 3.0, 30.0):
+        histogram.observe(("nightly",), value)
+    samples = parse_samples("\n".join(histogram.samples("7")))
+
+    assert series(samples, "job_seconds_bucket", job="nightly", pid="7") == {"0.1": 2, "1": 3, "10": 4, "+Inf": 5}
+    assert series(samples, "job_seconds_count", job="nightly") == {None: 5}
+    assert series(samples, "job_seconds_sum", job="nightly") == {None: pytest.approx(33.65)}
+
+async def test_scrape_labels_requests_by_route_template(api):
+    from app.services.metrics import CONTENT_TYPE, LATENCY_BUCKETS
+
+    doctor_ids = [str(ObjectId()) for _ in range(3)]
+    for doctor_id in doctor_ids:
+        assert (await api.get(f"/api/doctors/{doctor_id}")).status_code == 404
+    await api.get("/api/no-such-route")
+
+    response = await api.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE
+    assert not any(doctor_id in response.text for doctor_id in doctor_ids)
+    samples = parse_samples(response.text)
+
+    route = {"method": "GET", "route": "/api/doctors/{doctor_id}"}
+    assert series(samples, "http_requests_total", status="404", **route)[None] >= 3
+    assert series(samples, "http_requests_total", route="<unmatched>", status="404")
+    buckets = series(samples, "http_request_duration_seconds_bucket", **route)
+    assert list(buckets) == [str(b) if b % 1 else str(int(b)) for b in LATENCY_BUCKETS] + ["+Inf"]
+    counts = list(buckets.values())
+    assert counts == sorted(counts)
+    assert series(samples, "http_request_duration_seconds_count", **route)[None] == counts[-1] >= 3
@@ -0,0 +1,65 @@
+"""Nearby search and map cluster tests (in-memory MongoDB)."""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+async def test_clusters_are_served_by_a_worker_that_did_not_run_the_search(api, monkeypatch):
+    from app.routers import nearby
+    from app.services.clustering import result_sets
+
+    monkeypatch.setattr(nearby, "MOCK_MODE", True)
+    search = await api.post("/api/doctors/nearby", json={"latitude": 28.6, "longitude": 77.2})
+    assert search.status_code == 200
+    result_id = search.json()["result_id"]
+
+    # Another worker has none of this search in memory
+    result_sets._entries.clear()
+    response = await api.get(f"/api/doctors/clusters/{result_id}", params={"zoom": 18})
+    assert response.status_code == 200
+    clusters = response.json()["clusters"]
+    assert sorted(c["doctor"]["name"] for c in clusters) == sorted(d["name"] for d in search.json()["doctors"])
+
+    missing = await api.get("/api/doctors/clusters/0123456789abcdef", params={"zoom": 3})
+    assert missing.status_code == 404
+
+def test_gazetteer_fills_locality_not_address():
+    from app.routers.nearby import Coordinates, Doctor
+    from app.services.reverse_geocoder import Place, ReverseGeocoder
+
+    geocoder = ReverseGeocoder([Place(28.63, 77.22, "Connaught Place, New Delhi, Delhi 110001, India")])
+    unaddressed = Doctor(name="Clinic", coordinates=Coordinates(latitude=28.631, longitude=77.219))
+    addressed = Doctor(name="Hospital", address="1 Ring Rd", coordinates=Coordinates(latitude=28.632, longitude=77.221))
+
+    assert geocoder.fill_localities([unaddressed, addressed]) == 1
+    assert unaddressed.address is None
+    assert unaddressed.approximate_locality.startswith("Connaught Place")
+    assert addressed.approximate_locality is None
+
+@pytest.mark.parametrize("center", [(60.17, 150.0), (28.6, 77.2), (-33.9, 18.4)])
+def test_duplicates_straddling_cell_boundaries_are_merged(center):
+    import math
+    import random
+    from app.routers.nearby import Coordinates, Doctor
+    from app.services.clustering import DEDUPE_RADIUS_M, DoctorDeduper, dedupe_doctors, latitude_bound
+
+    rng = random.Random(7)
+    lat0, lon0 = center
+    cell_deg = DEDUPE_RADIUS_M / 111_320
+    doctors = []
+    for i in range(2000):
+        # Twins within the dedupe radius, many of them across a latitude cell edge; far from the
+        # prime meridian a small latitude change moves a per-point longitude grid by whole cells
+        lat = lat0 + rng.uniform(-0.2, 0.2)
+        if i % 2:
+            lat = math.floor(lat / cell_deg) * cell_deg + 1e-7
+        lon = lon0 + rng.uniform(-0.2, 0.2)
+        bearing = rng.uniform(0, 2 * math.pi)
+        metres = rng.uniform(1, 0.9 * DEDUPE_RADIUS_M)
+        twin_lat = lat + metres * math.cos(bearing) / 111_320
+        twin_lon = lon + metres * math.sin(bearing) / (111_320 * math.cos(math.radians(lat)))
+        for la, lo in ((lat, lon), (twin_lat, twin_lon)):
+            doctors.append(Doctor(name=f"Clinic {i}", coordinates=Coordinates(latitude=la, longitude=lo)))
+
+    assert len(dedupe_doctors(doctors)) == 2000
+    streaming = DoctorDeduper(max_abs_lat=latitude_bound(lat0, 25_000))
+    assert sum(streaming.add(d) for d in doctors) == 2000
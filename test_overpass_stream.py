@@ -0,0 +1,92 @@
+"""Overpass streaming parser and streamed nearby search tests."""
+import json
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+ELEMENTS = [
+    {"type": "node", "id": 1, "lat": 28.601, "lon": 77.201,
+     "tags": {"name": "Dr. \"Quote\" {Clinic}", "amenity": "clinic", "addr:street": "Back\\slash Rd"}},
+    {"type": "way", "id": 2, "center": {"lat": 28.605, "lon": 77.205},
+     "tags": {"name": "Café Hospital – नई दिल्ली", "amenity": "hospital"}},
+    {"type": "node", "id": 3, "lat": 28.61, "lon": 77.21, "tags": {"name": "Escapes \\u007b \\\" ]", "healthcare": "doctor"}},
+]
+BODY = json.dumps({"version": 0.6, "osm3s": {"note": "elements: [ not here"}, "elements": ELEMENTS}, ensure_ascii=False).encode()
+
+def chunked(body: bytes, size: int):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(BODY)])
+def test_parser_handles_chunks_split_anywhere(size):
+    from app.services.overpass_stream import OverpassElementParser
+
+    parser = OverpassElementParser()
+    parsed = [el for chunk in chunked(BODY, size) for el in parser.feed(chunk)]
+    assert parsed == ELEMENTS
+    assert parser.done
+    assert parser.feed(b'{"type": "node"}') == []
+
+def test_parser_emits_elements_before_the_body_ends():
+    from app.services.overpass_stream import OverpassElementParser
+
+    parser = OverpassElementParser()
+    first_end = BODY.index(b"}}", BODY.index(b'"id": 1')) + 2
+    assert parser.feed(BODY[:first_end]) == ELEMENTS[:1]
+    assert not parser.done
+    # Split inside a multi-byte character and inside an escape sequence
+    rest = BODY[first_end:]
+    cut = rest.index("é".encode()) + 1
+    escape = rest.index(b"\\\\u007b") + 1
+    assert parser.feed(rest[:cut]) == []
+    assert parser.feed(rest[cut:escape]) == ELEMENTS[1:2]
+    assert parser.feed(rest[escape:]) == ELEMENTS[2:]
+
+def overpass_transport(chunks, fail_after=None):
+    import httpx
+
+    async def body():
+        for i, chunk in enumerate(chunks):
+            if fail_after is not None and i == fail_after:
+                raise httpx.ReadError("connection reset")
+            yield chunk
+
+    return httpx.MockTransport(lambda request: httpx.Response(200, content=body()))
+
+def read_events(response, sse):
+    if sse:
+        return [json.loads(block.split("data: ", 1)[1]) for block in response.text.split("\n\n") if block]
+    return [json.loads(line) for line in response.text.splitlines()]
+
+@pytest.mark.parametrize("sse", [False, True])
+async def test_stream_endpoint_emits_doctors_and_summary(api, monkeypatch, sse):
+    from app.routers import nearby
+
+    monkeypatch.setattr(nearby, "MOCK_MODE", False)
+    monkeypatch.setattr(nearby, "upstream_transport", lambda name: overpass_transport(chunked(BODY, 5)))
+    headers = {"Accept": "text/event-stream"} if sse else {}
+    response = await api.post("/api/doctors/nearby/stream", json={"latitude": 28.6, "longitude": 77.2}, headers=headers)
+    assert response.headers["content-type"].startswith("text/event-stream" if sse else "application/x-ndjson")
+    if sse:
+        assert response.text.startswith("event: start\ndata: ")
+
+    events = read_events(response, sse)
+    assert [e["event"] for e in events] == ["start", "doctor", "doctor", "doctor", "summary"]
+    assert events[1]["doctor"]["name"] == 'Dr. "Quote" {Clinic}'
+    summary = events[-1]
+    assert summary["total"] == 3 and summary["result_id"]
+    distances = [d["distance_km"] for d in summary["doctors"]]
+    assert distances == sorted(distances)
+
+async def test_stream_reports_a_connection_lost_mid_body(api, monkeypatch):
+    from app.routers import nearby
+
+    first_end = BODY.index(b"}}", BODY.index(b'"id": 1')) + 2
+    monkeypatch.setattr(nearby, "MOCK_MODE", False)
+    monkeypatch.setattr(
+        nearby, "upstream_transport", lambda name: overpass_transport([BODY[:first_end], BODY[first_end:]], fail_after=1)
+    )
+    response = await api.post("/api/doctors/nearby/stream", json={"latitude": 28.6, "longitude": 77.2})
+    events = read_events(response, sse=False)
+    assert [e["event"] for e in events] == ["start", "doctor", "error", "summary"]
+    assert events[2]["status"] == 502
+    assert events[-1]["total"] == 1
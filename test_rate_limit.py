@@ -0,0 +1,77 @@
+"""Rate limiter tests."""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+def test_rules_match_the_longest_prefix_and_can_be_overridden():
+    from app.services.rate_limit import parse_rules, RateLimiter
+
+    limiter = RateLimiter(rules=parse_rules("/api/doctors/nearby=5/30;/api/health=0/60;bogus=x"), store="memory")
+    nearby = limiter.rule_for("/api/doctors/nearby/stream")
+    assert (nearby.prefix, nearby.limit, nearby.window, nearby.policy) == ("/api/doctors/nearby", 5, 30, "5;w=30")
+    # A limit of 0 removes the rule, so health probes fall back to the /api budget
+    assert limiter.rule_for("/api/health-check/ready").prefix == "/api"
+    assert limiter.rule_for("/docs") is None
+
+async def test_sliding_window_weights_the_previous_window(anyio_backend):
+    from app.services.rate_limit import RateLimiter, RateLimitRule
+
+    rule = RateLimitRule("/api", 3, 60)
+    limiter = RateLimiter(rules=[rule], store="memory")
+    decisions = [await limiter.hit(rule, "ip:1", now=600.0) for _ in range(4)]
+    assert [d.allowed for d in decisions] == [True, True, True, False]
+    assert [d.remaining for d in decisions[:3]] == [2, 1, 0]
+    rejected = decisions[-1]
+    # Half of the next window has to pass before the four attempts weigh only two
+    assert rejected.retry_after == 90 and rejected.reset == 60
+
+    assert not (await limiter.hit(rule, "ip:1", now=689.0)).allowed
+    assert (await limiter.hit(rule, "ip:2", now=689.0)).allowed
+    allowed = await limiter.hit(rule, "ip:3", now=690.0)
+    assert allowed.allowed and allowed.retry_after is None
+
+async def test_memory_store_sweeps_and_evicts_oldest_first(anyio_backend):
+    from app.services.rate_limit import MemoryRateLimitStore
+
+    store = MemoryRateLimitStore(shards=1, max_keys=2)
+    await store.hit("a", 60, 0.0)
+    await store.hit("b", 60, 70.0)
+    await store.hit("a", 60, 80.0)
+    await store.hit("c", 60, 90.0)
+    # "b" was hit least recently, so it made room for "c"
+    assert len(store) == 2 and store.evictions == 1
+    assert await store.hit("a", 60, 90.0) == (2, 1)
+    assert store.sweep(240.0) == 2 and len(store) == 0
+
+async def test_mongo_counters_are_shared_between_workers(mongo):
+    import time
+    from app.services.rate_limit import RateLimiter, RateLimitRule
+
+    rule = RateLimitRule("/api/symptoms/analyze", 2, 60)
+    workers = [RateLimiter(rules=[rule], store="mongo") for _ in range(2)]
+    # A real clock, so the counters' TTL has not already passed
+    now = (time.time() // 60 + 1) * 60
+    decisions = [await workers[i % 2].hit(rule, "ip:1", now=now) for i in range(3)]
+    assert [d.allowed for d in decisions] == [True, True, False]
+    assert len(workers[0].memory) == len(workers[1].memory) == 0
+
+async def test_middleware_rejects_with_headers(anyio_backend):
+    import httpx
+    from app.services.rate_limit import RateLimiter, RateLimitMiddleware, RateLimitRule
+
+    async def handler(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    limiter = RateLimiter(rules=[RateLimitRule("/api", 1, 60)], store="memory")
+    transport = httpx.ASGITransport(app=RateLimitMiddleware(handler, limiter))
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        first = await client.get("/api/thing")
+        second = await client.get("/api/thing")
+        preflight = await client.options("/api/thing")
+        unlimited = await client.get("/other")
+    assert first.status_code == 200 and first.headers["ratelimit-remaining"] == "0"
+    assert second.status_code == 429 and "retry-after" in second.headers
+    assert second.json() == {"detail": "Rate limit exceeded"}
+    assert preflight.status_code == 200 and unlimited.status_code == 200
+    assert "ratelimit-limit" not in unlimited.headers
@@ -0,0 +1,100 @@
+"""Session store and index migration tests (in-memory MongoDB)."""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+async def test_legacy_last_active_index_becomes_ttl(anyio_backend):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from beanie import init_beanie
+    from app.database import reconcile_indexes
+    from app.models.patient import SESSION_IDLE_TTL, Patient
+
+    database = mongomock_motor.AsyncMongoMockClient()["health-beacon-legacy"]
+    # The index earlier releases created on the key that now carries the TTL
+    await database["patients"].create_index("sessionData.lastActiveAt")
+
+    await reconcile_indexes(database, [Patient])
+    await init_beanie(database=database, document_models=[Patient])
+
+    indexes = await database["patients"].index_information()
+    assert "sessionData.lastActiveAt_1" not in indexes
+    assert indexes["sessionData.lastActiveAt_ttl"]["expireAfterSeconds"] == SESSION_IDLE_TTL
+
+async def test_indexes_are_reconciled_once_not_on_reconnect(anyio_backend, monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    from app import database
+
+    calls = []
+    async def reconcile(db, models=None):
+        calls.append(db.name)
+    monkeypatch.setattr(database, "reconcile_indexes", reconcile)
+    monkeypatch.setattr(database, "create_mongo_client", lambda url=None: mongomock_motor.AsyncMongoMockClient())
+    monkeypatch.setattr(database.db_manager, "indexes_reconciled", False)
+
+    # The supervisor reconciles before forking, so its workers connect without reconciling
+    assert await database.reconcile_at_startup()
+    try:
+        for _ in range(2):
+            database.db_manager.ready = False
+            assert await database.connect_to_mongo() is not None
+        assert calls == ["health-beacon"]
+
+        # A worker that could not rely on the supervisor reconciles on its first connect only
+        database.db_manager.indexes_reconciled = False
+        for _ in range(2):
+            database.db_manager.ready = False
+            assert await database.connect_to_mongo() is not None
+        assert len(calls) == 2
+    finally:
+        database.db_manager.client, database.db_manager.database, database.db_manager.ready = None, None, False
+
+async def test_sessions_are_shared_through_mongo(api):
+    from app.database import db_manager
+    from app.services.session_store import MongoSessionStore, get_session_store, mongo_sessions
+
+    assert get_session_store() is mongo_sessions
+    created = (await api.post("/api/patients/session", json={"name": "Asha", "age": 30})).json()["data"]
+
+    # A worker with a cold cache reads the session from the database
+    other_worker = MongoSessionStore()
+    assert (await other_worker.get(created["sessionId"]))["profile"]["name"] == "Asha"
+
+    db_manager.ready = False
+    response = await api.get(f"/api/patients/session/{created['sessionId']}")
+    assert response.status_code == 503
+
+async def test_reads_refresh_last_active_at_most_once_per_interval(api):
+    from datetime import datetime, timedelta
+    from app.models.patient import Patient
+    from app.services.session_store import MongoSessionStore
+
+    session_id = (await api.post("/api/patients/session", json={"name": "Asha"})).json()["data"]["sessionId"]
+    patients = Patient.get_motor_collection()
+    stale = (datetime.utcnow() - timedelta(minutes=10)).replace(microsecond=0)
+    await patients.update_one({"sessionId": session_id}, {"$set": {"sessionData.lastActiveAt": stale}})
+
+    store = MongoSessionStore(cache_ttl=0, touch_interval=60)
+    await store.get(session_id)
+    touched = (await patients.find_one({"sessionId": session_id}))["sessionData"]["lastActiveAt"]
+    assert touched > stale + timedelta(minutes=9)
+
+    # Within the interval a read leaves the document alone
+    recent = touched - timedelta(seconds=30)
+    await patients.update_one({"sessionId": session_id}, {"$set": {"sessionData.lastActiveAt": recent}})
+    await store.get(session_id)
+    assert (await patients.find_one({"sessionId": session_id}))["sessionData"]["lastActiveAt"] == recent
+
+async def test_session_location_keeps_its_coordinates(api):
+    from app.services.session_store import MongoSessionStore
+    from app.services.symptom_trends import coordinates_from
+
+    created = (await api.post("/api/patients/session", json={
+        "location": {"city": "Pune", "latitude": 18.52, "longitude": 73.86},
+    })).json()["data"]
+    session_id = created["sessionId"]
+    session = await MongoSessionStore().get(session_id)
+    assert session["profile"]["location"]["city"] == "Pune"
+    assert coordinates_from(session["profile"]["location"]) == (18.52, 73.86)
+
+    await api.put(f"/api/patients/session/{session_id}", json={"location": {"lat": 28.6, "lng": 77.2}})
+    assert coordinates_from((await MongoSessionStore().get(session_id))["profile"]["location"]) == (28.6, 77.2)
@@ -0,0 +1,26 @@
+"""Specialty resolution tests."""
+import pytest
+from app.services.specialties import osm_speciality_pattern, resolve_specialty, specialty_for_condition
+
+@pytest.mark.parametrize("condition, specialty", [
+    ("Heartburn", "gastroenterology"),
+    ("heat stroke", "emergency"),
+    ("heart failure", "cardiology"),
+    ("mild stroke", "neurology"),
+    ("skin rashes", "dermatology"),
+    ("pregnancy nausea", "gynaecology"),
+    ("tonsillitis", "otolaryngology"),
+    ("stomach ulcers", "gastroenterology"),
+    # Keywords inside other words do not count
+    ("eyelash growth", None),
+    ("skinny", None),
+    ("", None),
+])
+def test_conditions_match_whole_keywords(condition, specialty):
+    assert specialty_for_condition(condition) == specialty
+
+def test_explicit_specialty_wins_over_condition():
+    assert resolve_specialty("Cardiologist", "rash") == "cardiology"
+    assert resolve_specialty("made up", "rash") == "dermatology"
+    assert osm_speciality_pattern("general-practitioner") is None
+    assert osm_speciality_pattern("dermatology") == "(^|;) *(dermatology|dermatovenereology) *(;|$)"
@@ -0,0 +1,81 @@
+"""Symptom trend tests: geohash cells, buffered counts and the heatmap (in-memory MongoDB)."""
+from datetime import date, datetime
+import pytest
+from app.services import geohash
+
+pytestmark = pytest.mark.anyio
+
+def test_geohash_encodes_known_cells_and_contains_the_point():
+    # Reference values from the original geohash.org examples
+    assert geohash.encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert geohash.encode(-25.382708, -49.265506, 5) == "6gkzw"
+
+    for latitude, longitude in ((28.6139, 77.209), (-33.9249, 18.4241), (0.0, 0.0), (89.9, -179.9)):
+        cell = geohash.encode(latitude, longitude, 5)
+        south, west, north, east = geohash.bounds(cell)
+        assert south <= latitude <= north and west <= longitude <= east
+        # A longer hash is the same cell subdivided
+        assert geohash.encode(latitude, longitude, 7).startswith(cell)
+        assert geohash.encode(*geohash.center(cell), 5) == cell
+
+def test_trend_keys_are_canonical_and_bounded():
+    from app.services.symptom_trends import OTHER_SYMPTOM, SymptomTrendAggregator
+
+    trends = SymptomTrendAggregator()
+    day = datetime(2026, 3, 2, 15, 30)
+    trends.record("tdr1w", ["Fever", "high temperature", "x" * 200, "fever; <script>", " "], now=day)
+    assert dict(trends._pending) == {
+        ("tdr1w", datetime(2026, 3, 2), "fever"): 1,
+        ("tdr1w", datetime(2026, 3, 2), OTHER_SYMPTOM): 1,
+    }
+
+async def test_flush_accumulates_counts_and_keeps_them_while_mongo_is_down(mongo):
+    from app.database import db_manager
+    from app.models.symptom_trend import SymptomTrendCell
+    from app.services.symptom_trends import SymptomTrendAggregator
+
+    trends = SymptomTrendAggregator()
+    cell = trends.tag(28.6139, 77.209)
+    day = datetime(2026, 3, 2, 9)
+    trends.record(cell, ["fever", "cough"], now=day)
+    trends.record(cell, ["coughing"], now=day)
+    assert await trends.flush() == 2
+    trends.record(cell, ["fever"], now=day)
+
+    db_manager.ready = False
+    assert await trends.flush() == 0
+    db_manager.ready = True
+    assert await trends.flush() == 1
+
+    docs = await SymptomTrendCell.get_motor_collection().find({}, {"_id": 0}).sort("symptom").to_list(None)
+    latitude, longitude = geohash.center(cell)
+    assert docs == [
+        {"cell": cell, "day": datetime(2026, 3, 2), "symptom": "cough", "total": 2, "latitude": latitude, "longitude": longitude},
+        {"cell": cell, "day": datetime(2026, 3, 2), "symptom": "fever", "total": 2, "latitude": latitude, "longitude": longitude},
+    ]
+
+async def test_heatmap_sums_cells_in_the_box_and_date_range(api):
+    from app.services.symptom_trends import SymptomTrendAggregator
+
+    trends = SymptomTrendAggregator()
+    delhi_a, delhi_b = trends.tag(28.6139, 77.209), trends.tag(28.66, 77.23)
+    assert delhi_a != delhi_b and delhi_a[:3] == delhi_b[:3]
+    trends.record(delhi_a, ["fever", "cough"], now=datetime(2026, 3, 2))
+    trends.record(delhi_b, ["fever"], now=datetime(2026, 3, 3))
+    trends.record(delhi_b, ["fever"], now=datetime(2026, 2, 1))
+    trends.record(trends.tag(-33.9249, 18.4241), ["fever"], now=datetime(2026, 3, 2))
+    await trends.flush()
+
+    box = {"south": 28, "west": 77, "north": 29, "east": 78, "start": "2026-03-01", "end": "2026-03-07"}
+    response = await api.get("/api/trends/heatmap", params=box)
+    assert response.status_code == 200
+    cells = response.json()["data"]["cells"]
+    assert [(c["geohash"], c["count"], c["symptoms"]) for c in cells] == [
+        (delhi_a, 2, {"fever": 1, "cough": 1}),
+        (delhi_b, 1, {"fever": 1}),
+    ]
+
+    coarse = (await api.get("/api/trends/heatmap", params={**box, "precision": 3, "symptom": "Feverish"})).json()["data"]["cells"]
+    assert [(c["geohash"], c["count"], c["symptoms"]) for c in coarse] == [(delhi_a[:3], 2, {"fever": 2})]
+
+    assert (await api.get("/api/trends/heatmap", params={**box, "south": 30})).status_code == 400
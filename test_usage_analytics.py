@@ -0,0 +1,93 @@
+"""Usage rollup tests (in-memory MongoDB)."""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+def test_symptom_keys_are_canonical_and_bounded():
+    from app.services.usage_analytics import OTHER_SYMPTOM, symptom_key
+
+    assert symptom_key("  High Temperature ") == "fever"
+    assert symptom_key("sore throat") == "sore throat"
+    assert symptom_key("x" * 200) == OTHER_SYMPTOM
+    assert symptom_key("pain in my left arm since tuesday") == OTHER_SYMPTOM
+    assert symptom_key("fever; <script>") == OTHER_SYMPTOM
+
+async def test_rollups_only_for_existing_sessions(api):
+    from app.models.usage_rollup import UsageRollup
+    from app.services.usage_analytics import UsageRollupAggregator, session_scope
+
+    session_id = (await api.post("/api/patients/session", json={"name": "Ravi"})).json()["data"]["sessionId"]
+    rollups = UsageRollupAggregator()
+    rollups.record_analysis(session_id, ["Fever", "coughing"], "low")
+    rollups.record_analysis("sess_made_up", ["fever"], "low")
+    await rollups.flush()
+
+    scopes = sorted(d["scope"] for d in await UsageRollup.get_motor_collection().find().to_list(None))
+    assert scopes == ["global", session_scope(session_id)]
+    bucket = await UsageRollup.get_motor_collection().find_one({"scope": "global"})
+    assert bucket["symptoms"] == {"fever": 2, "cough": 1}
+
+async def test_symptom_keys_per_bucket_are_capped(mongo, monkeypatch):
+    from app.models.usage_rollup import UsageRollup
+    from app.services import usage_analytics
+
+    monkeypatch.setattr(usage_analytics, "MAX_SYMPTOM_KEYS", 3)
+    rollups = usage_analytics.UsageRollupAggregator()
+    for name in ("fever", "cough", "rash", "nausea", "fever", "vomiting"):
+        rollups.record_analysis(None, [name], None)
+    await rollups.flush()
+    bucket = await UsageRollup.get_motor_collection().find_one({"scope": "global"})
+    assert bucket["symptoms"] == {"fever": 2, "cough": 1, "rash": 1, "other": 2}
+
+class FailingCollection:
+    """Wraps a collection so that its bulk writes fail as MongoDB would; reads still go through."""
+    name = "failing"
+
+    def __init__(self, error, collection=None):
+        self.error = error
+        self.collection = collection
+        self.ops = []
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def bulk_write(self, ops, ordered):
+        self.ops.append(ops)
+        raise self.error
+
+async def test_failed_session_write_does_not_resend_rollups(api, monkeypatch):
+    from app.models.patient import Patient
+    from app.models.usage_rollup import UsageRollup
+    from app.services.usage_analytics import UsageRollupAggregator
+
+    session_id = (await api.post("/api/patients/session", json={"name": "Ravi"})).json()["data"]["sessionId"]
+    rollups = UsageRollupAggregator()
+    rollups.record_analysis(session_id, ["fever"], "low")
+
+    patients = Patient.get_motor_collection()
+    failing = FailingCollection(OSError("connection reset"), patients)
+    monkeypatch.setattr(Patient, "get_motor_collection", classmethod(lambda cls: failing))
+    assert await rollups.flush() == 2
+    monkeypatch.setattr(Patient, "get_motor_collection", classmethod(lambda cls: patients))
+    assert await rollups.flush() == 1
+
+    bucket = await UsageRollup.get_motor_collection().find_one({"scope": "global"})
+    assert bucket["symptomChecks"] == 1
+    patient = await patients.find_one({"sessionId": session_id})
+    assert patient["sessionData"]["totalSymptomChecks"] == 1
+
+async def test_partial_bulk_write_failure_requeues_only_failed_ops(mongo, monkeypatch):
+    from datetime import datetime
+    from pymongo.errors import BulkWriteError
+    from app.models.usage_rollup import UsageRollup
+    from app.services.usage_analytics import GLOBAL_SCOPE, UsageRollupAggregator
+
+    rollups = UsageRollupAggregator()
+    earlier, later = datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 10)
+    rollups._add(GLOBAL_SCOPE, {"symptomChecks": 1}, now=earlier)
+    rollups._add(GLOBAL_SCOPE, {"symptomChecks": 2}, now=later)
+    failing = FailingCollection(BulkWriteError({"writeErrors": [{"index": 1, "code": 2, "errmsg": "failed"}]}))
+    monkeypatch.setattr(UsageRollup, "get_motor_collection", classmethod(lambda cls: failing))
+
+    assert await rollups.flush() == 1
+    assert rollups._buckets == {(GLOBAL_SCOPE, later): {"symptomChecks": 2}}
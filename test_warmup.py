@@ -0,0 +1,57 @@
+"""Background SDK warm-up tests."""
+import asyncio
+import threading
+import time
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+async def test_requests_wait_for_the_warm_up_import_off_the_loop(anyio_backend, monkeypatch):
+    from app.services import gemini_ai
+    from app.services.warmup import WarmUp
+
+    imports = []
+
+    def slow_import():
+        imports.append(threading.current_thread() is threading.main_thread())
+        time.sleep(0.05)
+        monkeypatch.setattr(gemini_ai, "_genai_loaded", True)
+        monkeypatch.setattr(gemini_ai, "genai", "sdk")
+        return "sdk"
+
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(gemini_ai, "load_genai", slow_import)
+    monkeypatch.setattr(gemini_ai, "_genai_loaded", False)
+    monkeypatch.setattr(gemini_ai, "_genai_import", None)
+
+    warm_up = WarmUp()
+    warm_up.start()
+    await asyncio.sleep(0.01)
+    # The loop keeps running while the import holds a worker thread
+    ticks = 0
+    request = asyncio.ensure_future(gemini_ai.import_genai())
+    while not request.done():
+        ticks += 1
+        await asyncio.sleep(0.005)
+    assert request.result() == "sdk"
+    assert imports == [False] and ticks > 1
+    await warm_up.stop()
+
+async def test_stop_cancels_a_running_warm_up(anyio_backend, monkeypatch):
+    from app.services import gemini_ai
+    from app.services.warmup import WarmUp
+
+    started = asyncio.Event()
+
+    async def never_finishes():
+        started.set()
+        await asyncio.Event().wait()
+
+    monkeypatch.setenv("GEMINI_API_KEY", "test-key")
+    monkeypatch.setattr(gemini_ai, "import_genai", never_finishes)
+    warm_up = WarmUp()
+    warm_up.start()
+    await started.wait()
+    task = warm_up._task
+    await warm_up.stop()
+    assert task.cancelled() and warm_up._task is None